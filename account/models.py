@@ -106,6 +106,8 @@ class UserProfile(models.Model):
     email = models.EmailField(unique=True, null=True, blank=True)
     gender = models.CharField(max_length=6, choices=GENDER_CHOICES, null=True)
     profile_picture = models.ImageField(upload_to='images/profile_images', validators=[FileExtensionValidator(['jpg', 'jpeg', 'png'])])
+    # Placeholder and resized copies of `profile_picture` (see gistconnect/renditions.py)
+    profile_picture_renditions = models.JSONField(default=dict, blank=True)
     phone_number = models.CharField(max_length=50, null=True)
     state = models.CharField(max_length=50, null=True, blank=True)
     address = models.CharField(max_length=200, null=True, blank=True)   
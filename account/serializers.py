@@ -6,6 +6,8 @@ from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 
 from django.contrib.auth import get_user_model
+from gistconnect import renditions
+from .tasks import generate_profile_picture_renditions
 
 User = get_user_model() 
 
@@ -191,6 +193,7 @@ class PasswordResetSerializer(serializers.Serializer):
 
 class UserProfileSerializer(serializers.ModelSerializer):
     referral_url = serializers.ReadOnlyField()
+    profile_picture_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
@@ -202,6 +205,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
                     'gender',  
                     'phone_number',
                     'profile_picture',
+                    'profile_picture_renditions',
                     'country',
                     'address', 
                     'city', 
@@ -211,13 +215,21 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'first_name', 'last_name', 'email', 'referral_code', 'referral_url']
 
 
+    def get_profile_picture_renditions(self, obj):
+        request = self.context.get('request')
+        return renditions.as_urls(obj.profile_picture_renditions, request.build_absolute_uri('/') if request else None)
+
     def update(self, instance, validated_data):
         profile_picture = validated_data.get('profile_picture')
         if profile_picture:
             instance.profile_picture = profile_picture
+            # Placeholder now, sized renditions once the Celery task has run
+            instance.profile_picture_renditions = {'placeholder': renditions.placeholder(profile_picture)}
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
+        if profile_picture:
+            generate_profile_picture_renditions.delay(str(instance.user_id))
         return instance
         
\ No newline at end of file
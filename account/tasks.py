@@ -3,7 +3,8 @@ import requests
 import logging
 from django.utils import timezone
 from datetime import timedelta
-from .models import OneTimePassword
+from .models import OneTimePassword, UserProfile
+from gistconnect import renditions
 from django.conf import settings
 from django.template.loader import render_to_string
 
@@ -60,4 +61,26 @@ def cleanup_expired_otps():
     """
     expiration_time = timezone.now() - timezone.timedelta(minutes=5)
     deleted, _ = OneTimePassword.objects.filter(created_at__lt=expiration_time).delete()
-    return f"Deleted {deleted} expired OTPs."
\ No newline at end of file
+    return f"Deleted {deleted} expired OTPs."
+
+
+@shared_task
+def generate_profile_picture_renditions(user_id):
+    """
+    Write the avatar renditions of a user's current profile picture.
+    """
+    try:
+        profile = UserProfile.objects.get(user_id=user_id)
+    except UserProfile.DoesNotExist:
+        return f"Profile for user {user_id} no longer exists."
+    if not profile.profile_picture:
+        return f"User {user_id} has no profile picture."
+
+    source = profile.profile_picture.name
+    with profile.profile_picture.open('rb') as image:
+        generated = renditions.generate(image, prefix=renditions.AVATAR_RENDITION_PREFIX)
+    # Only store them if the picture was not replaced while we were working
+    UserProfile.objects.filter(user_id=user_id, profile_picture=source).update(
+        profile_picture_renditions={**profile.profile_picture_renditions, **generated, 'source': source}
+    )
+    return f"Generated {len(generated['sizes'])} avatar renditions for user {user_id}."
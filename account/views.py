@@ -220,7 +220,7 @@ def user_profile_view(request, user_id):
     except UserProfile.DoesNotExist:
         return Response({"message": "User profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = UserProfileSerializer(profile)
+    serializer = UserProfileSerializer(profile, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -240,7 +240,7 @@ def update_profile(request, user_id):
     except UserProfile.DoesNotExist:
         return Response({"error": "User profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = UserProfileSerializer(profile, data=request.data, partial=True)
+    serializer = UserProfileSerializer(profile, data=request.data, partial=True, context={'request': request})
     if serializer.is_valid():
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
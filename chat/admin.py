@@ -2,7 +2,21 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import PrivateChatRoom, Message, GroupChatRoom, GroupMember, GroupMessage, GroupMessageReadStatus, GroupInvitation
+from .models import PrivateChatRoom, Message, GroupChatRoom, GroupMember, GroupMessage, GroupInvitation, ArchiveSegment, Blob
+from . import search
+
+ADMIN_SEARCH_LIMIT = 500
+
+
+class MessageSearchMixin:
+    """Match message content through the search index instead of an icontains scan"""
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search.query_terms(search_term):
+            hits = search.get_backend().search(self.model, search_term, None, ADMIN_SEARCH_LIMIT)
+            queryset |= self.model.objects.filter(pk__in=[pk for pk, _ in hits])
+        return queryset, may_have_duplicates
 
 
 @admin.register(PrivateChatRoom)
@@ -14,10 +28,10 @@ class PrivateChatRoomAdmin(admin.ModelAdmin):
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(MessageSearchMixin, admin.ModelAdmin):
     list_display = ('id', 'conversation', 'sender', 'content_preview', 'is_read', 'is_archived', 'timestamp')
     list_filter = ('is_read', 'is_archived', 'timestamp')
-    search_fields = ('sender__username', 'content')
+    search_fields = ('sender__username',)
     ordering = ('-timestamp',)
 
     def content_preview(self, obj):
@@ -81,10 +95,11 @@ class GroupMemberInline(admin.TabularInline):
 
 @admin.register(GroupMember)
 class GroupMemberAdmin(admin.ModelAdmin):
-    list_display = ['user', 'group', 'role', 'can_invite_others', 'joined_at']
+    list_display = ['user', 'group', 'role', 'can_invite_others', 'last_read_at', 'joined_at']
     list_filter = ['role', 'can_invite_others', 'joined_at']
     search_fields = ['user__username', 'user__email', 'group__name']
-    readonly_fields = ['joined_at']
+    readonly_fields = ['joined_at', 'last_read_at']
+    raw_id_fields = ['last_read_message']
     list_per_page = 50
     date_hierarchy = 'joined_at'
     
@@ -92,6 +107,10 @@ class GroupMemberAdmin(admin.ModelAdmin):
         ('Member Information', {
             'fields': ('group', 'user', 'role', 'can_invite_others')
         }),
+        ('Read Watermark', {
+            'fields': ('last_read_message', 'last_read_at'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('joined_at',),
             'classes': ('collapse',)
@@ -103,10 +122,10 @@ class GroupMemberAdmin(admin.ModelAdmin):
 
 
 @admin.register(GroupMessage)
-class GroupMessageAdmin(admin.ModelAdmin):
+class GroupMessageAdmin(MessageSearchMixin, admin.ModelAdmin):
     list_display = ['id','sender', 'group', 'message_preview', 'message_type','doc', 'image', 'is_reply', 'is_edited', 'timestamp']
     list_filter = ['message_type', 'is_edited', 'timestamp', 'group']
-    search_fields = ['content', 'sender__username', 'group__name']
+    search_fields = ['sender__username', 'group__name']
     readonly_fields = ['timestamp', 'edited_at', 'is_reply']
     list_per_page = 50
     date_hierarchy = 'timestamp'
@@ -145,46 +164,6 @@ class GroupMessageAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('sender', 'group', 'reply_to')
 
 
-class GroupMessageReadStatusInline(admin.TabularInline):
-    model = GroupMessageReadStatus
-    extra = 0
-    readonly_fields = ['read_at']
-    fields = ['user', 'read_at']
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
-
-
-@admin.register(GroupMessageReadStatus)
-class GroupMessageReadStatusAdmin(admin.ModelAdmin):
-    list_display = ['user', 'message_group', 'message_preview', 'read_at']
-    list_filter = ['read_at']
-    search_fields = ['user__username', 'message__content', 'message__group__name']
-    readonly_fields = ['read_at']
-    list_per_page = 100
-    date_hierarchy = 'read_at'
-    
-    fieldsets = (
-        ('Read Status', {
-            'fields': ('message', 'user', 'read_at')
-        }),
-    )
-    
-    def message_group(self, obj):
-        return obj.message.group.name
-    message_group.short_description = 'Group'
-    
-    def message_preview(self, obj):
-        content = obj.message.content
-        if len(content) > 30:
-            return content[:30] + '...'
-        return content
-    message_preview.short_description = 'Message'
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'message', 'message__group')
-
-
 @admin.register(GroupInvitation)
 class GroupInvitationAdmin(admin.ModelAdmin):
     list_display = ['invited_user', 'group', 'invited_by', 'status', 'is_expired_display', 'created_at']
@@ -231,8 +210,28 @@ class GroupInvitationAdmin(admin.ModelAdmin):
     mark_as_pending.short_description = 'Mark selected invitations as pending'
 
 
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'room_id', 'message_count', 'first_timestamp', 'last_timestamp', 'created_at']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['room_id']
+    exclude = ['data']
+    readonly_fields = ['kind', 'room_id', 'message_count', 'first_timestamp', 'last_timestamp', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'name', 'size', 'refcount', 'released_at', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'name', 'size', 'refcount', 'released_at', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
 # Add inlines to GroupChatRoom admin
 GroupChatRoomAdmin.inlines = [GroupMemberInline]
-
-# Add inlines to GroupMessage admin  
-GroupMessageAdmin.inlines = [GroupMessageReadStatusInline]
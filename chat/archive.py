@@ -0,0 +1,252 @@
+"""
+Tiered archival of old messages.
+
+Messages older than CHAT_ARCHIVE_AFTER_DAYS are moved out of the Message and
+GroupMessage tables into ArchiveSegment rows: zlib-compressed JSONL, one
+Django-serialized message per line, holding up to CHAT_ARCHIVE_BATCH_SIZE
+messages of a single room. Each batch writes its segment and deletes the live
+rows in one transaction. A run can therefore stop anywhere (crash, time limit,
+CHAT_ARCHIVE_MAX_BATCHES) and the next run resumes from whatever is still live;
+nothing is archived twice or lost.
+
+Archived messages count as read and leave the search index and unread counts.
+Replies to them lose their reply_to link (SET_NULL), as with deleted messages.
+``paginate_history`` serves the same cursors as ``paginate_keyset`` and falls
+through to the archive once a cursor moves past the oldest live message.
+"""
+import json
+import logging
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from . import blobs, unread
+from .models import ArchiveSegment, Message, GroupMessage, PrivateChatRoom
+from .pagination import KeysetPage, cursor_position, encode_cursor, paginate_keyset, parse_limit
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# model -> (ArchiveSegment.kind, room foreign key column)
+ARCHIVE_KINDS = {
+    Message: ('private', 'conversation_id'),
+    GroupMessage: ('group', 'group_id'),
+}
+
+SEGMENT_CACHE_SIZE = 64
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates to milliseconds, which would reorder cursors
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_segment(messages):
+    lines = []
+    for record in serializers.serialize('python', messages):
+        if record['model'] == 'chat.message':
+            record['fields'].update(is_archived=True, is_read=True)
+        lines.append(json.dumps(record, cls=ArchiveEncoder, separators=(',', ':')))
+    return zlib.compress('\n'.join(lines).encode('utf8'))
+
+
+@lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def segment_records(segment_id, room_id, last_timestamp):
+    """
+    Decoded ((timestamp, pk), record) pairs of an immutable segment, oldest first.
+
+    Keyed on more than the id because SQLite may reuse the id of a deleted segment.
+    """
+    segment = ArchiveSegment.objects.only('kind', 'data').get(
+        pk=segment_id, room_id=room_id, last_timestamp=last_timestamp
+    )
+    model = next(model for model, (kind, _) in ARCHIVE_KINDS.items() if kind == segment.kind)
+    pk_field = model._meta.pk
+    records = []
+    for line in zlib.decompress(segment.data).decode('utf8').splitlines():
+        record = json.loads(line)
+        position = (datetime.fromisoformat(record['fields']['timestamp']), pk_field.to_python(record['pk']))
+        records.append((position, record))
+    return tuple(records)
+
+
+class ArchiveTier:
+    """Read access to one room's archived messages, in (timestamp, pk) order."""
+
+    def __init__(self, model, room_id):
+        self.model = model
+        self.kind, _ = ARCHIVE_KINDS[model]
+        self.room_id = str(room_id)
+
+    def segments(self):
+        return ArchiveSegment.objects.filter(kind=self.kind, room_id=self.room_id).only('id', 'last_timestamp')
+
+    def records(self, segment):
+        return segment_records(segment.id, self.room_id, segment.last_timestamp)
+
+    def before(self, position, limit):
+        """Up to `limit` records older than `position` (None for the newest), newest first."""
+        segments = self.segments()
+        if position is not None:
+            segments = segments.filter(first_timestamp__lte=position[0])
+        records = []
+        for segment in segments.order_by('-last_timestamp', '-id').iterator():
+            for record_position, record in reversed(self.records(segment)):
+                if position is None or record_position < position:
+                    records.append(record)
+                    if len(records) >= limit:
+                        return records
+        return records
+
+    def after(self, position, limit):
+        """Up to `limit` records newer than `position`, oldest first."""
+        segments = self.segments().filter(last_timestamp__gte=position[0])
+        records = []
+        for segment in segments.order_by('first_timestamp', 'id').iterator():
+            for record_position, record in self.records(segment):
+                if record_position > position:
+                    records.append(record)
+                    if len(records) >= limit:
+                        return records
+        return records
+
+    def instantiate(self, records):
+        """Unsaved model instances for `records`, with senders attached in one query."""
+        messages = [deserialized.object for deserialized in serializers.deserialize('python', records)]
+        senders = User.objects.in_bulk({message.sender_id for message in messages if message.sender_id})
+        for message in messages:
+            sender = senders.get(message.sender_id)
+            if sender is not None or self.model._meta.get_field('sender').null:
+                message.sender = sender
+        return messages
+
+
+def paginate_history(queryset, params, model, room_id):
+    """
+    `paginate_keyset` over a room's live messages, continued into its archive.
+
+    Paging back (`before`) reads the archive once the live rows run out; paging
+    forward (`after`) from an archived position returns the remaining archived
+    messages first and then continues with the live ones.
+    """
+    page = paginate_keyset(queryset, params)
+    before, after = params.get('before'), params.get('after')
+    limit = parse_limit(params.get('limit'))
+    tier = ArchiveTier(model, room_id)
+
+    if after:
+        archived = tier.after(cursor_position(after, model), limit + 1)
+        if not archived:
+            return page
+        items = tier.instantiate(archived[:limit])
+        live_taken = limit - len(items)
+        items += page.items[:live_taken]
+        has_newer = len(archived) > limit or len(page.items) > live_taken
+        next_cursor = encode_cursor(items[-1].timestamp, items[-1].pk) if has_newer else None
+        return KeysetPage(items, next_cursor, encode_cursor(items[0].timestamp, items[0].pk))
+
+    if page.prev_cursor is not None:
+        return page
+    if page.items:
+        position = (page.items[0].timestamp, page.items[0].pk)
+    else:
+        position = cursor_position(before, model) if before else None
+    need = limit - len(page.items)
+    archived = tier.before(position, need + 1)
+    if not archived:
+        return page
+
+    items = tier.instantiate(archived[:need][::-1]) + page.items
+    if not items:
+        return page
+    prev_cursor = encode_cursor(items[0].timestamp, items[0].pk) if len(archived) > need else None
+    next_cursor = page.next_cursor
+    if not page.items and before:
+        next_cursor = encode_cursor(items[-1].timestamp, items[-1].pk)
+    return KeysetPage(items, next_cursor, prev_cursor)
+
+
+def segment_attachments(segment):
+    """Storage names of the attachments of the messages in `segment`."""
+    if segment.kind != 'group':
+        return []
+    names = []
+    for line in zlib.decompress(segment.data).decode('utf8').splitlines():
+        fields = json.loads(line)['fields']
+        names += [name for name in (fields.get('doc'), fields.get('image')) if name]
+    return names
+
+
+def archive_batch(model, room_id, cutoff, batch_size):
+    """Move the room's oldest messages before `cutoff` into one segment. Returns how many moved."""
+    kind, room_field = ARCHIVE_KINDS[model]
+    with transaction.atomic():
+        batch = list(
+            model.objects.filter(**{room_field: room_id, 'timestamp__lt': cutoff}).order_by('timestamp', 'pk')[:batch_size]
+        )
+        if not batch:
+            return 0
+        ArchiveSegment.objects.create(
+            kind=kind,
+            room_id=str(room_id),
+            first_timestamp=batch[0].timestamp,
+            last_timestamp=batch[-1].timestamp,
+            message_count=len(batch),
+            data=encode_segment(batch),
+        )
+        if model is GroupMessage:
+            # The segment keeps the attachments referenced once the rows are gone
+            blobs.acquire([name for message in batch for name in blobs.attachments(message)])
+        model.objects.filter(pk__in=[message.pk for message in batch]).delete()
+
+    if model is Message:
+        unread_by_sender = Counter(message.sender_id for message in batch if not message.is_read)
+        if unread_by_sender:
+            room = PrivateChatRoom.objects.get(id=room_id)
+            for sender_id, count in unread_by_sender.items():
+                unread.messages_read(room, unread.recipient_id(room, sender_id), count)
+    return len(batch)
+
+
+def archive_old_messages(horizon_days=None, batch_size=None, max_batches=None):
+    """
+    Archive every message older than the horizon, one room batch at a time.
+
+    Stops after `max_batches` batches; the next run picks up where this one
+    left off. Returns (batches, messages) archived.
+    """
+    horizon_days = settings.CHAT_ARCHIVE_AFTER_DAYS if horizon_days is None else horizon_days
+    batch_size = batch_size or settings.CHAT_ARCHIVE_BATCH_SIZE
+    max_batches = max_batches or settings.CHAT_ARCHIVE_MAX_BATCHES
+    cutoff = timezone.now() - timedelta(days=horizon_days)
+
+    batches = archived = 0
+    for model, (kind, room_field) in ARCHIVE_KINDS.items():
+        room_ids = list(
+            model.objects.filter(timestamp__lt=cutoff).order_by().values_list(room_field, flat=True).distinct()
+        )
+        for room_id in room_ids:
+            while batches < max_batches:
+                moved = archive_batch(model, room_id, cutoff, batch_size)
+                if not moved:
+                    break
+                batches += 1
+                archived += moved
+                if moved < batch_size:
+                    break
+            if batches >= max_batches:
+                logger.info(f"Archive run stopped after {batches} batches; the rest is left for the next run")
+                return batches, archived
+    return batches, archived
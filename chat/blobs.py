@@ -0,0 +1,169 @@
+"""
+Content-addressed, deduplicated storage of group attachments.
+
+Every doc and image is stored once per distinct content, as
+
+    blobs/<sha256[:2]>/<sha256><extension>
+
+with a Blob row counting the messages (live or archived) that point at it.
+Uploads are hashed while they stream in through the hashing upload handlers
+below, so a duplicate costs neither a second read nor a write: its message just
+takes another reference to the existing file.
+
+Dropping the last reference only stamps ``released_at``. ``collect_garbage``
+deletes blobs that stayed unreferenced for BLOB_GC_GRACE seconds, in batches,
+and re-checks the count as it deletes each row, so an upload that takes a new
+reference in the meantime keeps its file.
+
+Attachments uploaded before this store existed live under ``group_messages/``
+and are not reference counted; they are left alone.
+"""
+import hashlib
+import os
+import re
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Blob
+
+BLOB_PREFIX = 'blobs/'
+BLOB_NAME_RE = re.compile(r'^blobs/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[a-z0-9]{1,10})?$')
+HASH_READ_SIZE = 64 * 1024
+
+
+class HashingUploadMixin:
+    """Upload handler mixin that leaves the SHA-256 of each uploaded file on it as `sha256`."""
+
+    def new_file(self, *args, **kwargs):
+        # Set before super(), which may raise StopFutureHandlers
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if getattr(self, 'activated', True):
+            self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def sha256_of(file):
+    """The hash left by the upload handlers, or one computed by reading `file`."""
+    digest = getattr(file, 'sha256', None)
+    if digest:
+        return digest
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_READ_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_path(digest, filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,10}', extension):
+        extension = ''
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest}{extension}"
+
+
+def digest_of(name):
+    """The content hash of a blob storage name, or None for anything else."""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group('digest') if match else None
+
+
+def store(file, filename=None):
+    """
+    Store `file` unless its content is already stored, and take a reference to it.
+
+    Returns the storage name to put on the message's FileField.
+    """
+    digest = sha256_of(file)
+    if Blob.objects.filter(pk=digest).update(refcount=F('refcount') + 1, released_at=None):
+        return Blob.objects.values_list('name', flat=True).get(pk=digest)
+
+    file.seek(0)
+    name = default_storage.save(blob_path(digest, filename or file.name), file)
+    try:
+        with transaction.atomic():
+            Blob.objects.create(sha256=digest, name=name, size=default_storage.size(name), refcount=1)
+    except IntegrityError:
+        # A concurrent upload of the same content created the row first
+        default_storage.delete(name)
+        return store(file, filename)
+    return name
+
+
+def attachments(message):
+    """Storage names of a GroupMessage's files."""
+    return [field.name for field in (message.doc, message.image) if field]
+
+
+def _adjust(names, delta):
+    counts = Counter(digest for digest in map(digest_of, names) if digest)
+    by_count = defaultdict(list)
+    for digest, count in counts.items():
+        by_count[count].append(digest)
+    for count, digests in by_count.items():
+        blobs = Blob.objects.filter(pk__in=digests)
+        if delta > 0:
+            blobs.update(refcount=F('refcount') + count, released_at=None)
+        else:
+            blobs.update(refcount=F('refcount') - count)
+            blobs.filter(refcount__lte=0, released_at__isnull=True).update(released_at=timezone.now())
+
+
+def acquire(names):
+    """Take one more reference to each blob in `names` (other names are ignored)."""
+    _adjust(names, 1)
+
+
+def release(names):
+    """Drop one reference to each blob in `names` (other names are ignored)."""
+    _adjust(names, -1)
+
+
+def collect_garbage(grace=None, batch_size=None, max_batches=None):
+    """
+    Delete blobs unreferenced for longer than `grace` seconds, `batch_size` at a time.
+
+    Stops after `max_batches` batches; the next run picks up the rest. Returns the
+    number of blobs deleted.
+    """
+    grace = settings.BLOB_GC_GRACE if grace is None else grace
+    batch_size = batch_size or settings.BLOB_GC_BATCH_SIZE
+    max_batches = max_batches or settings.BLOB_GC_MAX_BATCHES
+    cutoff = timezone.now() - timedelta(seconds=grace)
+
+    deleted = 0
+    for _ in range(max_batches):
+        batch = list(
+            Blob.objects.filter(refcount__lte=0, released_at__lt=cutoff).values_list('sha256', 'name')[:batch_size]
+        )
+        for digest, name in batch:
+            # Conditional, so a blob referenced again since the query above survives
+            if Blob.objects.filter(pk=digest, refcount__lte=0).delete()[0]:
+                default_storage.delete(name)
+                deleted += 1
+        if len(batch) < batch_size:
+            break
+    return deleted
@@ -0,0 +1,44 @@
+import json
+from functools import lru_cache
+
+import msgpack
+
+# WebSocket subprotocol clients request to switch from JSON text frames to msgpack binary frames
+MSGPACK_SUBPROTOCOL = 'msgpack'
+
+
+def encode_event(payload, handler=None, coalesce_key=None):
+    """
+    Build a channel-layer event whose WebSocket frame is encoded once by the sender.
+
+    `payload` is exactly what clients receive; `handler` names the consumer method
+    that delivers it and defaults to payload['type']. The event carries the JSON
+    text only, so the layer moves one encoding per recipient whatever codecs are
+    in use; msgpack connections transcode it with `json_to_msgpack`. A frame still
+    queued for a slow client is replaced by a newer one with the same
+    `coalesce_key` (see chat/outbound.py).
+    """
+    return {
+        'type': handler or payload['type'],
+        'room': payload.get('room'),
+        'coalesce_key': coalesce_key,
+        'text': json.dumps(payload),
+    }
+
+
+@lru_cache(maxsize=256)
+def json_to_msgpack(text):
+    """msgpack encoding of a JSON frame; cached, so a broadcast is transcoded once per process."""
+    return msgpack.packb(json.loads(text))
+
+
+def encode_frame(payload, binary=False):
+    """Encode a single frame as msgpack bytes when `binary`, otherwise as JSON text."""
+    return msgpack.packb(payload) if binary else json.dumps(payload)
+
+
+def decode_frame(text_data=None, bytes_data=None):
+    """Decode an incoming frame; raises ValueError on malformed input in either codec."""
+    if bytes_data is not None:
+        return msgpack.unpackb(bytes_data)
+    return json.loads(text_data)
@@ -1,14 +1,305 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
-import json
 import logging
+import time
 from .models import PrivateChatRoom, Message, GroupChatRoom, GroupMember,GroupMessage
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from channels.db import database_sync_to_async
+from . import outbound, persistence, presence, typing_indicators, unread
+from .codecs import MSGPACK_SUBPROTOCOL, decode_frame, encode_event, encode_frame, json_to_msgpack
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-class ChatConsumer(AsyncWebsocketConsumer):
+# Upper bound on rooms a single multiplexed connection may follow at once
+MAX_MULTIPLEX_SUBSCRIPTIONS = 200
+
+
+class FrameCodecMixin:
+    """
+    Speaks JSON text frames by default, or msgpack binary frames when negotiated.
+
+    Outgoing frames go through a bounded outbound queue (see chat/outbound.py), so
+    handlers return without waiting for the client to read.
+    """
+    use_msgpack = False
+    outbound = None
+
+    async def accept_with_codec(self):
+        """Accept the connection, selecting msgpack if the client offered it as a subprotocol."""
+        self.use_msgpack = MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(subprotocol=MSGPACK_SUBPROTOCOL if self.use_msgpack else None)
+        self.outbound = outbound.OutboundQueue(
+            send=lambda frame: self.send(**frame),
+            encode=self.encode_payload,
+            close=lambda code: self.close(code=code),
+        )
+        self.outbound.start()
+
+    async def websocket_disconnect(self, message):
+        if self.outbound is not None:
+            await self.outbound.stop()
+        await super().websocket_disconnect(message)
+
+    def encode_payload(self, payload):
+        if self.use_msgpack:
+            return {'bytes_data': encode_frame(payload, binary=True)}
+        return {'text_data': encode_frame(payload)}
+
+    async def send_frame(self, frame, room=None, coalesce_key=None):
+        if self.outbound is None:
+            await self.send(**frame)
+        else:
+            await self.outbound.put(frame, room, coalesce_key)
+
+    async def send_event(self, event):
+        """Forward a frame pre-encoded by encode_event in the negotiated codec."""
+        frame = {'bytes_data': json_to_msgpack(event['text'])} if self.use_msgpack else {'text_data': event['text']}
+        await self.send_frame(frame, event.get('room'), event.get('coalesce_key'))
+
+    async def send_payload(self, payload):
+        """Encode and send a frame meant for this connection only."""
+        await self.send_frame(self.encode_payload(payload), payload.get('room'))
+
+
+class PresenceMixin:
+    """Reports connection lifecycle and client activity to the presence tracker."""
+    presence_tracked = False
+
+    async def presence_connected(self):
+        if settings.PRESENCE_ENABLED:
+            self.presence_tracked = True
+            await presence.tracker.connected(str(self.scope["user"].id), self.channel_name)
+
+    async def presence_disconnected(self):
+        if self.presence_tracked:
+            await presence.tracker.disconnected(str(self.scope["user"].id), self.channel_name)
+
+    def presence_touch(self):
+        if self.presence_tracked:
+            presence.tracker.touch(str(self.scope["user"].id), self.channel_name)
+
+
+class TypingMixin:
+    """Throttles this connection's typing signals before they reach the coalescer."""
+
+    def report_typing(self, group_name, room):
+        if not hasattr(self, 'typing_sent_at'):
+            self.typing_sent_at = {}
+        now = time.monotonic()
+        if now - self.typing_sent_at.get(group_name, float('-inf')) < settings.TYPING_THROTTLE:
+            return
+        self.typing_sent_at[group_name] = now
+        typing_indicators.coalescer.add(self.channel_layer, group_name, room, self.scope["user"])
+
+    async def typing_update(self, event):
+        await self.send_event(event)
+
+
+class PrivateChatMixin:
+    """Room lookup, persistence and broadcast for private chat rooms."""
+
+    async def send_private_message(self, conversation, user, content):
+        """Store a message and broadcast it to everyone connected to the room."""
+        message_instance = await self.store_private_message(conversation, user, content)
+
+        await self.channel_layer.group_send(
+            f'chat_{conversation.id}',
+            encode_event({
+                'room': f'chat:{conversation.id}',
+                'message_id': str(message_instance.uuid),
+                'message': message_instance.content,
+                'sender_id': str(user.id),  # Ensure string format
+                'timestamp': message_instance.timestamp.isoformat()
+            }, handler='chat_message')
+        )
+        return message_instance
+
+    def apply_room_revocation(self, conversation, event):
+        """
+        Apply a chat_room_revoked event to a cached room.
+
+        Returns True when this connection's user lost access to the room.
+        """
+        user_id = event['user_id']
+        if event['deleted'] or user_id == str(self.scope["user"].id):
+            return True
+        # The other participant hid the room; keep the cached flags in step
+        if str(conversation.participant_1_id) == user_id:
+            conversation.is_deleted_for_participant_1 = True
+        else:
+            conversation.is_deleted_for_participant_2 = True
+        return False
+
+    # ---------- Database Operations (async-safe) ----------
+
+    @database_sync_to_async
+    def get_authorized_conversation(self, user, room_id):
+        try:
+            logger.info(f"Looking for conversation with ID: {room_id}")
+            chat = PrivateChatRoom.objects.get(id=room_id)
+        except PrivateChatRoom.DoesNotExist:
+            logger.error(f"PrivateChatRoom with ID {room_id} does not exist")
+            return None
+        except Exception as e:
+            logger.error(f"Error getting conversation {room_id}: {e}")
+            return None
+
+        is_participant = user.id in (chat.participant_1_id, chat.participant_2_id)
+        logger.info(f"User {user.id} in conversation {room_id}: {is_participant}")
+        return chat if is_participant else None
+
+    async def store_private_message(self, conversation, sender, content):
+        """Persist the message now, or hand it to the write-behind buffer when enabled."""
+        if settings.CHAT_WRITE_BEHIND:
+            message = Message(
+                conversation=conversation,
+                sender=sender,
+                content=content,
+                timestamp=timezone.now()
+            )
+            await persistence.enqueue(message)
+            return message
+        return await self.save_private_message(conversation, sender, content)
+
+    @database_sync_to_async
+    def save_private_message(self, conversation, sender, content):
+        try:
+            message = Message.objects.create(
+                conversation=conversation,
+                sender=sender,
+                content=content
+            )
+            unread.message_created(conversation, sender.id)
+            return message
+        except Exception as e:
+            logger.error(f"Error saving message: {e}")
+            raise
+
+
+class GroupChatMixin:
+    """Membership checks, persistence and broadcast for group chat rooms."""
+
+    async def send_group_message(self, group, user, data):
+        """Store a message described by an incoming frame and broadcast it to the group."""
+        content = data.get('message')
+        message_type = data.get('message_type', 'text')
+        reply_to_id = data.get('reply_to')
+
+        # Debug logging for troubleshooting
+        logger.info(f"Received data: {data}")
+        logger.info(f"Reply to ID: {reply_to_id}")
+
+        # Fetch reply message if this is a reply; it may still be in the write-behind buffer
+        reply_to = None
+        if reply_to_id:
+            reply_to = persistence.find_pending(GroupMessage, reply_to_id) or await self.get_reply(reply_to_id)
+        logger.info(f"Reply to message found: {reply_to}")
+
+        # Save message to database
+        msg = await self.store_group_message(group, user, content, message_type, reply_to)
+
+        # Broadcast message to all group members, encoded once for every recipient
+        await self.channel_layer.group_send(
+            f"group_{group.id}",
+            encode_event({
+                'type': 'group_message',
+                'room': f'group:{group.id}',
+                'message_id': str(msg.id),
+                'message': msg.content,
+                'sender_id': str(user.id),
+                'sender_username': user.username,
+                'message_type': msg.message_type,
+                'timestamp': msg.timestamp.isoformat(),
+                'reply_to': await self.format_reply_data(msg.reply_to) if msg.reply_to else None
+            })
+        )
+        return msg
+
+    def group_access_lost(self, event):
+        """True when a group_access_revoked event removes this connection's user from the group."""
+        return event['user_id'] is None or event['user_id'] == str(self.scope["user"].id)
+
+    @database_sync_to_async
+    def format_reply_data(self, reply_message):
+        """Format reply message data for client consumption."""
+        if not reply_message:
+            return None
+
+        return {
+            "id": str(reply_message.id),
+            "content": reply_message.content,
+            "sender_username": reply_message.sender.username if reply_message.sender else "Deleted User"
+        }
+
+    @database_sync_to_async
+    def mark_group_read(self, group, user, message_id):
+        """Advance the user's read watermark in the group to the acknowledged message."""
+        try:
+            message = GroupMessage.objects.only('id', 'timestamp').get(id=message_id, group=group)
+            member = GroupMember.objects.get(group=group, user=user)
+        except (GroupMessage.DoesNotExist, GroupMember.DoesNotExist, ValidationError):
+            logger.warning(f"Ignoring read ack for message {message_id} in group {group.id}")
+            return False
+        return member.advance_read_watermark(message)
+
+    @database_sync_to_async
+    def get_member_group(self, user, group_id):
+        """Return the group if the user is a member of it, otherwise None."""
+        try:
+            return GroupChatRoom.objects.get(id=group_id, members__user=user)
+        except (GroupChatRoom.DoesNotExist, ValidationError):
+            return None
+
+    @database_sync_to_async
+    def get_reply(self, reply_id):
+        """Retrieve message by ID for reply functionality with optimized query."""
+        try:
+            logger.info(f"Looking for reply message with ID: {reply_id}")
+            message = GroupMessage.objects.select_related('sender').get(id=reply_id)
+            logger.info(f"Found reply message: {message}")
+            return message
+        except GroupMessage.DoesNotExist:
+            logger.error(f"Reply message with ID {reply_id} not found")
+            return None
+        except Exception as e:
+            logger.error(f"Error getting reply message: {e}")
+            return None
+
+    async def store_group_message(self, group, user, content, message_type, reply_to=None):
+        """Persist the message now, or hand it to the write-behind buffer when enabled."""
+        if settings.CHAT_WRITE_BEHIND:
+            message = GroupMessage(
+                group=group,
+                sender=user,
+                content=content,
+                message_type=message_type,
+                reply_to=reply_to,
+                timestamp=timezone.now()
+            )
+            await persistence.enqueue(message)
+            return message
+        return await self.save_group_message(group, user, content, message_type, reply_to)
+
+    @database_sync_to_async
+    def save_group_message(self, group, user, content, message_type, reply_to=None):
+        """Save new message to database with optional reply relationship."""
+        logger.info(f"Saving message with reply_to: {reply_to}")
+        message = GroupMessage.objects.create(
+            group=group,
+            sender=user,
+            content=content,
+            message_type=message_type,
+            reply_to=reply_to
+        )
+        logger.info(f"Message saved: {message}, reply_to: {message.reply_to}")
+        unread.group_messages_changed(group.id)
+        return message
+
+
+class ChatConsumer(FrameCodecMixin, PresenceMixin, TypingMixin, PrivateChatMixin, AsyncWebsocketConsumer):
     async def connect(self):
         user = self.scope["user"]
         self.room_name = self.scope['url_route']['kwargs']['room_name']
@@ -21,15 +312,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        # Check if conversation exists
-        conversation = await self.get_conversation(self.room_name)
-        if conversation is None:
-            logger.error(f"Conversation with ID {self.room_name} not found")
-            await self.close()
-            return
-
-        # Verify user is part of the conversation
-        if not await self.user_in_conversation(user, self.room_name):
+        # Resolve the room and the participant check once; receive() reuses the result
+        self.conversation = await self.get_authorized_conversation(user, self.room_name)
+        if self.conversation is None:
             logger.warning(f"User {user.id} not authorized for room {self.room_name}")
             await self.close()
             return
@@ -38,7 +323,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
-        await self.accept()
+        await self.accept_with_codec()
+        await self.presence_connected()
         logger.info(f"WebSocket connection accepted for user {user.id} in room {self.room_name}")
 
     async def disconnect(self, close_code):
@@ -48,86 +334,49 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.room_group_name,
                 self.channel_name
             )
+        await self.presence_disconnected()
+        if settings.CHAT_WRITE_BEHIND:
+            await persistence.flush_all()
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         user = self.scope["user"]
         if not user.is_authenticated:
             return
 
         try:
-            data = json.loads(text_data)
+            data = decode_frame(text_data, bytes_data)
+            self.presence_touch()
+            if data.get('type') == 'heartbeat':
+                return
+            if data.get('type') == 'typing':
+                if self.conversation is not None:
+                    self.report_typing(self.room_group_name, f'chat:{self.conversation.id}')
+                return
             message = data.get('message')
             logger.info(f"Received message from {user.id}: {message}")
 
-            # Save message
-            conversation = await self.get_conversation(self.room_name)
+            # Save and broadcast the message
+            conversation = self.conversation
             if conversation is None:
-                logger.error(f"Conversation {self.room_name} not found when saving message")
+                logger.error(f"Conversation {self.room_name} is no longer available to user {user.id}")
                 return
 
-            message_instance = await self.save_message(conversation, user, message)
-
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message_instance.content,
-                    'sender_id': str(user.id),  # Ensure string format
-                    'timestamp': message_instance.timestamp.isoformat()
-                }
-            )
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON received: {e}")
+            await self.send_private_message(conversation, user, message)
+        except ValueError as e:
+            logger.error(f"Invalid frame received: {e}")
         except Exception as e:
             logger.error(f"Error processing message: {e}")
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
-            'message': event['message'],
-            'sender_id': event['sender_id'],
-            'timestamp': event['timestamp']
-        }))
+        await self.send_event(event)
 
-    # ---------- Database Operations (async-safe) ----------
-
-    @database_sync_to_async
-    def get_conversation(self, room_id):
-        try:
-            logger.info(f"Looking for conversation with ID: {room_id}")
-            return PrivateChatRoom.objects.get(id=room_id)
-        except PrivateChatRoom.DoesNotExist:
-            logger.error(f"PrivateChatRoom with ID {room_id} does not exist")
-            return None
-        except Exception as e:
-            logger.error(f"Error getting conversation {room_id}: {e}")
-            return None
+    async def chat_room_revoked(self, event):
+        """Invalidate the cached room when it is deleted, or hidden by this connection's user."""
+        if self.conversation is not None and self.apply_room_revocation(self.conversation, event):
+            self.conversation = None
+            await self.close()
 
-    @database_sync_to_async
-    def save_message(self, conversation, sender, content):
-        try:
-            return Message.objects.create(
-                conversation=conversation,
-                sender=sender,
-                content=content
-            )
-        except Exception as e:
-            logger.error(f"Error saving message: {e}")
-            raise
 
-    @database_sync_to_async
-    def user_in_conversation(self, user, room_id):
-        try:
-            chat = PrivateChatRoom.objects.get(id=room_id)
-            is_participant = user == chat.participant_1 or user == chat.participant_2
-            logger.info(f"User {user.id} in conversation {room_id}: {is_participant}")
-            return is_participant
-        except PrivateChatRoom.DoesNotExist:
-            logger.error(f"PrivateChatRoom with ID {room_id} does not exist for user check")
-            return False
-        except Exception as e:
-            logger.error(f"Error checking user in conversation: {e}")
-            return False
-        
 
 
 
@@ -136,137 +385,205 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
 
 
-class GroupChatConsumer(AsyncWebsocketConsumer):
+class GroupChatConsumer(FrameCodecMixin, PresenceMixin, TypingMixin, GroupChatMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for handling real-time group chat functionality."""
 
     async def connect(self):
         """Handle WebSocket connection establishment and validate user access."""
         user = self.scope["user"]
         self.room_name = self.scope['url_route']['kwargs']['group_id']
-        self.room_group_name = f"group_{self.room_name}"
 
         # Reject connection if user is not authenticated
         if not user.is_authenticated:
             await self.close()
             return
 
-        # Verify user is a member of the requested group
-        is_member = await self.user_in_group(user, self.room_name)
-        if not is_member:
+        # Verify user is a member of the requested group; receive() reuses the group
+        self.group = await self.get_member_group(user, self.room_name)
+        if self.group is None:
             await self.close()
             return
 
         # Add user to the group channel and accept connection
+        self.room_group_name = f"group_{self.group.id}"
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        await self.accept_with_codec()
+        await self.presence_connected()
 
     async def disconnect(self, close_code):
         """Remove user from channel group on disconnection."""
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        await self.presence_disconnected()
+        if settings.CHAT_WRITE_BEHIND:
+            await persistence.flush_all()
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Process incoming messages and broadcast to group members."""
         user = self.scope["user"]
-        
+
         # Ensure user is still authenticated
         if not user.is_authenticated:
             return
 
         try:
-            # Parse incoming message data
-            data = json.loads(text_data)
-            content = data.get('message')
-            message_type = data.get('message_type', 'text')
-            reply_to_id = data.get('reply_to')
-
-            # Debug logging for troubleshooting
-            logger.info(f"Received data: {data}")
-            logger.info(f"Reply to ID: {reply_to_id}")
-
-            # Validate group exists
-            group = await self.get_group(self.room_name)
-            if not group:
+            # Parse incoming message data (JSON text or msgpack binary)
+            data = decode_frame(text_data, bytes_data)
+            self.presence_touch()
+            if self.group is None:
                 return
-
-            # Fetch reply message if this is a reply
-            reply_to = await self.get_reply(reply_to_id) if reply_to_id else None
-            logger.info(f"Reply to message found: {reply_to}")
-            
-            # Save message to database
-            msg = await self.save_message(group, user, content, message_type, reply_to)
-
-            # Broadcast message to all group members
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'group_message',
-                    'message_id': str(msg.id), 
-                    'message': msg.content,
-                    'sender_id': str(user.id),
-                    'sender_username': user.username,
-                    'message_type': msg.message_type,
-                    'timestamp': msg.timestamp.isoformat(),
-                    'reply_to': await self.format_reply_data(msg.reply_to) if msg.reply_to else None
-                }
-            )
+            if data.get('type') == 'heartbeat':
+                return
+            if data.get('type') == 'typing':
+                self.report_typing(self.room_group_name, f'group:{self.group.id}')
+                return
+            if data.get('type') == 'read':
+                await self.mark_group_read(self.group, user, data.get('message_id'))
+                return
+            await self.send_group_message(self.group, user, data)
 
         except Exception as e:
             logger.error(f"Error in receive: {e}")
 
     async def group_message(self, event):
-        """Send message events to WebSocket client."""
-        await self.send(text_data=json.dumps(event))
+        """Forward the sender's pre-encoded frame to the WebSocket client."""
+        await self.send_event(event)
+
+    async def group_access_revoked(self, event):
+        """Stop serving the cached group once this user is removed from it or it is deleted."""
+        if self.group is not None and self.group_access_lost(event):
+            self.group = None
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await self.close()
 
-    @database_sync_to_async
-    def format_reply_data(self, reply_message):
-        """Format reply message data for client consumption."""
-        if not reply_message:
-            return None
-        
-        return {
-            "id": str(reply_message.id),
-            "content": reply_message.content,
-            "sender_username": reply_message.sender.username if reply_message.sender else "Deleted User"
-        }
 
-    @database_sync_to_async
-    def user_in_group(self, user, group_id):
-        """Check if user is a member of the specified group."""
-        return GroupMember.objects.filter(group_id=group_id, user=user).exists()
 
-    @database_sync_to_async
-    def get_group(self, group_id):
-        """Retrieve group chat room by ID."""
+
+
+
+
+
+
+
+class MultiplexConsumer(FrameCodecMixin, PresenceMixin, TypingMixin, PrivateChatMixin, GroupChatMixin, AsyncWebsocketConsumer):
+    """
+    A single connection per user that can follow many private chats and groups.
+
+    Client frames carry an 'action' ('subscribe', 'unsubscribe', 'send',
+    'typing', 'read' or 'heartbeat') and, except for heartbeats, a 'room' tag of the
+    form 'chat:<room id>' or 'group:<group id>'. Every frame sent back carries
+    the same 'room' tag so clients can route it.
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        # room tag -> (channel layer group name, cached room)
+        self.subscriptions = {}
+        await self.accept_with_codec()
+        await self.presence_connected()
+        logger.info(f"Multiplexed WebSocket connection accepted for user {user.id}")
+
+    async def disconnect(self, close_code):
+        for group_name, _ in getattr(self, 'subscriptions', {}).values():
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+        await self.presence_disconnected()
+        if settings.CHAT_WRITE_BEHIND:
+            await persistence.flush_all()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        user = self.scope["user"]
         try:
-            return GroupChatRoom.objects.get(id=group_id)
-        except GroupChatRoom.DoesNotExist:
-            return None
+            data = decode_frame(text_data, bytes_data)
+        except ValueError as e:
+            logger.error(f"Invalid frame received: {e}")
+            await self.send_error(None, "Invalid frame.")
+            return
+        if not isinstance(data, dict):
+            await self.send_error(None, "Frames must be objects.")
+            return
 
-    @database_sync_to_async
-    def get_reply(self, reply_id):
-        """Retrieve message by ID for reply functionality with optimized query."""
+        self.presence_touch()
+        action = data.get('action')
+        room = data.get('room')
         try:
-            logger.info(f"Looking for reply message with ID: {reply_id}")
-            message = GroupMessage.objects.select_related('sender').get(id=reply_id)
-            logger.info(f"Found reply message: {message}")
-            return message
-        except GroupMessage.DoesNotExist:
-            logger.error(f"Reply message with ID {reply_id} not found")
-            return None
+            if action == 'heartbeat':
+                return
+            elif action == 'subscribe':
+                await self.subscribe(user, room)
+            elif action == 'unsubscribe':
+                await self.unsubscribe(room)
+            elif action in ('send', 'typing', 'read'):
+                if room not in self.subscriptions:
+                    await self.send_error(room, "Not subscribed to this room.")
+                    return
+                group_name, target = self.subscriptions[room]
+                if action == 'typing':
+                    self.report_typing(group_name, room)
+                elif action == 'read':
+                    if isinstance(target, PrivateChatRoom):
+                        await self.send_error(room, "Read acks are only supported for groups.")
+                    else:
+                        await self.mark_group_read(target, user, data.get('message_id'))
+                elif isinstance(target, PrivateChatRoom):
+                    await self.send_private_message(target, user, data.get('message'))
+                else:
+                    await self.send_group_message(target, user, data)
+            else:
+                await self.send_error(room, "Unknown action.")
         except Exception as e:
-            logger.error(f"Error getting reply message: {e}")
-            return None
+            logger.error(f"Error processing multiplexed frame: {e}")
+            await self.send_error(room, "Could not process frame.")
+
+    async def subscribe(self, user, room):
+        kind, _, room_id = str(room).partition(':')
+        if kind == 'chat':
+            target = await self.get_authorized_conversation(user, room_id)
+        elif kind == 'group':
+            target = await self.get_member_group(user, room_id)
+        else:
+            await self.send_error(room, "Unknown room type.")
+            return
+        if target is None:
+            await self.send_error(room, "Room not found or access denied.")
+            return
 
-    @database_sync_to_async
-    def save_message(self, group, user, content, message_type, reply_to=None):
-        """Save new message to database with optional reply relationship."""
-        logger.info(f"Saving message with reply_to: {reply_to}")
-        message = GroupMessage.objects.create(
-            group=group,
-            sender=user,
-            content=content,
-            message_type=message_type,
-            reply_to=reply_to
-        )
-        logger.info(f"Message saved: {message}, reply_to: {message.reply_to}")
-        return message
\ No newline at end of file
+        # Canonical tag, matching the 'room' field of broadcast frames
+        room = f'{kind}:{target.id}'
+        if room not in self.subscriptions:
+            if len(self.subscriptions) >= MAX_MULTIPLEX_SUBSCRIPTIONS:
+                await self.send_error(room, "Too many subscriptions.")
+                return
+            group_name = f'{kind}_{target.id}'
+            await self.channel_layer.group_add(group_name, self.channel_name)
+            self.subscriptions[room] = (group_name, target)
+        await self.send_payload({'type': 'subscribed', 'room': room})
+
+    async def unsubscribe(self, room):
+        subscription = self.subscriptions.pop(room, None)
+        if subscription is not None:
+            await self.channel_layer.group_discard(subscription[0], self.channel_name)
+        await self.send_payload({'type': 'unsubscribed', 'room': room})
+
+    async def send_error(self, room, detail):
+        await self.send_payload({'type': 'error', 'room': room, 'detail': detail})
+
+    async def chat_message(self, event):
+        await self.send_event(event)
+
+    async def group_message(self, event):
+        await self.send_event(event)
+
+    async def chat_room_revoked(self, event):
+        room = f"chat:{event['room_id']}"
+        subscription = self.subscriptions.get(room)
+        if subscription is not None and self.apply_room_revocation(subscription[1], event):
+            await self.unsubscribe(room)
+
+    async def group_access_revoked(self, event):
+        room = f"group:{event['group_id']}"
+        if room in self.subscriptions and self.group_access_lost(event):
+            await self.unsubscribe(room)
@@ -0,0 +1,243 @@
+"""
+A channel layer sharded across several Redis hosts.
+
+ShardedRedisChannelLayer is a RedisChannelLayer whose hosts form a consistent
+hash ring. Each host owns `virtual_nodes` points on a 32-bit ring, and every
+group and process-specific channel belongs to the first point clockwise of its
+own hash. channels_redis shards by splitting 4096 slots into equal ranges, so
+adding a host there moves keys between every pair of hosts. On the ring, adding
+or removing a host only moves the keys that host gains or loses.
+
+Failover: when a Redis command fails, every host is PINGed. Hosts that do not
+answer are taken out of the ring, so their groups and channels fall through to
+the next healthy host, and the failed operation is retried there. The layer
+remembers the group memberships added through it and re-adds them on their new
+host, so group_send keeps reaching this process's connections. Down hosts are
+probed again every `failover_cooldown` seconds, and their keys (and the
+re-added memberships) move back once they answer.
+
+group_send delivers to each host's channels concurrently, and only retries the
+channels whose host failed, so a failover never duplicates a message.
+
+group_send is built on channels_redis internals (_group_key, non_local_name,
+_map_channel_keys_to_connection), checked against the pinned 4.2.1. The layer
+refuses to start if an upgrade removes them.
+
+Caveats: health is judged per process, so for a moment two processes can
+disagree on where a channel lives. Messages sent in that window, and messages
+queued on a host when it died, are lost. Channel layers are at-most-once
+anyway, and clients resync through the history endpoints.
+"""
+import asyncio
+import bisect
+import collections
+import hashlib
+import logging
+import time
+
+from channels_redis.core import RedisChannelLayer
+from django.core.exceptions import ImproperlyConfigured
+from redis import exceptions as redis_exceptions
+
+logger = logging.getLogger(__name__)
+
+REDIS_ERRORS = (redis_exceptions.ConnectionError, redis_exceptions.TimeoutError, OSError)
+
+# Private RedisChannelLayer helpers this layer relies on (channels_redis 4.2.1)
+CHANNELS_REDIS_INTERNALS = ('_map_channel_keys_to_connection', '_group_key', 'non_local_name')
+
+# Same semantics as channels_redis' group_send script, plus the expiry cleanup
+# it otherwise does in a separate pipeline
+GROUP_SEND_LUA = """
+    local over_capacity = 0
+    local current_time = ARGV[#ARGV - 1]
+    local expiry = ARGV[#ARGV]
+    for i=1,#KEYS do
+        redis.call('ZREMRANGEBYSCORE', KEYS[i], 0, tonumber(current_time) - tonumber(expiry))
+        if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < tonumber(ARGV[i + #KEYS]) then
+            redis.call('ZADD', KEYS[i], current_time, ARGV[i])
+            redis.call('EXPIRE', KEYS[i], expiry)
+        else
+            over_capacity = over_capacity + 1
+        end
+    end
+    return over_capacity
+"""
+
+
+def ring_hash(value):
+    if isinstance(value, str):
+        value = value.encode('utf8')
+    return int.from_bytes(hashlib.md5(value).digest()[:4], 'big')
+
+
+def host_id(host):
+    """Stable identity of a decoded host, so reordering the host list moves no keys."""
+    if 'address' in host:
+        return str(host['address'])
+    return f"{host.get('host', 'localhost')}:{host.get('port', 6379)}/{host.get('db', 0)}"
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+
+    def __init__(self, hosts=None, virtual_nodes=160, failover_cooldown=5, health_check_timeout=1, **kwargs):
+        missing = [name for name in CHANNELS_REDIS_INTERNALS if not callable(getattr(self, name, None))]
+        if missing:
+            raise ImproperlyConfigured(
+                f"ShardedRedisChannelLayer needs channels_redis 4.2.1; this version lacks {', '.join(missing)}."
+            )
+        super().__init__(hosts=hosts, **kwargs)
+        self.failover_cooldown = failover_cooldown
+        self.health_check_timeout = health_check_timeout
+        ring = sorted(
+            (ring_hash(f"{host_id(host)}#{node}"), index)
+            for index, host in enumerate(self.hosts)
+            for node in range(virtual_nodes)
+        )
+        self._ring_points = [point for point, _ in ring]
+        self._ring_owners = [index for _, index in ring]
+        self.down = frozenset()
+        self._next_probe = 0
+        # group -> channels this process added to it
+        self._memberships = collections.defaultdict(set)
+
+    ### Routing ###
+
+    def route(self, value, down=None):
+        """Index of the first healthy host clockwise of `value` on the ring."""
+        down = self.down if down is None else down
+        points = len(self._ring_points)
+        start = bisect.bisect(self._ring_points, ring_hash(value))
+        for offset in range(points):
+            owner = self._ring_owners[(start + offset) % points]
+            if owner not in down:
+                return owner
+        # Every host is down; use the primary owner and let the command fail
+        return self._ring_owners[start % points]
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        return self.route(value)
+
+    ### Health ###
+
+    async def _ping(self, index):
+        try:
+            await asyncio.wait_for(self.connection(index).ping(), self.health_check_timeout)
+            return True
+        except (asyncio.TimeoutError, *REDIS_ERRORS):
+            return False
+
+    async def probe(self):
+        """PING every host and update the ring; returns True when the set of down hosts changed."""
+        results = await asyncio.gather(*(self._ping(index) for index in range(self.ring_size)))
+        self._next_probe = time.monotonic() + self.failover_cooldown
+        down = frozenset(index for index, alive in enumerate(results) if not alive)
+        if down == self.down:
+            return False
+        previous, self.down = self.down, down
+        for index in down - previous:
+            logger.warning(f"Channel layer host {host_id(self.hosts[index])} is down; failing over")
+        for index in previous - down:
+            logger.info(f"Channel layer host {host_id(self.hosts[index])} is back")
+        await self._rejoin_groups(previous)
+        return True
+
+    async def _recover(self):
+        if self.down and time.monotonic() >= self._next_probe:
+            await self.probe()
+
+    async def _rejoin_groups(self, previous_down):
+        """Re-add this process's memberships of groups that moved to another host."""
+        for group, channels in list(self._memberships.items()):
+            index = self.route(group)
+            if not channels or index == self.route(group, previous_down):
+                continue
+            try:
+                connection = self.connection(index)
+                group_key = self._group_key(group)
+                await connection.zadd(group_key, dict.fromkeys(channels, time.time()))
+                await connection.expire(group_key, self.group_expiry)
+            except REDIS_ERRORS as e:
+                logger.error(f"Could not move group {group} to host {host_id(self.hosts[index])}: {e}")
+
+    async def _with_failover(self, operation, *args):
+        await self._recover()
+        for _ in range(self.ring_size):
+            try:
+                return await operation(*args)
+            except REDIS_ERRORS:
+                if not await self.probe():
+                    raise
+        return await operation(*args)
+
+    ### Channel layer API ###
+
+    async def send(self, channel, message):
+        return await self._with_failover(super().send, channel, message)
+
+    async def receive_single(self, channel):
+        return await self._with_failover(super().receive_single, channel)
+
+    async def group_add(self, group, channel):
+        await self._with_failover(super().group_add, group, channel)
+        self._memberships[group].add(channel)
+
+    async def group_discard(self, group, channel):
+        channels = self._memberships.get(group)
+        if channels is not None:
+            channels.discard(channel)
+            if not channels:
+                del self._memberships[group]
+        await self._with_failover(super().group_discard, group, channel)
+
+    async def group_send(self, group, message):
+        assert self.valid_group_name(group), "Group name not valid"
+        channel_names = await self._with_failover(self._group_channels, group)
+        pending = channel_names
+        for _ in range(self.ring_size):
+            failures = await self._deliver(group, pending, message)
+            if not failures:
+                return
+            if not await self.probe():
+                break
+            pending = [channel for channels, _ in failures for channel in channels]
+        raise failures[0][1]
+
+    async def _group_channels(self, group):
+        key = self._group_key(group)
+        connection = self.connection(self.consistent_hash(group))
+        await connection.zremrangebyscore(key, min=0, max=int(time.time()) - self.group_expiry)
+        return [name.decode('utf8') for name in await connection.zrange(key, 0, -1)]
+
+    async def _deliver(self, group, channel_names, message):
+        """Send to every channel, one concurrent script per host; returns [(channels, error)] of failed hosts."""
+        by_host = collections.defaultdict(list)
+        for channel in channel_names:
+            by_host[self.consistent_hash(self.non_local_name(channel) if '!' in channel else channel)].append(channel)
+
+        async def deliver(index, channels):
+            _, keys_to_message, keys_to_capacity = self._map_channel_keys_to_connection(channels, message)
+            keys = list(keys_to_message)
+            args = [keys_to_message[key] for key in keys] + [keys_to_capacity[key] for key in keys]
+            args += [time.time(), self.expiry]
+            over_capacity = await self.connection(index).eval(GROUP_SEND_LUA, len(keys), *keys, *args)
+            if over_capacity > 0:
+                logger.info(f"{over_capacity} of {len(channel_names)} channels over capacity in group {group}")
+
+        hosts = list(by_host.items())
+        results = await asyncio.gather(
+            *(deliver(index, channels) for index, channels in hosts), return_exceptions=True
+        )
+        failures = []
+        for (index, channels), result in zip(hosts, results):
+            if isinstance(result, REDIS_ERRORS):
+                failures.append((channels, result))
+            elif isinstance(result, BaseException):
+                raise result
+        return failures
+
+    async def flush(self):
+        self._memberships.clear()
+        await super().flush()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from chat.models import GroupChatRoom, GroupMember, PrivateChatRoom
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+LAYER_BACKENDS = {
+    'lists': 'channels_redis.core.RedisChannelLayer',
+    'pubsub': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+}
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the 'lists' and 'pubsub' channel layer modes: delivery latency percentiles and "
+        "throughput through ChatConsumer and GroupChatConsumer (needs Redis; uses a throwaway test database)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='', help='Redis URL (default: the first CHANNEL_LAYER_REDIS_URLS entry)')
+        parser.add_argument('--modes', default='lists,pubsub', help='Comma-separated layer modes')
+        parser.add_argument('--group-sizes', default='10,50,200', help='Comma-separated group sizes')
+        parser.add_argument('--messages', type=int, default=100, help='Messages sent per measurement')
+
+    def handle(self, *args, **options):
+        logging.disable(logging.INFO)
+        host = options['host'] or settings.CHANNEL_LAYER_REDIS_URLS[0]
+        modes = options['modes'].split(',')
+        sizes = [int(size) for size in options['group_sizes'].split(',')]
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CACHES=LOCAL_CACHE, PRESENCE_ENABLED=False):
+                users = self.create_users(max(sizes + [2]))
+                room = PrivateChatRoom.objects.create(participant_1=users[0], participant_2=users[1])
+                scenarios = [('chat', f'/ws/chat/{room.id}/', users[:2])]
+                for size in sizes:
+                    group = self.create_group(users[:size])
+                    scenarios.append((f'group {size}', f'/ws/group-chat/{group.id}/', users[:size]))
+
+                self.stdout.write(
+                    f"{'mode':<7} {'scenario':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'deliveries/s':>13}"
+                )
+                for mode in modes:
+                    layers = {'default': {'BACKEND': LAYER_BACKENDS[mode], 'CONFIG': {'hosts': [host]}}}
+                    for name, path, members in scenarios:
+                        # A fresh layer per scenario: the lists layer's shared receive loop
+                        # does not recover once every consumer waiting on it was cancelled
+                        with override_settings(CHANNEL_LAYERS=layers):
+                            latencies, rate = async_to_sync(self.run)(path, members, options['messages'])
+                        self.stdout.write(
+                            f"{mode:<7} {name:<12} {percentile(latencies, 0.5) * 1e3:>8.2f} "
+                            f"{percentile(latencies, 0.95) * 1e3:>8.2f} {percentile(latencies, 0.99) * 1e3:>8.2f} "
+                            f"{rate:>13,.0f}"
+                        )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_users(self, count):
+        return [
+            User.objects.create_user(
+                email=f'layer-bench{i}@example.com', first_name='Bench', last_name=str(i), username=f'layer_bench{i}'
+            )
+            for i in range(count)
+        ]
+
+    def create_group(self, members):
+        group = GroupChatRoom.objects.create(name=f'bench {len(members)}', created_by=members[0])
+        GroupMember.objects.bulk_create([GroupMember(group=group, user=user) for user in members])
+        return group
+
+    async def run(self, path, members, messages):
+        """
+        Per-delivery latencies of sequential messages, then deliveries/s of a burst.
+
+        Every connection, the sender's included, receives each message.
+        """
+        application = URLRouter(websocket_urlpatterns)
+        communicators = []
+        for user in members:
+            communicator = WebsocketCommunicator(application, path)
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            assert connected, f"connection to {path} was rejected"
+            communicators.append(communicator)
+        sender = communicators[0]
+
+        async def receive_all(communicator, count):
+            arrivals = []
+            for _ in range(count):
+                await communicator.receive_json_from(timeout=30)
+                arrivals.append(time.perf_counter())
+            return arrivals
+
+        latencies = []
+        for i in range(messages):
+            sent_at = time.perf_counter()
+            await sender.send_json_to({'message': f'latency {i}'})
+            arrivals = await asyncio.gather(*(receive_all(communicator, 1) for communicator in communicators))
+            latencies += [arrival[0] - sent_at for arrival in arrivals]
+
+        start = time.perf_counter()
+        for i in range(messages):
+            await sender.send_json_to({'message': f'burst {i}'})
+        await asyncio.gather(*(receive_all(communicator, messages) for communicator in communicators))
+        rate = messages * len(communicators) / (time.perf_counter() - start)
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return latencies, rate
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+
+import redis
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.layers import ShardedRedisChannelLayer
+
+
+def run_worker(hosts, worker, options, results):
+    results.put(asyncio.run(fan_out(hosts, worker, options)))
+
+
+async def fan_out(hosts, worker, options):
+    """Deliveries received by one process while it group_sends for `seconds`."""
+    layer = ShardedRedisChannelLayer(hosts=hosts, capacity=1000, expiry=10)
+    channels = [await layer.new_channel() for _ in range(options['members'])]
+    groups = [f"bench_{worker}_{i}" for i in range(options['groups'])]
+    for group in groups:
+        for channel in channels:
+            await layer.group_add(group, channel)
+
+    received = 0
+    measuring = False
+
+    async def receive(channel):
+        nonlocal received
+        while True:
+            await layer.receive(channel)
+            if measuring:
+                received += 1
+
+    async def send(offset):
+        i = offset
+        while time.monotonic() < deadline:
+            await layer.group_send(groups[i % len(groups)], {'type': 'group_message', 'text': 'x' * 200})
+            i += options['concurrency']
+
+    receivers = [asyncio.create_task(receive(channel)) for channel in channels]
+    deadline = time.monotonic() + options['warmup']
+    await asyncio.gather(*(send(offset) for offset in range(options['concurrency'])))
+    measuring = True
+    start = time.monotonic()
+    deadline = start + options['seconds']
+    await asyncio.gather(*(send(offset) for offset in range(options['concurrency'])))
+    elapsed = time.monotonic() - start
+    for task in receivers:
+        task.cancel()
+    await layer.close_pools()
+    return received / elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure channel-layer fan-out throughput against the number of Redis shards. "
+        "Starts local redis-server processes unless --hosts is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, default=4, help='Largest shard count measured')
+        parser.add_argument('--hosts', default='', help='Comma-separated Redis URLs to use instead of starting servers')
+        parser.add_argument('--redis-server', default='redis-server', help='redis-server binary')
+        parser.add_argument('--base-port', type=int, default=7400, help='Port of the first started server')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Sending processes')
+        parser.add_argument('--groups', type=int, default=50, help='Groups per worker')
+        parser.add_argument('--members', type=int, default=20, help='Member channels per group')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent group_sends per worker')
+        parser.add_argument('--seconds', type=float, default=5, help='Measured duration per shard count')
+        parser.add_argument('--warmup', type=float, default=1, help='Unmeasured duration per shard count')
+
+    def handle(self, *args, **options):
+        servers = []
+        if options['hosts']:
+            hosts = [host.strip() for host in options['hosts'].split(',')]
+        else:
+            if shutil.which(options['redis_server']) is None:
+                raise CommandError(f"{options['redis_server']} not found; install Redis or pass --hosts")
+            ports = [options['base_port'] + i for i in range(options['shards'])]
+            servers = [self.start_server(options['redis_server'], port) for port in ports]
+            hosts = [f'redis://127.0.0.1:{port}/0' for port in ports]
+
+        try:
+            self.stdout.write(
+                f"{options['workers']} workers x {options['groups']} groups x {options['members']} members"
+            )
+            self.stdout.write(f"{'shards':>6} {'deliveries/s':>14} {'scaling':>8}")
+            baseline = None
+            for count in range(1, min(options['shards'], len(hosts)) + 1):
+                for host in hosts:
+                    redis.Redis.from_url(host).flushdb()
+                rate = self.measure(hosts[:count], options)
+                baseline = baseline or rate
+                self.stdout.write(f"{count:>6} {rate:>14,.0f} {rate / baseline:>7.2f}x")
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+
+    def start_server(self, binary, port):
+        server = subprocess.Popen(
+            [binary, '--port', str(port), '--save', '', '--appendonly', 'no'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        client = redis.Redis(port=port)
+        for _ in range(100):
+            try:
+                client.ping()
+                return server
+            except redis.ConnectionError:
+                time.sleep(0.05)
+        server.terminate()
+        raise CommandError(f"redis-server on port {port} did not start")
+
+    def measure(self, hosts, options):
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=run_worker, args=(hosts, worker, options, results))
+            for worker in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        rates = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        return sum(rates)
@@ -0,0 +1,87 @@
+import json
+import time
+import uuid
+
+import msgpack
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+def envelopes():
+    """Representative frames for each kind of message the consumers exchange."""
+    now = timezone.now().isoformat()
+    return {
+        'chat inbound': {'message': 'hey, are you around?'},
+        'chat outbound': {
+            'message': 'hey, are you around?',
+            'sender_id': str(uuid.uuid4()),
+            'timestamp': now,
+        },
+        'group text': {
+            'type': 'group_message',
+            'message_id': str(uuid.uuid4()),
+            'message': 'Reminder: standup moves to 10:30 tomorrow, same room.',
+            'sender_id': str(uuid.uuid4()),
+            'sender_username': 'adaeze_o',
+            'message_type': 'text',
+            'timestamp': now,
+            'reply_to': None,
+        },
+        'group reply': {
+            'type': 'group_message',
+            'message_id': str(uuid.uuid4()),
+            'message': 'Works for me, see you there.',
+            'sender_id': str(uuid.uuid4()),
+            'sender_username': 'tunde99',
+            'message_type': 'text',
+            'timestamp': now,
+            'reply_to': {
+                'id': str(uuid.uuid4()),
+                'content': 'Reminder: standup moves to 10:30 tomorrow, same room.',
+                'sender_username': 'adaeze_o',
+            },
+        },
+        'group file': {
+            'type': 'group_message',
+            'message_id': str(uuid.uuid4()),
+            'message': 'Q3 report',
+            'file_url': 'https://api.gistconnect.example/media/group_messages/files/q3-report.pdf',
+            'sender_id': str(uuid.uuid4()),
+            'sender_username': 'adaeze_o',
+            'message_type': 'doc',
+            'timestamp': now,
+            'reply_to': None,
+        },
+    }
+
+
+def per_call(func, arg, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations
+
+
+class Command(BaseCommand):
+    help = "Compare JSON and msgpack frame size and encode/decode time on realistic chat envelopes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        self.stdout.write(
+            f"{'envelope':<14} {'codec':<8} {'bytes':>6} {'encode':>10} {'decode':>10}"
+        )
+        for name, payload in envelopes().items():
+            for codec, dumps, loads in (
+                ('json', json.dumps, json.loads),
+                ('msgpack', msgpack.packb, msgpack.unpackb),
+            ):
+                frame = dumps(payload)
+                size = len(frame.encode('utf8')) if isinstance(frame, str) else len(frame)
+                encode = per_call(dumps, payload, iterations)
+                decode = per_call(loads, frame, iterations)
+                self.stdout.write(
+                    f"{name:<14} {codec:<8} {size:>6} {encode * 1e6:>7.2f} us {decode * 1e6:>7.2f} us"
+                )
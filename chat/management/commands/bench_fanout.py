@@ -0,0 +1,69 @@
+import json
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.codecs import encode_event
+from chat.consumers import GroupChatConsumer
+
+
+def sample_payload():
+    return {
+        'type': 'group_message',
+        'message_id': str(uuid.uuid4()),
+        'message': 'Are we still meeting at the usual place tomorrow? ' * 3,
+        'sender_id': str(uuid.uuid4()),
+        'sender_username': 'benchmark_user',
+        'message_type': 'text',
+        'timestamp': timezone.now().isoformat(),
+        'reply_to': {
+            'id': str(uuid.uuid4()),
+            'content': 'Original message being replied to',
+            'sender_username': 'someone_else',
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = "Measure group broadcast CPU per message against group size, per-recipient encoding vs encode-once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,50,100,250', help='Comma-separated group sizes')
+        parser.add_argument('--messages', type=int, default=200, help='Messages broadcast per measurement')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.stdout.write(f"{'members':>8} {'per-recipient':>16} {'encode-once':>14} {'speedup':>8}")
+        for size in sizes:
+            legacy = async_to_sync(self.measure)(size, options['messages'], encode_once=False)
+            current = async_to_sync(self.measure)(size, options['messages'], encode_once=True)
+            self.stdout.write(
+                f"{size:>8} {legacy * 1e6:>13.1f} us {current * 1e6:>11.1f} us {legacy / current:>7.1f}x"
+            )
+
+    async def measure(self, size, messages, encode_once):
+        """CPU seconds spent delivering one message to `size` connections (sender encode included)."""
+        async def discard(message):
+            pass
+
+        consumers = []
+        for _ in range(size):
+            consumer = GroupChatConsumer()
+            consumer.base_send = discard
+            consumers.append(consumer)
+
+        payloads = [sample_payload() for _ in range(messages)]
+        start = time.process_time()
+        for payload in payloads:
+            if encode_once:
+                event = encode_event(payload)
+                for consumer in consumers:
+                    await consumer.group_message(event)
+            else:
+                # The previous handler: every recipient re-encodes the whole event
+                for consumer in consumers:
+                    await consumer.send(text_data=json.dumps(payload))
+        return (time.process_time() - start) / messages
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from chat import persistence
+from chat.models import Message, PrivateChatRoom
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 100000}}}
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class Command(BaseCommand):
+    help = "Compare WebSocket message throughput with CHAT_WRITE_BEHIND off and on (uses a throwaway test database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=20, help='Concurrent ChatConsumer connections')
+        parser.add_argument('--messages', type=int, default=200, help='Messages sent per connection')
+
+    def handle(self, *args, **options):
+        logging.disable(logging.INFO)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CACHES=LOCAL_CACHE, PRESENCE_ENABLED=False):
+                rooms = self.create_rooms(options['connections'])
+                for enabled in (False, True):
+                    with override_settings(CHAT_WRITE_BEHIND=enabled):
+                        Message.objects.all().delete()
+                        elapsed = async_to_sync(self.run)(rooms, options['messages'])
+                    total = len(rooms) * options['messages']
+                    assert Message.objects.count() == total, "not every message was persisted"
+                    self.stdout.write(
+                        f"write-behind {'on ' if enabled else 'off'}: {total} messages in {elapsed:.2f}s "
+                        f"({total / elapsed:,.0f} msg/s)"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_rooms(self, count):
+        rooms = []
+        for i in range(count):
+            sender = User.objects.create_user(
+                email=f'bench-a{i}@example.com', first_name='Bench', last_name='A', username=f'bench_a{i}'
+            )
+            peer = User.objects.create_user(
+                email=f'bench-b{i}@example.com', first_name='Bench', last_name='B', username=f'bench_b{i}'
+            )
+            room = PrivateChatRoom.objects.create(participant_1=sender, participant_2=peer)
+            rooms.append((room, sender))
+        return rooms
+
+    async def run(self, rooms, messages):
+        application = URLRouter(websocket_urlpatterns)
+        communicators = []
+        for room, sender in rooms:
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{room.id}/')
+            communicator.scope['user'] = sender
+            connected, _ = await communicator.connect()
+            assert connected, f"connection to room {room.id} was rejected"
+            communicators.append(communicator)
+
+        async def chat(communicator):
+            for i in range(messages):
+                await communicator.send_json_to({'message': f'message {i}'})
+            for _ in range(messages):
+                await communicator.receive_json_from(timeout=30)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(chat(communicator) for communicator in communicators))
+        # Time until the messages are durable, not just broadcast
+        await persistence.flush_all()
+        elapsed = time.perf_counter() - start
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return elapsed
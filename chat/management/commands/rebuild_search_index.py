@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from chat import search
+
+
+class Command(BaseCommand):
+    help = "Re-index every private and group message in the configured search backend."
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        backend.rebuild()
+        self.stdout.write(f"Rebuilt search index with {type(backend).__name__}.")
@@ -0,0 +1,157 @@
+"""
+Serving group attachments after an authorization check.
+
+``serve(request, name, filename)`` answers a GET/HEAD for one stored file:
+
+- ``ETag`` is the content hash for content-addressed blobs (chat/blobs.py)
+  and image renditions (gistconnect/renditions.py), whose bytes never change, so they
+  also get an immutable ``Cache-Control``.
+  Older files get a size/mtime tag and must be revalidated. A matching
+  ``If-None-Match`` gets a 304.
+- A single ``Range: bytes=...`` (honouring ``If-Range``) gets a 206 with just
+  those bytes, so players can seek in mp4 files. Multi-range requests get the
+  whole file, which RFC 9110 allows.
+- With MEDIA_SERVE_MODE set to 'x-accel' (nginx) or 'x-sendfile' (Apache,
+  lighttpd), the response carries only headers. The front proxy sends the
+  bytes, and handles ranges itself.
+
+Access is private to the group, so caches are told ``private``.
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from .blobs import digest_of
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# renditions/<hash[:2]>/<hash>/<width>.webp, see gistconnect/renditions.py
+RENDITION_NAME_RE = re.compile(r'^renditions/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})/(?P<width>\d+)\.webp$')
+STREAM_BLOCK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Inclusive (start, end) of a single byte range, or None to send the whole file.
+
+    Raises RangeNotSatisfiable when the range starts past the end of the file.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None  # Syntactically invalid ranges are ignored
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def immutable_etag(name):
+    """The ETag of a file whose name pins its content, or None for anything else."""
+    digest = digest_of(name)
+    if digest:
+        return f'"{digest}"'
+    match = RENDITION_NAME_RE.match(name or '')
+    if match:
+        return f'"{match.group("digest")}-{match.group("width")}"'
+    return None
+
+
+def etag_for(name, size):
+    etag = immutable_etag(name)
+    if etag:
+        return etag
+    modified = int(default_storage.get_modified_time(name).timestamp())
+    return f'"{size:x}-{modified:x}"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison, as for If-None-Match
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def _read_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+    finally:
+        file.close()
+
+
+def _with_headers(response, etag, cache_control, content_type=None, filename=None):
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    if content_type:
+        response['Content-Type'] = content_type
+    if filename:
+        response['Content-Disposition'] = content_disposition_header(False, filename)
+    return response
+
+
+def serve(request, name, filename=None):
+    """The response for `name` in default_storage; the caller has authorized the request."""
+    size = default_storage.size(name)
+    etag = etag_for(name, size)
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable_etag(name) else REVALIDATE_CACHE_CONTROL
+
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        return _with_headers(HttpResponse(status=304), etag, cache_control)
+
+    content_type = mimetypes.guess_type(filename or name)[0] or 'application/octet-stream'
+    mode = settings.MEDIA_SERVE_MODE
+    if mode in ('x-accel', 'x-sendfile'):
+        response = HttpResponse()
+        if mode == 'x-accel':
+            response['X-Accel-Redirect'] = f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{quote(name)}"
+        else:
+            response['X-Sendfile'] = default_storage.path(name)
+        return _with_headers(response, etag, cache_control, content_type, filename)
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return _with_headers(response, etag, cache_control)
+
+    file = default_storage.open(name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(file, start, end - start + 1), status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    return _with_headers(response, etag, cache_control, content_type, filename)
@@ -1,29 +1,144 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import parse_qs
 from channels.auth import AuthMiddlewareStack
 from channels.db import database_sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from django.db import close_old_connections
+from django.core.cache import cache
 from jwt import InvalidSignatureError, ExpiredSignatureError, DecodeError
 from jwt import decode as jwt_decode
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """
+    Bounded LRU cache with TTL for users resolved during the WebSocket handshake.
+
+    Lookups hit the in-process tier first and, when WS_USER_CACHE_SHARED is on,
+    the shared Redis cache second, so a reconnect storm only reaches the database
+    once per user. Entries are invalidated from the User post_save/post_delete
+    signals (see chat/signals.py); other processes' local tiers expire via the TTL.
+    The shared tier is only a speed-up: when it fails, lookups go to `loader`.
+    """
+
+    def __init__(self, maxsize, ttl, shared=False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def shared_key(user_id):
+        return f"ws_user:{user_id}"
+
+    def get_local(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set_local(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get(self, user_id, loader):
+        user_id = str(user_id)
+        user = self.get_local(user_id)
+        if user is not None:
+            self.hits += 1
+            return user
+
+        if self.shared:
+            try:
+                user = await cache.aget(self.shared_key(user_id))
+            except Exception as e:
+                logger.error(f"Error reading user {user_id} from the shared cache: {e}")
+                user = None
+            if user is not None:
+                self.shared_hits += 1
+                self.set_local(user_id, user)
+                return user
+
+        self.misses += 1
+        user = await loader(user_id)
+        if user.is_authenticated:
+            self.set_local(user_id, user)
+            if self.shared:
+                try:
+                    await cache.aset(self.shared_key(user_id), user, self.ttl)
+                except Exception as e:
+                    logger.error(f"Error writing user {user_id} to the shared cache: {e}")
+        return user
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if self.shared:
+            try:
+                cache.delete(self.shared_key(user_id))
+            except Exception as e:
+                logger.error(f"Error invalidating user {user_id} in the shared cache: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'shared': self.shared,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+user_cache = UserCache(
+    maxsize=settings.WS_USER_CACHE_SIZE,
+    ttl=settings.WS_USER_CACHE_TTL,
+    shared=settings.WS_USER_CACHE_SHARED,
+)
+
 
 class JWTAuthMiddleware:
     def __init__(self, app):
         self.app = app
 
     async def __call__(self, scope, receive, send):
-        close_old_connections()
         try:
             token = parse_qs(scope["query_string"].decode("utf8")).get('token', None)[0]
             data = jwt_decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            scope['user'] = await self.get_user(data['user_id'])
+            scope['user'] = await user_cache.get(data['user_id'], self.get_user)
         except (TypeError, KeyError, InvalidSignatureError, ExpiredSignatureError, DecodeError):
             scope['user'] = AnonymousUser()
         return await self.app(scope, receive, send)
 
+    # database_sync_to_async closes stale connections around the query itself
     @database_sync_to_async
     def get_user(self, user_id):
         try:
@@ -32,4 +147,4 @@ class JWTAuthMiddleware:
             return AnonymousUser()
 
 def JWTAuthMiddlewareStack(app):
-    return JWTAuthMiddleware(AuthMiddlewareStack(app))
\ No newline at end of file
+    return JWTAuthMiddleware(AuthMiddlewareStack(app))
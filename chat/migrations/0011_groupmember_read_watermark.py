@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def collapse_read_statuses(apps, schema_editor):
+    """Set each member's watermark to the newest message they have a read-status row for."""
+    GroupMember = apps.get_model('chat', 'GroupMember')
+    GroupMessageReadStatus = apps.get_model('chat', 'GroupMessageReadStatus')
+
+    members = {
+        (member.user_id, member.group_id): member
+        for member in GroupMember.objects.only('id', 'user_id', 'group_id')
+    }
+    latest = {}
+    rows = GroupMessageReadStatus.objects.values_list(
+        'user_id', 'message__group_id', 'message_id', 'message__timestamp'
+    ).order_by('user_id', 'message__group_id', '-message__timestamp', '-message_id')
+    for user_id, group_id, message_id, timestamp in rows.iterator(chunk_size=2000):
+        # Rows arrive newest first per (user, group); keep only the first one
+        if (user_id, group_id) not in latest:
+            latest[(user_id, group_id)] = (message_id, timestamp)
+
+    updated = []
+    for key, (message_id, timestamp) in latest.items():
+        member = members.get(key)
+        if member is None:
+            continue
+        member.last_read_message_id = message_id
+        member.last_read_at = timestamp
+        updated.append(member)
+    GroupMember.objects.bulk_update(updated, ['last_read_message', 'last_read_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_message_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupmember',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupmember',
+            name='last_read_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.groupmessage'),
+        ),
+        migrations.RunPython(collapse_read_statuses, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='GroupMessageReadStatus',
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# External-content FTS5 indexes over chat_message and chat_groupmessage (see
+# chat/search.py). Only created on SQLite; other databases use another backend.
+# Triggers keep them in sync, and the UPDATE triggers only fire for the indexed
+# columns so flipping is_read does not touch the index.
+FTS_TABLES = [
+    # (fts table, content table, rowid expression, room column)
+    ('chat_message_fts', 'chat_message', 'id', 'conversation_id'),
+    ('chat_groupmessage_fts', 'chat_groupmessage', 'rowid', 'group_id'),
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for fts, table, rowid, room in FTS_TABLES:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"content, {room}, content='{table}', content_rowid='{rowid}', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        # Rank by message text only; the room column is there for scoping
+        schema_editor.execute(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+        insert = (
+            f"INSERT INTO {fts}(rowid, content, {room}) "
+            f"VALUES (new.{rowid}, new.content, new.{room});"
+        )
+        delete = (
+            f"INSERT INTO {fts}({fts}, rowid, content, {room}) "
+            f"VALUES ('delete', old.{rowid}, old.content, old.{room});"
+        )
+        schema_editor.execute(f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        schema_editor.execute(f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END")
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF content, {room} ON {table} BEGIN {delete} {insert} END"
+        )
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for fts, table, rowid, room in FTS_TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_groupmember_read_watermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
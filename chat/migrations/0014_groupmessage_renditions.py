@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:03
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+def reinstall_search_index(apps, schema_editor):
+    # SQLite adds this column by remaking chat_groupmessage, which drops the
+    # FTS triggers and renumbers rowids, so the index is rebuilt from scratch.
+    # Any later migration that remakes a message table has to do the same.
+    search_index = import_module('chat.migrations.0012_message_search_index')
+    search_index.drop_search_index(apps, schema_editor)
+    search_index.create_search_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_archivesegment'),
+    ]
+
+    operations = [
+        # Reinstalled after the remake in both directions
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='groupmessage',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
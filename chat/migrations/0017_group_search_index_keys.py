@@ -0,0 +1,84 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# chat_groupmessage has a UUID primary key, so the group index from 0012 was
+# keyed on its implicit rowid, which VACUUM and table remakes renumber. Each
+# group message now gets an AUTOINCREMENT key in chat_groupmessage_fts_keys,
+# which never changes, and the index is a contentless FTS5 table keyed on it.
+# External content is not an option: it needs a content table (or view) to
+# read by that key, and a view over chat_groupmessage breaks table remakes.
+# Any later migration that makes SQLite remake chat_groupmessage must
+# reinstall the triggers with install_triggers().
+FTS = 'chat_groupmessage_fts'
+KEYS = 'chat_groupmessage_fts_keys'
+KEY_OF_NEW = f"(SELECT rowid FROM {KEYS} WHERE message_id = new.id)"
+KEY_OF_OLD = f"(SELECT rowid FROM {KEYS} WHERE message_id = old.id)"
+
+
+def drop_triggers(schema_editor):
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS}_{suffix}")
+
+
+def install_triggers(schema_editor):
+    drop_triggers(schema_editor)
+    insert = f"INSERT INTO {FTS}(rowid, content, group_id) VALUES ({KEY_OF_NEW}, new.content, new.group_id);"
+    delete = (
+        f"INSERT INTO {FTS}({FTS}, rowid, content, group_id) "
+        f"VALUES ('delete', {KEY_OF_OLD}, old.content, old.group_id);"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS}_ai AFTER INSERT ON chat_groupmessage BEGIN "
+        f"INSERT INTO {KEYS}(message_id) VALUES (new.id); {insert} END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS}_ad AFTER DELETE ON chat_groupmessage BEGIN "
+        f"{delete} DELETE FROM {KEYS} WHERE message_id = old.id; END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS}_au AFTER UPDATE OF content, group_id ON chat_groupmessage BEGIN {delete} {insert} END"
+    )
+
+
+def create_keyed_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    drop_triggers(schema_editor)
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS}")
+    schema_editor.execute(
+        f"CREATE TABLE {KEYS} (rowid INTEGER PRIMARY KEY AUTOINCREMENT, message_id char(32) NOT NULL UNIQUE)"
+    )
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS} USING fts5("
+        f"content, group_id, content='', tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(f"INSERT INTO {FTS}({FTS}, rank) VALUES ('rank', 'bm25(1.0, 0.0)')")
+    install_triggers(schema_editor)
+    schema_editor.execute(f"INSERT INTO {KEYS}(message_id) SELECT id FROM chat_groupmessage")
+    schema_editor.execute(
+        f"INSERT INTO {FTS}(rowid, content, group_id) "
+        f"SELECT k.rowid, m.content, m.group_id FROM {KEYS} AS k JOIN chat_groupmessage AS m ON m.id = k.message_id"
+    )
+
+
+def restore_rowid_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    drop_triggers(schema_editor)
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {KEYS}")
+    search_index = import_module('chat.migrations.0012_message_search_index')
+    search_index.drop_search_index(apps, schema_editor)
+    search_index.create_search_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0016_blob_groupmessage_filename'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_keyed_index, restore_rowid_index),
+    ]
@@ -0,0 +1,62 @@
+import uuid
+
+from django.db import migrations, models
+
+# Making the column unique remakes chat_message on SQLite, which drops the
+# chat_message_fts triggers from 0012. Its rowids are the integer ids, which
+# the remake keeps, so only the triggers need reinstalling. The group index
+# (0017) lives on chat_groupmessage and is left alone.
+FTS = 'chat_message_fts'
+
+
+def reinstall_message_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS}_{suffix}")
+    insert = f"INSERT INTO {FTS}(rowid, content, conversation_id) VALUES (new.id, new.content, new.conversation_id);"
+    delete = (
+        f"INSERT INTO {FTS}({FTS}, rowid, content, conversation_id) "
+        f"VALUES ('delete', old.id, old.content, old.conversation_id);"
+    )
+    schema_editor.execute(f"CREATE TRIGGER {FTS}_ai AFTER INSERT ON chat_message BEGIN {insert} END")
+    schema_editor.execute(f"CREATE TRIGGER {FTS}_ad AFTER DELETE ON chat_message BEGIN {delete} END")
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS}_au AFTER UPDATE OF content, conversation_id ON chat_message BEGIN {delete} {insert} END"
+    )
+
+
+def assign_uuids(apps, schema_editor):
+    Message = apps.get_model('chat', 'Message')
+    batch = []
+    for message in Message.objects.filter(uuid__isnull=True).only('id').iterator(chunk_size=2000):
+        message.uuid = uuid.uuid4()
+        batch.append(message)
+        if len(batch) >= 2000:
+            Message.objects.bulk_update(batch, ['uuid'])
+            batch = []
+    Message.objects.bulk_update(batch, ['uuid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0017_group_search_index_keys'),
+    ]
+
+    operations = [
+        # Reinstalled after the remake in both directions
+        migrations.RunPython(migrations.RunPython.noop, reinstall_message_triggers),
+        migrations.AddField(
+            model_name='message',
+            name='uuid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(assign_uuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.RunPython(reinstall_message_triggers, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth import get_user_model
@@ -33,14 +34,20 @@ class PrivateChatRoom(models.Model):
 
 class Message(models.Model):
     conversation = models.ForeignKey(PrivateChatRoom, on_delete=models.CASCADE, related_name='messages')
+    # Set on construction, so write-behind messages are broadcast with their id before the insert
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='messages_sent')
     content = models.TextField()
     is_archived = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # default rather than auto_now_add so write-behind batches keep the receive time
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     is_read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['conversation', 'timestamp', 'id']),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} at {self.timestamp}"
@@ -76,6 +83,9 @@ class GroupChatRoom(models.Model):
 
     @property
     def member_count(self):
+        # Use the count annotated by list queries when available
+        if hasattr(self, 'num_members'):
+            return self.num_members
         return self.members.count()
 
     @property
@@ -95,6 +105,9 @@ class GroupMember(models.Model):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='member')
     can_invite_others = models.BooleanField(default=False)
     joined_at = models.DateTimeField(auto_now_add=True)
+    # Read watermark: every message up to and including this one has been read
+    last_read_message = models.ForeignKey('GroupMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_read_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         verbose_name = 'Group Member'
@@ -118,6 +131,32 @@ class GroupMember(models.Model):
     def is_moderator(self):
         return self.role in ['admin', 'moderator']
 
+    def unread_messages(self):
+        """Messages newer than the read watermark (or the join time), excluding the member's own"""
+        if self.last_read_at is None:
+            newer = Q(timestamp__gt=self.joined_at)
+        elif self.last_read_message_id is None:
+            # The watermark message was deleted or archived; its timestamp still marks the position
+            newer = Q(timestamp__gt=self.last_read_at)
+        else:
+            newer = Q(timestamp__gt=self.last_read_at) | Q(timestamp=self.last_read_at, id__gt=self.last_read_message_id)
+        return GroupMessage.objects.filter(newer, group_id=self.group_id).exclude(sender_id=self.user_id)
+
+    def advance_read_watermark(self, message):
+        """Move the watermark forward to `message`; never moves it backwards. Returns True if it moved."""
+        updated = GroupMember.objects.filter(pk=self.pk).filter(
+            Q(last_read_at__isnull=True) |
+            Q(last_read_at__lt=message.timestamp) |
+            Q(last_read_at=message.timestamp, last_read_message_id__lt=message.id) |
+            Q(last_read_at=message.timestamp, last_read_message__isnull=True)
+        ).update(last_read_message=message, last_read_at=message.timestamp)
+        if updated:
+            self.last_read_message, self.last_read_at = message, message.timestamp
+            # Imported here: chat.unread imports the models
+            from . import unread
+            unread.group_unread_changed(self.user_id)
+        return bool(updated)
+
 
 class GroupMessage(models.Model):
     MESSAGE_TYPE_CHOICES = [
@@ -134,9 +173,13 @@ class GroupMessage(models.Model):
     doc = models.FileField(upload_to='group_messages/files/', null=True, blank=True,
                             validators=[FileExtensionValidator(allowed_extensions=['pdf', 'docx', 'xlsx', 'zip', 'mp4'])])
     image = models.ImageField(upload_to='group_messages/images/', null=True, blank=True)
+    # Uploaded name of `doc`/`image`; the stored file is named by its content hash (see chat/blobs.py)
+    filename = models.CharField(max_length=255, null=True, blank=True)
+    # Placeholder and resized copies of `image` (see gistconnect/renditions.py)
+    renditions = models.JSONField(default=dict, blank=True)
 
     reply_to = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='replies')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     is_edited = models.BooleanField(default=False)
     edited_at = models.DateTimeField(null=True, blank=True)
 
@@ -160,25 +203,6 @@ class GroupMessage(models.Model):
         return self.reply_to is not None
 
 
-class GroupMessageReadStatus(models.Model):
-    """Track read status per user per message"""
-    message = models.ForeignKey(GroupMessage, on_delete=models.CASCADE, related_name='read_statuses')
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='message_read_statuses')
-    read_at = models.DateTimeField(auto_now_add=True)
-
-    class Meta:
-        verbose_name = 'Group Message Read Status'
-        verbose_name_plural = 'Group Message Read Statuses'
-        unique_together = ('message', 'user')
-        indexes = [
-            models.Index(fields=['message', 'user']),
-            models.Index(fields=['user', 'read_at']),
-        ]
-
-    def __str__(self):
-        return f"{self.user.username} read message {self.message.id}"
-
-
 class GroupInvitation(models.Model):
     """Handle group invitations"""
     STATUS_CHOICES = [
@@ -215,4 +239,80 @@ class GroupInvitation(models.Model):
         if self.expires_at:
             
             return timezone.now() > self.expires_at
-        return False
\ No newline at end of file
+        return False
+
+class ArchiveSegment(models.Model):
+    """
+    A zlib-compressed JSONL batch of messages moved out of Message/GroupMessage
+    by the archival task (see chat/archive.py). Segments never overlap within a
+    room and are immutable once written.
+    """
+    KIND_CHOICES = [
+        ('private', 'Private'),
+        ('group', 'Group'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    room_id = models.CharField(max_length=64)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['kind', 'room_id', 'first_timestamp']
+        indexes = [
+            models.Index(fields=['kind', 'room_id', 'last_timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.message_count} {self.kind} messages of room {self.room_id} up to {self.last_timestamp}"
+
+
+class UploadSession(models.Model):
+    """A resumable chunked upload of a group attachment (see chat/uploads.py)."""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    group = models.ForeignKey(GroupChatRoom, on_delete=models.CASCADE, related_name='upload_sessions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    message_type = models.CharField(max_length=20, choices=GroupMessage.MESSAGE_TYPE_CHOICES)
+    size = models.PositiveBigIntegerField()
+    # Bytes committed so far and the CRC32 of exactly those bytes
+    received = models.PositiveBigIntegerField(default=0)
+    crc32 = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Upload of {self.filename} ({self.received}/{self.size} bytes)"
+
+
+class Blob(models.Model):
+    """One stored copy of an attachment's content, shared by every message that uses it (see chat/blobs.py)."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)  # storage path
+    size = models.PositiveBigIntegerField()
+    refcount = models.IntegerField(default=0)
+    # When the last reference went away; garbage collection waits out a grace period from here
+    released_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['refcount', 'released_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
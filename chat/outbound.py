@@ -0,0 +1,171 @@
+"""
+Bounded per-connection outbound queues for WebSocket frames.
+
+Consumer handlers never await the socket themselves: frames go into the
+connection's OutboundQueue and a writer task sends them in order. A client that
+stops reading therefore backs up only its own queue, while its consumer keeps
+draining the channel layer, so the worker's shared channel-layer capacity is
+not used up by one slow connection.
+
+The queue only fills when ``send`` waits for the socket. That is why the app
+is deployed on uvicorn with its websockets protocol (docker-compose.yml), whose
+``send`` waits until the socket drains. Daphne (``runserver`` in development)
+buffers writes without waiting, so under it a slow client still grows the
+server's buffer and none of the policies below kick in.
+
+Once a queue holds WS_OUTBOUND_QUEUE_SIZE frames, WS_OUTBOUND_POLICY decides
+what happens:
+
+- 'coalesce' (default): a frame with a coalesce key (typing updates) replaces
+  the queued frame with the same key, whether or not the queue is full. Other
+  frames fall back to 'drop_oldest'.
+- 'drop_oldest': the oldest frame is discarded, and the next frame sent is
+  preceded by ``{'type': 'resync', 'rooms': [...]}``. It names the rooms that
+  lost frames, so the client refetches them through the history endpoints.
+- 'disconnect': the connection is closed with code 4008. The client reconnects
+  and refetches.
+
+Queue depth, drops and disconnects are counted per process and reported by the
+ws-stats endpoint.
+"""
+import asyncio
+import logging
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ('coalesce', 'drop_oldest', 'disconnect')
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+
+class OutboundCounters:
+    """Process-wide totals across every OutboundQueue."""
+
+    def __init__(self):
+        self.connections = 0
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.disconnects = 0
+
+    def stats(self):
+        return {
+            'policy': settings.WS_OUTBOUND_POLICY,
+            'maxsize': settings.WS_OUTBOUND_QUEUE_SIZE,
+            'connections': self.connections,
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'resyncs': self.resyncs,
+            'disconnects': self.disconnects,
+        }
+
+
+counters = OutboundCounters()
+
+
+class OutboundQueue:
+    """
+    Frames waiting to be written to one WebSocket connection.
+
+    `send(frame)` writes one encoded frame, `encode(payload)` encodes a frame in
+    the connection's codec, and `close(code)` closes the connection.
+    """
+
+    def __init__(self, send, encode, close, maxsize=None, policy=None):
+        self.send = send
+        self.encode = encode
+        self.close = close
+        self.maxsize = maxsize or settings.WS_OUTBOUND_QUEUE_SIZE
+        self.policy = policy or settings.WS_OUTBOUND_POLICY
+        if self.policy not in POLICIES:
+            raise ValueError(f"WS_OUTBOUND_POLICY must be one of {', '.join(POLICIES)}")
+        # Entries are [coalesce key, room tag, frame]; the frame is replaced in place when coalescing
+        self.entries = deque()
+        self.keyed = {}
+        self.resync_rooms = set()
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._writer = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def start(self):
+        counters.connections += 1
+        self._writer = asyncio.create_task(self._write())
+
+    async def stop(self):
+        if self._writer is None:
+            return
+        self.closed = True
+        self._writer.cancel()
+        self._writer = None
+        counters.connections -= 1
+        counters.depth -= len(self.entries)
+        self.entries.clear()
+        self.keyed.clear()
+
+    async def put(self, frame, room=None, key=None):
+        """Queue `frame` without waiting for the socket, applying the policy when full."""
+        if self.closed:
+            return
+        if key is not None and self.policy == 'coalesce':
+            entry = self.keyed.get(key)
+            if entry is not None:
+                entry[2] = frame
+                counters.coalesced += 1
+                return
+
+        if len(self.entries) >= self.maxsize:
+            if self.policy == 'disconnect':
+                counters.disconnects += 1
+                logger.warning(f"Closing slow WebSocket connection with {len(self.entries)} frames queued")
+                await self.stop()
+                await self.close(SLOW_CONSUMER_CLOSE_CODE)
+                return
+            _, dropped_room, _ = self._pop()
+            counters.dropped += 1
+            if dropped_room is not None:
+                self.resync_rooms.add(dropped_room)
+
+        entry = [key, room, frame]
+        self.entries.append(entry)
+        if key is not None:
+            self.keyed[key] = entry
+        counters.depth += 1
+        counters.max_depth = max(counters.max_depth, len(self.entries))
+        self._ready.set()
+
+    def _pop(self):
+        entry = self.entries.popleft()
+        if entry[0] is not None and self.keyed.get(entry[0]) is entry:
+            del self.keyed[entry[0]]
+        counters.depth -= 1
+        return entry
+
+    async def _write(self):
+        while True:
+            if not self.entries:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            try:
+                if self.resync_rooms:
+                    rooms, self.resync_rooms = sorted(self.resync_rooms), set()
+                    counters.resyncs += 1
+                    await self.send(self.encode({'type': 'resync', 'rooms': rooms}))
+                _, _, frame = self._pop()
+                await self.send(frame)
+                counters.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error writing WebSocket frame: {e}")
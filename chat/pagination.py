@@ -0,0 +1,108 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor or limit cannot be decoded."""
+
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(timestamp, pk):
+    """Encode a (timestamp, pk) position into an opaque URL-safe token."""
+    raw = json.dumps([timestamp.isoformat(), str(pk)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a token produced by `encode_cursor` back into (timestamp, pk)."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(timestamp), pk
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursor("Invalid cursor.")
+
+
+def cursor_position(cursor, model):
+    """Decode `cursor` into (timestamp, pk), with the pk converted to `model`'s primary key type."""
+    timestamp, pk = decode_cursor(cursor)
+    try:
+        return timestamp, model._meta.pk.to_python(pk)
+    except ValidationError:
+        raise InvalidCursor("Invalid cursor.")
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor("limit must be an integer.")
+    if limit < 1:
+        raise InvalidCursor("limit must be a positive integer.")
+    return min(limit, maximum)
+
+
+def paginate_keyset(queryset, params, time_field='timestamp'):
+    """
+    Slice `queryset` into one page using keyset pagination on (time_field, pk).
+
+    Reads `before`, `after` and `limit` from `params` (usually request.query_params).
+    Without a cursor the newest page is returned. Items are always returned in
+    chronological order; `prev_cursor` pages back in time (pass it as `?before=`)
+    and `next_cursor` pages forward (pass it as `?after=`). Each page costs one
+    indexed range scan of `limit + 1` rows, however deep into history it is.
+    """
+    before = params.get('before')
+    after = params.get('after')
+    if before and after:
+        raise InvalidCursor("Use either before or after, not both.")
+    limit = parse_limit(params.get('limit'))
+
+    if after:
+        timestamp, pk = cursor_position(after, queryset.model)
+        rows = list(
+            queryset.filter(
+                Q(**{f'{time_field}__gt': timestamp}) |
+                Q(**{time_field: timestamp, 'pk__gt': pk})
+            ).order_by(time_field, 'pk')[:limit + 1]
+        )
+        has_more = len(rows) > limit
+        items = rows[:limit]
+        has_newer, has_older = has_more, True
+    else:
+        if before:
+            timestamp, pk = cursor_position(before, queryset.model)
+            queryset = queryset.filter(
+                Q(**{f'{time_field}__lt': timestamp}) |
+                Q(**{time_field: timestamp, 'pk__lt': pk})
+            )
+        rows = list(queryset.order_by(f'-{time_field}', '-pk')[:limit + 1])
+        has_more = len(rows) > limit
+        items = rows[:limit][::-1]
+        has_newer, has_older = bool(before), has_more
+
+    next_cursor = prev_cursor = None
+    if items:
+        if has_newer:
+            last = items[-1]
+            next_cursor = encode_cursor(getattr(last, time_field), last.pk)
+        if has_older:
+            first = items[0]
+            prev_cursor = encode_cursor(getattr(first, time_field), first.pk)
+    elif after:
+        # Nothing newer yet; hand the same position back so clients can poll.
+        next_cursor = after
+
+    return KeysetPage(items, next_cursor, prev_cursor)
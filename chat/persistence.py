@@ -0,0 +1,155 @@
+"""
+Write-behind persistence for WebSocket messages (enabled with CHAT_WRITE_BEHIND).
+
+Consumers build the message instance in memory, broadcast it straight away and
+hand it to the per-process buffer for its model. The timestamp is assigned at
+receive time, and so is the UUID of a GroupMessage and the ``uuid`` of a private
+Message, so broadcasts carry the id clients dedupe on. (A private Message only
+gets its integer pk from the insert.)
+A reply to a group message that is still buffered points at the buffered
+instance (see ``find_pending``), which is inserted in the same or an earlier
+batch. The buffer inserts with ``bulk_create`` once
+CHAT_WRITE_BEHIND_BATCH_SIZE messages are pending or
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL seconds after the first pending message,
+whichever comes first.
+
+Durability guarantees:
+
+* A message is broadcast before it is committed. A hard crash of the worker
+  (SIGKILL, OOM) loses at most the unflushed batch of that process, i.e. no
+  more than one batch size or one flush interval worth of messages.
+* Graceful shutdown does not lose messages: every consumer disconnect flushes
+  the buffers, and an ``atexit`` hook flushes whatever is still pending.
+* If a batch insert fails, the batch is retried row by row so one bad row
+  cannot drop its neighbours; rows that still fail are logged and dropped.
+* Within a process, messages are written in receive order.
+"""
+import asyncio
+import atexit
+import logging
+from collections import Counter
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from . import search, unread
+from .models import Message, GroupMessage
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Collects unsaved instances of one model and inserts them in batches."""
+
+    def __init__(self, model, batch_size, flush_interval, on_flush=None):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.pending = []
+        self._timer = None
+        self._flush_task = None
+
+    async def add(self, instance):
+        self.pending.append(instance)
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_interval, self._flush_later)
+
+    def _flush_later(self):
+        # The event loop only keeps weak references to tasks, so hold on to it
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        batch = self._take()
+        if batch:
+            await database_sync_to_async(self.write)(batch)
+
+    def flush_sync(self):
+        batch = self._take()
+        if batch:
+            self.write(batch)
+
+    def _take(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Swapping the list without awaiting keeps concurrent add() calls safe
+        batch, self.pending = self.pending, []
+        return batch
+
+    def write(self, batch):
+        try:
+            saved = self.model.objects.bulk_create(batch)
+        except Exception as e:
+            logger.error(f"Bulk insert of {len(batch)} {self.model.__name__} rows failed, retrying row by row: {e}")
+            saved = []
+            for instance in batch:
+                try:
+                    instance.save(force_insert=True)
+                    saved.append(instance)
+                except Exception as e:
+                    logger.error(f"Dropping unsaved {self.model.__name__} {instance.pk}: {e}")
+        if saved and self.on_flush:
+            self.on_flush(saved)
+
+
+def _private_messages_flushed(messages):
+    # bulk_create skips post_save, so external search backends are fed here
+    search.get_backend().index(messages)
+    per_room = Counter((message.conversation, message.sender_id) for message in messages)
+    for (conversation, sender_id), count in per_room.items():
+        unread.message_created(conversation, sender_id, count)
+
+
+def _group_messages_flushed(messages):
+    search.get_backend().index(messages)
+    for group_id in {message.group_id for message in messages}:
+        unread.group_messages_changed(group_id)
+
+
+FLUSH_HOOKS = {
+    Message: _private_messages_flushed,
+    GroupMessage: _group_messages_flushed,
+}
+
+_buffers = {}
+
+
+def get_buffer(model):
+    if model not in _buffers:
+        _buffers[model] = WriteBehindBuffer(
+            model,
+            batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+            flush_interval=settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL,
+            on_flush=FLUSH_HOOKS.get(model),
+        )
+    return _buffers[model]
+
+
+def find_pending(model, pk):
+    """The buffered, not yet inserted instance of `model` with primary key `pk`, if any."""
+    buffer = _buffers.get(model)
+    if buffer is None:
+        return None
+    return next((instance for instance in buffer.pending if str(instance.pk) == str(pk)), None)
+
+
+async def enqueue(instance):
+    await get_buffer(type(instance)).add(instance)
+
+
+async def flush_all():
+    for buffer in list(_buffers.values()):
+        await buffer.flush()
+
+
+@atexit.register
+def _flush_on_exit():
+    for buffer in list(_buffers.values()):
+        try:
+            buffer.flush_sync()
+        except Exception as e:
+            logger.error(f"Error flushing {buffer.model.__name__} buffer on shutdown: {e}")
@@ -0,0 +1,139 @@
+"""
+Presence tracking in Redis; never touches the SQL database.
+
+Per user, Redis holds:
+
+* ``presence:conns:<user_id>`` - a sorted set of the user's open connections,
+  each scored with the time its lease runs out (PRESENCE_TTL seconds after its
+  last heartbeat), so crashed workers cannot leave users online
+* ``presence:seen:<user_id>`` - ISO timestamp of the last activity
+
+A user is online while at least one lease is live. Heartbeats re-add their
+connection, so a connection whose lease lapsed (or whose whole key expired) is
+counted again as soon as it is heard from, and a disconnect only removes its own
+member.
+
+Connects and disconnects are written immediately. Heartbeats and other activity
+only mark the connection as touched; each process refreshes all touched
+connections in one pipeline every PRESENCE_FLUSH_INTERVAL seconds, so a burst
+of heartbeats costs a single round trip.
+"""
+import asyncio
+import logging
+import time
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_async_client = None
+_sync_client = None
+
+
+def conns_key(user_id):
+    return f"presence:conns:{user_id}"
+
+
+def seen_key(user_id):
+    return f"presence:seen:{user_id}"
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(settings.PRESENCE_REDIS_URL, decode_responses=True)
+    return _async_client
+
+
+def get_sync_client():
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.PRESENCE_REDIS_URL, decode_responses=True)
+    return _sync_client
+
+
+class PresenceTracker:
+    """Per-process writer that coalesces heartbeat refreshes into periodic pipelines."""
+
+    def __init__(self):
+        # (user_id, connection_id) pairs seen since the last flush
+        self.touched = set()
+        self._timer = None
+        self._flush_task = None
+
+    async def connected(self, user_id, connection_id):
+        await self._write(user_id, connection_id, connected=True)
+
+    async def disconnected(self, user_id, connection_id):
+        self.touched.discard((user_id, connection_id))
+        await self._write(user_id, connection_id, connected=False)
+
+    def touch(self, user_id, connection_id):
+        """Record activity; the refresh is written with the next batch."""
+        self.touched.add((user_id, connection_id))
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(settings.PRESENCE_FLUSH_INTERVAL, self._flush_later)
+
+    def _flush_later(self):
+        # The event loop only keeps weak references to tasks, so hold on to it
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        self._timer = None
+        touched, self.touched = self.touched, set()
+        if not touched:
+            return
+        now = time.time()
+        seen = timezone.now().isoformat()
+        try:
+            async with get_async_client().pipeline(transaction=False) as pipe:
+                for user_id, connection_id in touched:
+                    self._renew(pipe, user_id, connection_id, now)
+                for user_id in {user_id for user_id, _ in touched}:
+                    pipe.set(seen_key(user_id), seen, ex=settings.PRESENCE_LAST_SEEN_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error refreshing presence for {len(touched)} connections: {e}")
+
+    def _renew(self, pipe, user_id, connection_id, now):
+        key = conns_key(user_id)
+        pipe.zadd(key, {connection_id: now + settings.PRESENCE_TTL})
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.expire(key, settings.PRESENCE_TTL)
+
+    async def _write(self, user_id, connection_id, connected):
+        try:
+            async with get_async_client().pipeline(transaction=True) as pipe:
+                if connected:
+                    self._renew(pipe, user_id, connection_id, time.time())
+                else:
+                    pipe.zrem(conns_key(user_id), connection_id)
+                pipe.set(seen_key(user_id), timezone.now().isoformat(), ex=settings.PRESENCE_LAST_SEEN_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error updating presence for user {user_id}: {e}")
+
+
+tracker = PresenceTracker()
+
+
+def lookup(user_ids):
+    """Bulk presence for `user_ids`: {user_id: {'online': bool, 'last_seen': iso or None}}."""
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not user_ids:
+        return {}
+    now = time.time()
+    pipe = get_sync_client().pipeline(transaction=False)
+    for user_id in user_ids:
+        # Only live leases count; lapsed members are pruned by the next write
+        pipe.zcount(conns_key(user_id), f'({now}', '+inf')
+    pipe.mget([seen_key(user_id) for user_id in user_ids])
+    *connections, last_seen = pipe.execute()
+    return {
+        user_id: {'online': count > 0, 'last_seen': seen}
+        for user_id, count, seen in zip(user_ids, connections, last_seen)
+    }
@@ -7,4 +7,7 @@ websocket_urlpatterns = [
 
     # Group chat route
     re_path(r'ws/group-chat/(?P<group_id>[0-9a-f-]+)/$', consumers.GroupChatConsumer.as_asgi()),
+
+    # One connection for all of a user's private chats and groups
+    re_path(r'ws/multiplex/$', consumers.MultiplexConsumer.as_asgi()),
 ]
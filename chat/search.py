@@ -0,0 +1,222 @@
+"""
+Message search over private and group messages.
+
+Searching goes through a pluggable backend chosen by CHAT_SEARCH_BACKEND (a
+dotted path). Leaving it empty selects ``Fts5SearchBackend`` on SQLite and
+``DatabaseSearchBackend`` everywhere else. A backend implements:
+
+* ``search(model, query, room_ids, limit, offset)`` - ranked ``[(pk, score)]``,
+  lower score is better, restricted to messages in ``room_ids`` (None = no scope)
+* ``index(instances)`` / ``remove(instances)`` - incremental sync, called on
+  message create/edit/delete (signals) and for write-behind batches
+* ``rebuild()`` - re-index everything (``manage.py rebuild_search_index``)
+
+The FTS5 backend uses FTS5 tables kept in sync by SQLite triggers, so bulk
+inserts and queryset updates are indexed too and its ``index``/``remove`` are
+no-ops. Private messages are indexed by their integer id (migration 0012); group
+messages have UUID ids, so they are indexed by a stable integer key from
+chat_groupmessage_fts_keys (migration 0017). The room column is indexed as well,
+which lets membership scoping run inside the inverted index; the join back to
+the message table checks the room again, so a stale index entry cannot leak a
+message from another room.
+"""
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import PrivateChatRoom, Message, GroupChatRoom, GroupMessage
+
+MAX_SEARCH_OFFSET = 1000
+
+SearchHit = namedtuple('SearchHit', ['kind', 'message', 'score'])
+
+KINDS = {
+    'private': Message,
+    'group': GroupMessage,
+}
+
+
+def query_terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+class SearchBackend:
+    def search(self, model, query, room_ids, limit, offset=0):
+        raise NotImplementedError
+
+    def index(self, instances):
+        pass
+
+    def remove(self, instances):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Portable fallback: AND of icontains terms, newest first. Scans, so keep it for small tables."""
+
+    def search(self, model, query, room_ids, limit, offset=0):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        messages = model.objects.all()
+        for term in terms:
+            messages = messages.filter(content__icontains=term)
+        if room_ids is not None:
+            messages = messages.filter(**{f'{room_field(model)}__in': room_ids})
+        pks = messages.order_by('-timestamp').values_list('pk', flat=True)[offset:offset + limit]
+        return [(pk, 0.0) for pk in pks]
+
+
+class Fts5SearchBackend(SearchBackend):
+    """SQLite FTS5 inverted index ranked with bm25 (see migrations 0012 and 0017)."""
+
+    # model -> (fts table, indexed room column, table mapping fts rowids to message ids or None)
+    TABLES = {
+        Message: ('chat_message_fts', 'conversation_id', None),
+        GroupMessage: ('chat_groupmessage_fts', 'group_id', 'chat_groupmessage_fts_keys'),
+    }
+
+    @staticmethod
+    def room_token(room_id):
+        # Group ids are stored as 32-char hex on SQLite, which FTS5 reads as one token
+        return room_id.hex if hasattr(room_id, 'hex') else str(room_id)
+
+    def match_expression(self, model, query, room_ids):
+        terms = query_terms(query)
+        if not terms:
+            return None
+        # Quote every term so user input cannot inject FTS5 operators; the
+        # last one is a prefix match for search-as-you-type.
+        phrase = ' '.join(f'"{term}"' for term in terms) + '*'
+        expression = f'content : ({phrase})'
+        if room_ids is not None:
+            _, room_column, _ = self.TABLES[model]
+            rooms = ' OR '.join(f'"{self.room_token(room_id)}"' for room_id in room_ids)
+            expression += f' AND {room_column} : ({rooms})'
+        return expression
+
+    def search(self, model, query, room_ids, limit, offset=0):
+        if room_ids is not None and not room_ids:
+            return []
+        expression = self.match_expression(model, query, room_ids)
+        if expression is None:
+            return []
+        fts_table, room_column, keys_table = self.TABLES[model]
+        table = model._meta.db_table
+        pk_column = model._meta.pk.column
+        if keys_table is None:
+            join = f'JOIN {table} AS m ON m.{pk_column} = hits.rowid'
+        else:
+            join = (
+                f'JOIN {keys_table} AS k ON k.rowid = hits.rowid '
+                f'JOIN {table} AS m ON m.{pk_column} = k.message_id'
+            )
+        params = [expression, limit, offset]
+        where = ''
+        if room_ids is not None:
+            room = model._meta.get_field(room_field(model))
+            params += [room.get_db_prep_value(room_id, connection) for room_id in room_ids]
+            where = f"WHERE m.{room_column} IN ({', '.join(['%s'] * len(room_ids))}) "
+        # ORDER BY rank inside the FTS query lets FTS5 keep a top-N heap
+        # instead of sorting every match.
+        sql = (
+            f'SELECT m.{pk_column}, hits.rank FROM ('
+            f'  SELECT rowid, rank FROM {fts_table} WHERE {fts_table} MATCH %s'
+            f'  ORDER BY rank LIMIT %s OFFSET %s'
+            f') AS hits {join} {where}ORDER BY hits.rank'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        pk_field = model._meta.pk
+        return [(pk_field.to_python(pk), score) for pk, score in rows]
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            for model, (fts_table, room_column, keys_table) in self.TABLES.items():
+                if keys_table is None:
+                    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+                    continue
+                # Contentless: give every message a key, then re-insert from the table
+                table = model._meta.db_table
+                cursor.execute(f"DELETE FROM {keys_table} WHERE message_id NOT IN (SELECT id FROM {table})")
+                cursor.execute(f"INSERT OR IGNORE INTO {keys_table}(message_id) SELECT id FROM {table}")
+                cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('delete-all')")
+                cursor.execute(
+                    f"INSERT INTO {fts_table}(rowid, content, {room_column}) "
+                    f"SELECT k.rowid, m.content, m.{room_column} FROM {keys_table} AS k "
+                    f"JOIN {table} AS m ON m.id = k.message_id"
+                )
+
+
+def room_field(model):
+    return 'conversation_id' if model is Message else 'group_id'
+
+
+def room_id(message):
+    return getattr(message, room_field(type(message)))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if settings.CHAT_SEARCH_BACKEND:
+            backend_class = import_string(settings.CHAT_SEARCH_BACKEND)
+        elif connection.vendor == 'sqlite':
+            backend_class = Fts5SearchBackend
+        else:
+            backend_class = DatabaseSearchBackend
+        _backend = backend_class()
+    return _backend
+
+
+def visible_room_ids(user, kind):
+    """Rooms whose messages `user` may search: visible private chats or active group memberships."""
+    if kind == 'private':
+        rooms = PrivateChatRoom.objects.filter(
+            Q(participant_1=user, is_deleted_for_participant_1=False) |
+            Q(participant_2=user, is_deleted_for_participant_2=False)
+        )
+    else:
+        rooms = GroupChatRoom.objects.filter(members__user=user, is_active=True)
+    return list(rooms.values_list('id', flat=True))
+
+
+def search_messages(user, query, kinds=tuple(KINDS), limit=50, offset=0):
+    """
+    Ranked messages matching `query` in rooms the user can see, as SearchHits.
+
+    Each kind is searched separately for its best offset+limit hits, and the
+    hits are merged by score, so `offset` is capped at MAX_SEARCH_OFFSET.
+    """
+    backend = get_backend()
+    offset = min(offset, MAX_SEARCH_OFFSET)
+    ranked = []
+    for kind in kinds:
+        model = KINDS[kind]
+        hits = backend.search(model, query, visible_room_ids(user, kind), offset + limit)
+        ranked.extend((score, position, kind, pk) for position, (pk, score) in enumerate(hits))
+    ranked.sort(key=lambda hit: (hit[0], hit[1]))
+    ranked = ranked[offset:offset + limit]
+
+    loaded = {
+        kind: KINDS[kind].objects.select_related('sender').in_bulk(
+            [pk for _, _, hit_kind, pk in ranked if hit_kind == kind]
+        )
+        for kind in kinds
+    }
+    return [
+        SearchHit(kind, loaded[kind][pk], score)
+        for score, _, kind, pk in ranked
+        if pk in loaded[kind]
+    ]
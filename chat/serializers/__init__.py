@@ -1,3 +1,8 @@
 from .one_to_one import UserPublicSerializer,PrivateChatRoomSerializer,MessageSerializer
-from .group_chat import UserPublicSerializer,GroupMemberSerializer,GroupChatRoomSerializer,GroupMessageSerializer
+from .group_chat import UserPublicSerializer,GroupMemberSerializer,GroupChatRoomSerializer,GroupSummarySerializer,GroupMessageSerializer
 
+
+__all__ = [
+    'UserPublicSerializer', 'PrivateChatRoomSerializer', 'MessageSerializer',
+    'GroupMemberSerializer', 'GroupChatRoomSerializer', 'GroupSummarySerializer', 'GroupMessageSerializer',
+]
@@ -4,7 +4,9 @@ from chat.models import (
     GroupMember,
     GroupMessage,
 )
+from gistconnect import renditions
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 
 User = get_user_model()
 
@@ -156,13 +158,52 @@ class GroupChatRoomSerializer(serializers.ModelSerializer):
         return data
 
 
+class GroupSummarySerializer(serializers.ModelSerializer):
+    """
+    Compact group projection for sidebars; expects the annotations added by the list view
+    and the user's {group_id: unread} map as context['unread_counts']
+    """
+    member_count = serializers.IntegerField(source='num_members', read_only=True)
+    last_activity = serializers.DateTimeField(read_only=True)
+    unread_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GroupChatRoom
+        fields = ['id', 'name', 'member_count', 'last_activity', 'unread_count']
+        read_only_fields = fields
+
+    def get_unread_count(self, obj):
+        return self.context.get('unread_counts', {}).get(str(obj.id), 0)
+
+
 class GroupMessageSerializer(serializers.ModelSerializer):
     # group = serializers.PrimaryKeyRelatedField(read_only=True)
     sender = UserPublicSerializer(read_only=True)
     id = serializers.UUIDField(read_only=True)
+    renditions = serializers.SerializerMethodField()
+    file_url = serializers.SerializerMethodField()
     class Meta:
         model = GroupMessage
-        fields = [ 'sender', 'content', 'message_type','reply_to', 'timestamp','is_edited','edited_at']
+        fields = [ 'id', 'sender', 'content', 'message_type','reply_to', 'timestamp','is_edited','edited_at', 'renditions',
+                   'file_url', 'filename']
 
         read_only_fields = ['timestamp','is_edited', 'edited_at']
+
+    def get_renditions(self, obj):
+        if obj._state.adding:
+            return None
+        request = self.context.get('request')
+        return renditions.as_urls(
+            obj.renditions,
+            request.build_absolute_uri('/') if request else None,
+            reverse('group-message-file', args=[obj.group_id, obj.id]),
+        )
+
+    def get_file_url(self, obj):
+        # Archived messages (unsaved instances) are not served by the media endpoint
+        if not (obj.doc or obj.image) or obj._state.adding:
+            return None
+        url = reverse('group-message-file', args=[obj.group_id, obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
         
@@ -25,6 +25,9 @@ class PrivateChatRoomSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
     def get_unread_count(self, obj):
+        # Prefer the count annotated by get_user_chats
+        if hasattr(obj, 'unread_messages'):
+            return obj.unread_messages
         user = self.context['request'].user
         return obj.messages.filter(is_read=False).exclude(sender=user).count()
 
@@ -51,6 +54,7 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = [
             'id',
+            'uuid',             # Same as message_id in chat_message broadcasts
             'conversation_id',  # Used on creation
             'conversation',     # Used on read
             'sender_id',        # Used on creation
@@ -60,7 +64,7 @@ class MessageSerializer(serializers.ModelSerializer):
             'timestamp',
             'is_read'
         ]
-        read_only_fields = ['id', 'timestamp', 'conversation', 'sender']
+        read_only_fields = ['id', 'uuid', 'timestamp', 'conversation', 'sender']
 
 
 class GroupChatRoomSerializer(serializers.ModelSerializer):
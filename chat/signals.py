@@ -0,0 +1,52 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from . import archive, blobs, search, unread
+from .middleware import user_cache
+from .models import ArchiveSegment, GroupChatRoom, GroupMember, GroupMessage, Message, PrivateChatRoom
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Drop the WebSocket auth cache entry so the next handshake sees the change
+    user_cache.invalidate(instance.id)
+
+
+@receiver(post_save, sender=GroupMember)
+@receiver(post_delete, sender=GroupMember)
+def invalidate_group_unread(sender, instance, **kwargs):
+    # The member's cached group unread counts no longer cover the right groups
+    unread.group_unread_changed(instance.user_id)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_save, sender=GroupMessage)
+def index_message(sender, instance, **kwargs):
+    search.get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Message)
+@receiver(post_delete, sender=GroupMessage)
+def unindex_message(sender, instance, **kwargs):
+    search.get_backend().remove([instance])
+
+
+@receiver(post_delete, sender=PrivateChatRoom)
+@receiver(post_delete, sender=GroupChatRoom)
+def delete_archived_messages(sender, instance, **kwargs):
+    # Archived messages have no foreign key to cascade through
+    kind = 'private' if sender is PrivateChatRoom else 'group'
+    ArchiveSegment.objects.filter(kind=kind, room_id=str(instance.id)).delete()
+
+
+@receiver(post_delete, sender=GroupMessage)
+def release_attachments(sender, instance, **kwargs):
+    blobs.release(blobs.attachments(instance))
+
+
+@receiver(post_delete, sender=ArchiveSegment)
+def release_archived_attachments(sender, instance, **kwargs):
+    blobs.release(archive.segment_attachments(instance))
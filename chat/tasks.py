@@ -0,0 +1,83 @@
+from celery import shared_task
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.urls import reverse
+from gistconnect import renditions
+from . import archive, blobs, unread, uploads
+from .codecs import encode_event
+from .models import GroupMessage
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_unread_counters():
+    """
+    Periodically rebuild the Redis unread counters from the database.
+    """
+    rooms = unread.reconcile_unread_counters()
+    logger.info(f"Reconciled unread counters for {rooms} rooms")
+    return f"Reconciled unread counters for {rooms} rooms."
+
+
+@shared_task
+def archive_old_messages():
+    """
+    Move messages older than CHAT_ARCHIVE_AFTER_DAYS into archive segments.
+    """
+    batches, messages = archive.archive_old_messages()
+    logger.info(f"Archived {messages} messages in {batches} batches")
+    return f"Archived {messages} messages in {batches} batches."
+
+
+@shared_task
+def generate_group_image_renditions(message_id, base_url=None):
+    """
+    Write the renditions of a group image message and tell the group they are ready.
+    """
+    try:
+        message = GroupMessage.objects.get(id=message_id)
+    except GroupMessage.DoesNotExist:
+        return f"Group message {message_id} no longer exists."
+    if not message.image:
+        return f"Group message {message_id} has no image."
+
+    with message.image.open('rb') as image:
+        generated = renditions.generate(image, blobs.digest_of(message.image.name))
+    message.renditions = {**message.renditions, **generated, 'source': message.image.name}
+    GroupMessage.objects.filter(id=message.id).update(renditions=message.renditions)
+
+    # Delivered through the consumers' group_message handler, like the original broadcast
+    async_to_sync(get_channel_layer().group_send)(
+        f"group_{message.group_id}",
+        encode_event({
+            'type': 'group_message_renditions',
+            'room': f'group:{message.group_id}',
+            'message_id': str(message.id),
+            'renditions': renditions.as_urls(
+                message.renditions, base_url, reverse('group-message-file', args=[message.group_id, message.id])
+            ),
+        }, handler='group_message')
+    )
+    return f"Generated {len(generated['sizes'])} renditions for group message {message_id}."
+
+
+@shared_task
+def expire_upload_sessions():
+    """
+    Remove abandoned chunked uploads and their partial files.
+    """
+    expired = uploads.expire_stale_sessions()
+    logger.info(f"Expired {expired} upload sessions")
+    return f"Expired {expired} upload sessions."
+
+
+@shared_task
+def collect_unreferenced_blobs():
+    """
+    Delete stored attachments no message has referenced for BLOB_GC_GRACE seconds.
+    """
+    deleted = blobs.collect_garbage()
+    logger.info(f"Deleted {deleted} unreferenced blobs")
+    return f"Deleted {deleted} unreferenced blobs."
@@ -0,0 +1,64 @@
+import hashlib
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from chat import archive, blobs
+from chat.models import ArchiveSegment, Blob, GroupChatRoom, GroupMember, GroupMessage
+
+User = get_user_model()
+
+
+@pytest.mark.django_db
+def test_identical_uploads_share_one_reference_counted_blob(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    user = User.objects.create_user(
+        email='poster@example.com', first_name='post', last_name='er', username='poster', password='pass'
+    )
+    groups = [GroupChatRoom.objects.create(name=name, created_by=user) for name in ('one', 'two', 'three')]
+    for group in groups:
+        GroupMember.objects.create(group=group, user=user)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    content = b'%PDF-1.4 forwarded everywhere'
+    for group, name in zip(groups, ('memo.pdf', 'memo (1).pdf', 'memo.PDF')):
+        response = client.post(
+            reverse('group-upload', args=[group.id]), {'doc': SimpleUploadedFile(name, content)}, format='multipart'
+        )
+        assert response.status_code == 200
+        assert response.data['filename'] == name
+
+    blob = Blob.objects.get()
+    assert (blob.sha256, blob.refcount) == (hashlib.sha256(content).hexdigest(), 3)
+    assert blob.name == blobs.blob_path(blob.sha256, 'memo.pdf')
+    assert set(GroupMessage.objects.values_list('doc', flat=True)) == {blob.name}
+    with default_storage.open(blob.name) as stored:
+        assert stored.read() == content
+    assert default_storage.listdir(f'blobs/{blob.sha256[:2]}')[1] == [blob.name.rsplit('/', 1)[1]]
+
+    # Archived messages keep their reference until their segment goes
+    messages = list(GroupMessage.objects.order_by('timestamp'))
+    GroupMessage.objects.filter(pk=messages[0].pk).update(timestamp=timezone.now() - timedelta(days=30))
+    assert archive.archive_old_messages(horizon_days=7) == (1, 1)
+    messages[1].delete()
+    blob.refresh_from_db()
+    assert (blob.refcount, blob.released_at) == (2, None)
+
+    messages[2].delete()
+    ArchiveSegment.objects.all().delete()
+    blob.refresh_from_db()
+    assert blob.refcount == 0 and blob.released_at is not None
+
+    # Unreferenced blobs survive the grace period, then go in the next run
+    assert blobs.collect_garbage(grace=3600) == 0
+    assert blobs.collect_garbage(grace=0) == 1
+    assert not Blob.objects.exists()
+    assert not default_storage.exists(blob.name)
@@ -0,0 +1,13 @@
+import msgpack
+
+from chat.codecs import encode_event, json_to_msgpack
+
+
+def test_broadcast_events_carry_one_encoding_transcoded_once_for_msgpack():
+    payload = {'type': 'group_message', 'room': 'group:1', 'message': 'héllo', 'reply_to': None}
+    event = encode_event(payload)
+
+    assert set(event) == {'type', 'room', 'coalesce_key', 'text'}
+    frame = json_to_msgpack(event['text'])
+    assert msgpack.unpackb(frame) == payload
+    assert json_to_msgpack(encode_event(payload)['text']) is frame
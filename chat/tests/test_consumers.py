@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chat import persistence
+from chat.models import GroupChatRoom, GroupMember, Message, PrivateChatRoom
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+@pytest.fixture
+def channel_settings(settings):
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    settings.PRESENCE_ENABLED = False
+    return settings
+
+
+def make_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', first_name=name, last_name='test', username=name, password='pass'
+    )
+
+
+async def connect(path, user):
+    communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+    communicator.scope['user'] = user
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+@pytest.mark.django_db(transaction=True)
+def test_removed_member_loses_multiplex_and_group_sockets(channel_settings):
+    admin = make_user('admin')
+    member = make_user('member')
+    group = GroupChatRoom.objects.create(name='revocable', created_by=admin)
+    GroupMember.objects.create(group=group, user=admin, role='admin')
+    GroupMember.objects.create(group=group, user=member)
+    client = APIClient()
+    client.force_authenticate(admin)
+
+    async def scenario():
+        multiplex = await connect('/ws/multiplex/', member)
+        group_socket = await connect(f'/ws/group-chat/{group.id}/', member)
+
+        # Valid JSON that is not an object is rejected without killing the connection
+        await multiplex.send_json_to([1])
+        assert (await multiplex.receive_json_from())['type'] == 'error'
+
+        await multiplex.send_json_to({'action': 'subscribe', 'room': f'group:{group.id}'})
+        assert (await multiplex.receive_json_from())['type'] == 'subscribed'
+
+        response = await sync_to_async(client.delete)(
+            reverse('remove-group-member', args=[group.id]), {'user_id': str(member.id)}
+        )
+        assert response.status_code == 204
+
+        assert await multiplex.receive_json_from() == {'type': 'unsubscribed', 'room': f'group:{group.id}'}
+        assert (await group_socket.receive_output())['type'] == 'websocket.close'
+
+        await multiplex.send_json_to({'action': 'send', 'room': f'group:{group.id}', 'message': 'still here?'})
+        assert (await multiplex.receive_json_from())['detail'] == "Not subscribed to this room."
+        await multiplex.disconnect()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.django_db(transaction=True)
+def test_write_behind_private_messages_are_broadcast_with_their_id(channel_settings):
+    channel_settings.CHAT_WRITE_BEHIND = True
+    channel_settings.CHAT_WRITE_BEHIND_BATCH_SIZE = 100
+    channel_settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL = 60
+    persistence._buffers.clear()
+    sender = make_user('sender')
+    room = PrivateChatRoom.objects.create(participant_1=sender, participant_2=make_user('recipient'))
+
+    async def scenario():
+        socket = await connect(f'/ws/chat/{room.id}/', sender)
+        await socket.send_json_to({'message': 'buffered'})
+        event = await socket.receive_json_from()
+        assert not await sync_to_async(Message.objects.exists)()
+        await socket.disconnect()
+        return event
+
+    event = asyncio.run(scenario())
+    persistence._buffers.clear()
+
+    assert event['message_id'] == str(Message.objects.get(content='buffered').uuid)
@@ -0,0 +1,202 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from chat import unread
+from chat.models import GroupChatRoom, GroupMember, GroupMessage
+from chat.pagination import encode_cursor
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', first_name=name, last_name='test', username=name, password='pass'
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('group_count', [1, 10])
+def test_group_list_query_count_is_constant(django_assert_num_queries, group_count):
+    user = make_user('owner')
+    others = [make_user(f'member{i}') for i in range(3)]
+    for i in range(group_count):
+        group = GroupChatRoom.objects.create(name=f'group {i}', created_by=user)
+        GroupMember.objects.create(group=group, user=user, role='admin')
+        for other in others:
+            GroupMember.objects.create(group=group, user=other)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    # One query for the annotated groups, one for their members and users
+    with django_assert_num_queries(2):
+        response = client.get(reverse('group-list-create'))
+
+    assert response.status_code == 200
+    assert len(response.data) == group_count
+    for group in response.data:
+        assert group['member_count'] == 4
+        assert group['is_full'] is False
+        assert len(group['members']) == 4
+
+
+@pytest.mark.django_db
+def test_group_summary_unread_count_follows_read_watermark():
+    user = make_user('reader')
+    sender = make_user('sender')
+    group = GroupChatRoom.objects.create(name='watermark', created_by=sender)
+    GroupMember.objects.create(group=group, user=sender, role='admin')
+    member = GroupMember.objects.create(group=group, user=user)
+    messages = [GroupMessage.objects.create(group=group, sender=sender, content=str(i)) for i in range(3)]
+    GroupMessage.objects.create(group=group, sender=user, content='own')
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get(reverse('group-list-create'), {'view': 'summary'})
+    assert response.data[0]['unread_count'] == 3
+
+    assert member.advance_read_watermark(messages[1]) is True
+    assert member.advance_read_watermark(messages[0]) is False
+    response = client.get(reverse('group-list-create'), {'view': 'summary'})
+    assert response.data[0]['unread_count'] == 1
+
+
+@pytest.fixture
+def local_cache(settings):
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    from django.core.cache import cache
+    cache.clear()
+    return cache
+
+
+@pytest.mark.django_db
+def test_group_unread_counts_are_aggregated_and_cached(django_assert_num_queries, local_cache):
+    from chat import unread
+
+    user = make_user('reader')
+    sender = make_user('sender')
+    groups = []
+    for i in range(3):
+        group = GroupChatRoom.objects.create(name=f'group {i}', created_by=sender)
+        GroupMember.objects.create(group=group, user=user)
+        for j in range(i):
+            GroupMessage.objects.create(group=group, sender=sender, content=str(j))
+        groups.append(group)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    # Membership lookup for the version snapshot, then one grouped COUNT for all groups
+    with django_assert_num_queries(2):
+        unread.get_group_unread(user.id)
+    with django_assert_num_queries(0):
+        response = client.get(reverse('group-unread-counts'))
+    assert response.data['unread_counts'] == {str(group.id): i for i, group in enumerate(groups)}
+    assert response.data['total_unread'] == 3
+
+    GroupMessage.objects.create(group=groups[0], sender=sender, content='new')
+    unread.group_messages_changed(groups[0].id)
+    response = client.get(reverse('group-unread-counts'))
+    assert response.data['unread_counts'][str(groups[0].id)] == 1
+    assert response.data['total_unread'] == 4
+
+
+@pytest.mark.django_db
+def test_group_history_rejects_cursor_with_malformed_pk():
+    user = make_user('pager')
+    group = GroupChatRoom.objects.create(name='cursors', created_by=user)
+    GroupMember.objects.create(group=group, user=user, role='admin')
+    GroupMessage.objects.create(group=group, sender=user, content='hello')
+    client = APIClient()
+    client.force_authenticate(user)
+    cursor = encode_cursor(timezone.now(), 'not-a-uuid')
+
+    for param in ('before', 'after'):
+        response = client.get(reverse('group-messages', args=[group.id]), {param: cursor})
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_group_summary_view_returns_compact_projection():
+    user = make_user('summarised')
+    quiet = GroupChatRoom.objects.create(name='quiet', created_by=user)
+    busy = GroupChatRoom.objects.create(name='busy', created_by=user)
+    for group in (quiet, busy):
+        GroupMember.objects.create(group=group, user=user, role='admin')
+    GroupMember.objects.create(group=busy, user=make_user('talker'))
+    latest = GroupMessage.objects.create(group=busy, sender=user, content='hi')
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get(reverse('group-list-create'), {'view': 'summary'})
+
+    assert response.status_code == 200
+    summaries = {summary['name']: summary for summary in response.data}
+    assert set(summaries['busy']) == {'id', 'name', 'member_count', 'last_activity', 'unread_count'}
+    assert summaries['busy']['member_count'] == 2
+    assert summaries['quiet']['member_count'] == 1
+    assert summaries['busy']['last_activity'] == latest.timestamp.isoformat().replace('+00:00', 'Z')
+    assert summaries['quiet']['last_activity'] == quiet.created_at.isoformat().replace('+00:00', 'Z')
+
+
+@pytest.mark.django_db
+def test_group_members_are_cursor_paginated_by_join_time():
+    owner = make_user('roster')
+    group = GroupChatRoom.objects.create(name='roster', created_by=owner)
+    GroupMember.objects.create(group=group, user=owner, role='admin')
+    for i in range(4):
+        GroupMember.objects.create(group=group, user=make_user(f'joiner{i}'))
+    client = APIClient()
+    client.force_authenticate(owner)
+    url = reverse('group-members', args=[group.id])
+
+    newest = client.get(url, {'limit': 3})
+    assert newest.status_code == 200
+    assert [member['user']['username'] for member in newest.data['results']] == ['joiner1', 'joiner2', 'joiner3']
+    assert newest.data['next_cursor'] is None
+
+    oldest = client.get(url, {'limit': 3, 'before': newest.data['prev_cursor']})
+    assert [member['user']['username'] for member in oldest.data['results']] == ['roster', 'joiner0']
+    assert oldest.data['prev_cursor'] is None
+
+    outsider = APIClient()
+    outsider.force_authenticate(make_user('outsider'))
+    assert outsider.get(url).status_code == 403
+
+
+@pytest.mark.django_db
+def test_unread_messages_survive_deletion_of_the_watermark_message():
+    user = make_user('survivor')
+    sender = make_user('poster')
+    group = GroupChatRoom.objects.create(name='deleted watermark', created_by=sender)
+    member = GroupMember.objects.create(group=group, user=user)
+    messages = [GroupMessage.objects.create(group=group, sender=sender, content=str(i)) for i in range(3)]
+    member.advance_read_watermark(messages[1])
+
+    messages[1].delete()
+    member.refresh_from_db()
+
+    assert member.last_read_message_id is None
+    assert list(member.unread_messages()) == [messages[2]]
+
+
+@pytest.mark.django_db
+def test_group_unread_counts_match_watermark_including_timestamp_ties():
+    user = make_user('tied')
+    sender = make_user('burst')
+    group = GroupChatRoom.objects.create(name='ties', created_by=sender)
+    member = GroupMember.objects.create(group=group, user=user)
+    same_instant = timezone.now() + timedelta(seconds=1)
+    tied = [GroupMessage.objects.create(group=group, sender=sender, content=str(i)) for i in range(4)]
+    GroupMessage.objects.filter(pk__in=[message.pk for message in tied]).update(timestamp=same_instant)
+    tied = sorted(GroupMessage.objects.filter(group=group), key=lambda message: message.pk)
+
+    assert unread.count_group_unread(user.id) == {str(group.id): 4}
+    member.advance_read_watermark(tied[1])
+    assert unread.count_group_unread(user.id) == {str(group.id): 2} == {str(group.id): member.unread_messages().count()}
+
+    tied[1].delete()
+    member.refresh_from_db()
+    assert unread.count_group_unread(user.id) == {str(group.id): 0} == {str(group.id): member.unread_messages().count()}
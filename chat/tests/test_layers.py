@@ -0,0 +1,146 @@
+import asyncio
+
+import fakeredis
+import pytest
+from channels_redis.core import RedisChannelLayer
+from django.core.exceptions import ImproperlyConfigured
+from redis import exceptions as redis_exceptions
+
+from chat.layers import ShardedRedisChannelLayer
+
+
+def hosts(count):
+    return [f'redis://redis-{i}:6379/0' for i in range(count)]
+
+
+def test_ring_moves_only_the_keys_of_added_or_failed_hosts():
+    keys = [f'group_{i}' for i in range(4000)]
+    three = ShardedRedisChannelLayer(hosts=hosts(3))
+    four = ShardedRedisChannelLayer(hosts=hosts(4))
+    before = {key: three.consistent_hash(key) for key in keys}
+    after = {key: four.consistent_hash(key) for key in keys}
+
+    # Every host owns a fair share, and a new host only takes keys, never reshuffles others
+    assert all(700 < list(after.values()).count(index) < 1300 for index in range(4))
+    assert all(after[key] in (before[key], 3) for key in keys)
+
+    # Reordering the configured hosts moves nothing
+    reordered = ShardedRedisChannelLayer(hosts=list(reversed(hosts(3))))
+    assert all(reordered.hosts[reordered.consistent_hash(key)] == three.hosts[index] for key, index in before.items())
+
+    # A down host's keys spread over the survivors; everyone else's stay put
+    three.down = frozenset({1})
+    failed_over = {key: three.consistent_hash(key) for key in keys}
+    assert all(failed_over[key] == index for key, index in before.items() if index != 1)
+    assert {failed_over[key] for key, index in before.items() if index == 1} == {0, 2}
+
+
+
+class FakeHosts:
+    """One fakeredis server per configured host, shared by every layer attached to them."""
+
+    def __init__(self, count):
+        self.servers = [fakeredis.FakeServer() for _ in range(count)]
+        self.clients = {}
+
+    def layer(self, **kwargs):
+        layer = ShardedRedisChannelLayer(hosts=hosts(len(self.servers)), **kwargs)
+        layer.connection = self.connection
+        return layer
+
+    def connection(self, index):
+        if index not in self.clients:
+            self.clients[index] = fakeredis.FakeAsyncRedis(server=self.servers[index])
+        return self.clients[index]
+
+    def fail(self, index):
+        self.servers[index].connected = False
+
+    def restart(self, index):
+        # A restarted Redis answers again but has lost its keys
+        self.servers[index] = fakeredis.FakeServer()
+        self.clients.pop(index, None)
+
+
+async def process_on(redis, index):
+    """A layer (standing in for another server process) and a channel of it that live on host `index`."""
+    while True:
+        layer = redis.layer()
+        channel = await layer.new_channel()
+        if layer.consistent_hash(layer.non_local_name(channel)) == index:
+            return layer, channel
+
+
+async def receive(layer, channel, timeout=1):
+    return await asyncio.wait_for(layer.receive(channel), timeout)
+
+
+def test_group_send_fails_over_and_rejoins_groups_on_their_new_host():
+    redis = FakeHosts(3)
+    sender = redis.layer(failover_cooldown=0)
+
+    async def scenario():
+        owner = sender.route('room')
+        process, channel = await process_on(redis, (owner + 1) % 3)
+        await process.group_add('room', channel)
+
+        # The member's process notices too (on its next Redis error, or its probe
+        # timer) and re-adds its membership where the group now lives
+        redis.fail(owner)
+        await process.probe()
+        await sender.group_send('room', {'type': 'chat.message', 'text': 'during'})
+        assert sender.down == {owner}
+        assert await receive(process, channel) == {'type': 'chat.message', 'text': 'during'}
+
+        # Back, but empty: recovery re-adds the membership on the original owner
+        redis.restart(owner)
+        await process.probe()
+        await sender.group_send('room', {'type': 'chat.message', 'text': 'after'})
+        assert sender.down == frozenset()
+        assert await receive(process, channel) == {'type': 'chat.message', 'text': 'after'}
+
+    asyncio.run(scenario())
+
+
+def test_group_send_retries_only_the_channels_of_a_failed_host():
+    redis = FakeHosts(3)
+    sender = redis.layer()
+
+    async def scenario():
+        owner = sender.route('room')
+        lost_host, live_host = [index for index in range(3) if index != owner]
+        lost_process, lost = await process_on(redis, lost_host)
+        live_process, live = await process_on(redis, live_host)
+        await sender.group_add('room', lost)
+        await sender.group_add('room', live)
+
+        redis.fail(lost_host)
+        await sender.group_send('room', {'type': 'chat.message'})
+        assert sender.down == {lost_host}
+        assert await receive(lost_process, lost) == {'type': 'chat.message'}
+        assert await receive(live_process, live) == {'type': 'chat.message'}
+        # The healthy host's channel was not sent to again on the retry
+        with pytest.raises(asyncio.TimeoutError):
+            await receive(live_process, live, timeout=0.2)
+
+    asyncio.run(scenario())
+
+
+def test_group_send_raises_when_every_host_is_down():
+    redis = FakeHosts(2)
+    layer = redis.layer()
+
+    async def scenario():
+        await layer.group_add('room', await layer.new_channel())
+        redis.fail(0)
+        redis.fail(1)
+        with pytest.raises(redis_exceptions.ConnectionError):
+            await layer.group_send('room', {'type': 'chat.message'})
+
+    asyncio.run(scenario())
+
+
+def test_layer_refuses_a_channels_redis_without_its_internals(monkeypatch):
+    monkeypatch.delattr(RedisChannelLayer, '_map_channel_keys_to_connection')
+    with pytest.raises(ImproperlyConfigured, match='_map_channel_keys_to_connection'):
+        ShardedRedisChannelLayer(hosts=hosts(2))
@@ -0,0 +1,121 @@
+import io
+import os
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+from chat import blobs, tasks
+from chat.models import GroupChatRoom, GroupMember, GroupMessage
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', first_name=name, last_name='test', username=name, password='pass'
+    )
+
+
+@pytest.mark.django_db
+def test_group_files_are_member_only_ranged_and_cacheable(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    member, outsider = make_user('member'), make_user('outsider')
+    group = GroupChatRoom.objects.create(name='clips', created_by=member)
+    GroupMember.objects.create(group=group, user=member)
+    video = os.urandom(1000)
+    name = blobs.store(ContentFile(video), 'clip.mp4')
+    message = GroupMessage.objects.create(
+        group=group, sender=member, message_type='doc', doc=name, filename='clip.mp4', content=''
+    )
+    url = reverse('group-message-file', args=[group.id, message.id])
+    client = APIClient()
+
+    client.force_authenticate(outsider)
+    assert client.get(url).status_code == 403
+
+    client.force_authenticate(member)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content) == video
+    assert response['Content-Type'] == 'video/mp4'
+    assert response['ETag'] == f'"{blobs.digest_of(name)}"'
+    assert 'immutable' in response['Cache-Control']
+
+    assert client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+    partial = client.get(url, HTTP_RANGE='bytes=100-199')
+    assert (partial.status_code, partial['Content-Range']) == (206, 'bytes 100-199/1000')
+    assert b''.join(partial.streaming_content) == video[100:200]
+    assert b''.join(client.get(url, HTTP_RANGE='bytes=-10').streaming_content) == video[-10:]
+    assert client.get(url, HTTP_RANGE='bytes=1000-').status_code == 416
+    # A stale If-Range gets the whole file
+    assert client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"').status_code == 200
+
+    settings.MEDIA_SERVE_MODE = 'x-accel'
+    offloaded = client.get(url)
+    assert offloaded['X-Accel-Redirect'] == f'/protected-media/{name}'
+    assert offloaded.content == b''
+
+
+@pytest.mark.django_db
+def test_group_image_renditions_are_served_to_members_only(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.IMAGE_RENDITION_WIDTHS = [160]
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    member, outsider = make_user('member'), make_user('outsider')
+    group = GroupChatRoom.objects.create(name='photos', created_by=member)
+    GroupMember.objects.create(group=group, user=member)
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 200), 'teal').save(buffer, 'JPEG')
+    name = blobs.store(ContentFile(buffer.getvalue()), 'beach.jpg')
+    message = GroupMessage.objects.create(
+        group=group, sender=member, message_type='image', image=name, filename='beach.jpg', content=''
+    )
+    tasks.generate_group_image_renditions(str(message.id))
+    message.refresh_from_db()
+    rendition = message.renditions['sizes']['160']
+
+    url = reverse('group-message-file', args=[group.id, message.id])
+    client = APIClient()
+    client.force_authenticate(member)
+    links = client.get(reverse('group-messages', args=[group.id])).data['results'][0]['renditions']['sizes']
+    assert links == {'160': f'http://testserver{url}?width=160'}
+
+    client.force_authenticate(outsider)
+    assert client.get(url, {'width': '160'}).status_code == 403
+
+    client.force_authenticate(member)
+    response = client.get(url, {'width': '160'})
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(b''.join(response.streaming_content))).width == 160
+    assert response['Content-Type'] == 'image/webp'
+    assert response['ETag'] == f'"{blobs.digest_of(name)}-160"'
+    assert 'immutable' in response['Cache-Control']
+    assert client.get(url, {'width': '160'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+    assert client.get(url, {'width': '999'}).status_code == 404
+
+    settings.MEDIA_SERVE_MODE = 'x-accel'
+    assert client.get(url, {'width': '160'})['X-Accel-Redirect'] == f'/protected-media/{rendition}'
+
+
+@pytest.mark.django_db
+def test_legacy_file_names_are_quoted_for_the_front_proxy(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.MEDIA_SERVE_MODE = 'x-accel'
+    member = make_user('member')
+    group = GroupChatRoom.objects.create(name='legacy', created_by=member)
+    GroupMember.objects.create(group=group, user=member)
+    name = default_storage.save('group_docs/résumé final.pdf', ContentFile(b'%PDF'))
+    message = GroupMessage.objects.create(
+        group=group, sender=member, message_type='doc', doc=name, filename='résumé final.pdf', content=''
+    )
+    client = APIClient()
+    client.force_authenticate(member)
+
+    response = client.get(reverse('group-message-file', args=[group.id, message.id]))
+    assert response['X-Accel-Redirect'] == '/protected-media/group_docs/r%C3%A9sum%C3%A9%20final.pdf'
+    assert response['Cache-Control'] == 'private, no-cache'
@@ -0,0 +1,40 @@
+import asyncio
+
+from redis import exceptions as redis_exceptions
+
+from chat import middleware
+from chat.middleware import UserCache
+
+
+class UnreachableCache:
+    async def aget(self, key):
+        raise redis_exceptions.ConnectionError("Connection refused")
+
+    async def aset(self, key, value, timeout):
+        raise redis_exceptions.ConnectionError("Connection refused")
+
+    def delete(self, key):
+        raise redis_exceptions.ConnectionError("Connection refused")
+
+
+class User:
+    is_authenticated = True
+
+
+def test_unreachable_shared_cache_falls_back_to_the_loader(monkeypatch):
+    monkeypatch.setattr(middleware, 'cache', UnreachableCache())
+    user_cache = UserCache(maxsize=10, ttl=60, shared=True)
+    user = User()
+    loads = []
+
+    async def loader(user_id):
+        loads.append(user_id)
+        return user
+
+    assert asyncio.run(user_cache.get(7, loader)) is user
+    assert asyncio.run(user_cache.get(7, loader)) is user
+    assert loads == ['7']
+
+    user_cache.invalidate(7)
+    assert asyncio.run(user_cache.get(7, loader)) is user
+    assert loads == ['7', '7']
@@ -0,0 +1,118 @@
+import asyncio
+import base64
+import os
+import socket
+
+import uvicorn
+
+from chat import outbound
+
+
+def run_slow_client(policy, frames):
+    """Queue `frames` for a client that reads nothing until they are all queued."""
+    async def scenario():
+        sent, closed = [], []
+        reading = asyncio.Event()
+
+        async def send(frame):
+            await reading.wait()
+            sent.append(frame)
+
+        queue = outbound.OutboundQueue(
+            send=send,
+            encode=lambda payload: payload,
+            close=lambda code: closed.append(code) or asyncio.sleep(0),
+            maxsize=3,
+            policy=policy,
+        )
+        queue.start()
+        for frame, room, key in frames:
+            await queue.put(frame, room, key)
+            await asyncio.sleep(0)
+        reading.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        await queue.stop()
+        return sent, closed
+
+    return asyncio.run(scenario())
+
+
+def test_slow_clients_are_coalesced_resynced_or_disconnected(settings):
+    settings.WS_OUTBOUND_QUEUE_SIZE = 3
+    messages = [(f'm{i}', 'group:1', None) for i in range(5)]
+    typing = [('typing a', 'group:1', 'typing:group:1'), ('typing ab', 'group:1', 'typing:group:1')]
+
+    # The first frame is already with the (blocked) writer; three more fit the queue
+    sent, closed = run_slow_client('coalesce', messages[:1] + typing + messages[1:2])
+    assert sent == ['m0', 'typing ab', 'm1'] and not closed
+
+    dropped_before = outbound.counters.dropped
+    sent, _ = run_slow_client('drop_oldest', messages)
+    assert sent == ['m0', {'type': 'resync', 'rooms': ['group:1']}, 'm2', 'm3', 'm4']
+    assert outbound.counters.dropped == dropped_before + 1
+
+    sent, closed = run_slow_client('disconnect', messages)
+    assert closed == [outbound.SLOW_CONSUMER_CLOSE_CODE]
+    assert sent == []
+    assert outbound.counters.depth == 0
+
+
+def test_queue_fills_behind_a_client_that_stops_reading_under_uvicorn(settings):
+    """The deployed server (docker-compose.yml) makes send wait, so the bound and policy apply."""
+    settings.WS_OUTBOUND_QUEUE_SIZE = 4
+    frame = os.urandom(256 * 1024)
+
+    async def scenario():
+        accepted = asyncio.get_running_loop().create_future()
+
+        async def app(scope, receive, send):
+            await receive()
+            await send({'type': 'websocket.accept'})
+            accepted.set_result(send)
+            while (await receive())['type'] != 'websocket.disconnect':
+                pass
+
+        listener = socket.create_server(('127.0.0.1', 0))
+        server = uvicorn.Server(uvicorn.Config(app, ws='websockets', lifespan='off', log_level='warning'))
+        serving = asyncio.create_task(server.serve(sockets=[listener]))
+
+        # A client with a tiny receive window that reads the handshake and nothing else
+        client = socket.socket()
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        client.connect(listener.getsockname())
+        reader, writer = await asyncio.open_connection(sock=client)
+        writer.write(
+            b'GET / HTTP/1.1\r\nHost: test\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            b'Sec-WebSocket-Key: ' + base64.b64encode(os.urandom(16)) + b'\r\nSec-WebSocket-Version: 13\r\n\r\n'
+        )
+        assert (await reader.readuntil(b'\r\n\r\n')).startswith(b'HTTP/1.1 101')
+        send = await asyncio.wait_for(accepted, 5)
+
+        sent = []
+
+        async def send_frame(data):
+            await send({'type': 'websocket.send', 'bytes': data})
+            sent.append(data)
+
+        queue = outbound.OutboundQueue(
+            send=send_frame, encode=lambda payload: b'', close=None, policy='drop_oldest'
+        )
+        dropped_before = outbound.counters.dropped
+        queue.start()
+        for _ in range(100):
+            await queue.put(frame, 'group:1')
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.2)
+
+        # The socket stopped taking frames long before all 25 MiB went out
+        assert len(sent) < 50
+        assert len(queue) == 4
+        assert outbound.counters.dropped - dropped_before == 100 - len(sent) - len(queue) - 1
+
+        await queue.stop()
+        writer.close()
+        server.should_exit = True
+        await asyncio.wait_for(serving, 5)
+
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from chat import persistence
+from chat.models import GroupChatRoom, GroupMessage
+
+User = get_user_model()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reply_to_buffered_group_message_is_inserted_with_it(settings):
+    settings.CHAT_WRITE_BEHIND_BATCH_SIZE = 100
+    settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL = 60
+    persistence._buffers.clear()
+    user = User.objects.create_user(
+        email='writer@example.com', first_name='w', last_name='b', username='writer', password='pass'
+    )
+    group = GroupChatRoom.objects.create(name='buffered', created_by=user)
+
+    async def scenario():
+        original = GroupMessage(group=group, sender=user, content='first', timestamp=timezone.now())
+        await persistence.enqueue(original)
+        reply_to = persistence.find_pending(GroupMessage, str(original.pk))
+        assert reply_to is original
+        await persistence.enqueue(
+            GroupMessage(group=group, sender=user, content='reply', reply_to=reply_to, timestamp=timezone.now())
+        )
+        await persistence.flush_all()
+
+    asyncio.run(scenario())
+    persistence._buffers.clear()
+
+    reply = GroupMessage.objects.get(content='reply')
+    assert reply.reply_to.content == 'first'
+    assert persistence.find_pending(GroupMessage, reply.reply_to_id) is None
@@ -0,0 +1,67 @@
+import asyncio
+
+import fakeredis
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from chat import presence
+from chat.models import GroupChatRoom, GroupMember, PrivateChatRoom
+
+User = get_user_model()
+
+
+def test_heartbeat_restores_a_connection_whose_presence_key_expired(settings, monkeypatch):
+    settings.PRESENCE_TTL = 60
+    server = fakeredis.FakeServer()
+    sync_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(presence, '_sync_client', sync_client)
+    monkeypatch.setattr(presence, '_async_client', fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    tracker = presence.PresenceTracker()
+
+    async def scenario():
+        await tracker.connected('u1', 'conn-a')
+        await tracker.connected('u1', 'conn-b')
+        assert presence.lookup(['u1'])['u1']['online'] is True
+
+        # A late heartbeat: the key expired while both sockets stayed open
+        sync_client.delete(presence.conns_key('u1'))
+        assert presence.lookup(['u1'])['u1']['online'] is False
+        tracker.touch('u1', 'conn-a')
+        await tracker.flush()
+        assert presence.lookup(['u1'])['u1']['online'] is True
+
+        # Disconnects only remove their own connection and never go negative
+        await tracker.disconnected('u1', 'conn-b')
+        assert presence.lookup(['u1'])['u1']['online'] is True
+        await tracker.disconnected('u1', 'conn-a')
+        await tracker.disconnected('u1', 'conn-a')
+        assert presence.lookup(['u1'])['u1']['online'] is False
+        assert sync_client.zcard(presence.conns_key('u1')) == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.django_db
+def test_presence_is_only_answered_for_users_sharing_a_room(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(presence, '_sync_client', fakeredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(presence, '_async_client', fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    me, friend, teammate, stranger = (
+        User.objects.create_user(
+            email=f'{name}@example.com', first_name=name, last_name='test', username=name, password='pass'
+        )
+        for name in ('me', 'friend', 'teammate', 'stranger')
+    )
+    PrivateChatRoom.objects.create(participant_1=friend, participant_2=me)
+    group = GroupChatRoom.objects.create(name='team', created_by=me)
+    GroupMember.objects.create(group=group, user=me)
+    GroupMember.objects.create(group=group, user=teammate)
+    client = APIClient()
+    client.force_authenticate(me)
+
+    ids = [str(user.id) for user in (me, friend, teammate, stranger)] + ['not-a-uuid']
+    response = client.post(reverse('user-presence'), {'user_ids': ids}, format='json')
+    assert response.status_code == 200
+    assert set(response.data) == {str(me.id), str(friend.id), str(teammate.id)}
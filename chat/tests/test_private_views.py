@@ -0,0 +1,84 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from chat.archive import archive_old_messages
+from chat.models import PrivateChatRoom, Message
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', first_name=name, last_name='test', username=name, password='pass'
+    )
+
+
+def make_rooms(user, count):
+    rooms = []
+    for i in range(count):
+        other = make_user(f'peer{i}')
+        room = PrivateChatRoom.objects.create(participant_1=user, participant_2=other)
+        Message.objects.create(conversation=room, sender=other, content='hello')
+        Message.objects.create(conversation=room, sender=other, content='are you there?')
+        Message.objects.create(conversation=room, sender=user, content='yes')
+        rooms.append(room)
+    return rooms
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('room_count', [1, 25])
+def test_user_chats_query_count_is_constant(django_assert_num_queries, room_count):
+    user = make_user('owner')
+    make_rooms(user, room_count)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    with django_assert_num_queries(1):
+        response = client.get(reverse('get-user-chats'))
+
+    assert response.status_code == 200
+    assert len(response.data) == room_count
+    assert all(room['unread_count'] == 2 for room in response.data)
+
+
+@pytest.mark.django_db
+def test_user_chats_excludes_own_and_read_messages():
+    user = make_user('owner')
+    room = make_rooms(user, 1)[0]
+    room.messages.filter(content='hello').update(is_read=True)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get(reverse('get-user-chats'))
+
+    assert response.data[0]['unread_count'] == 1
+    assert response.data[0]['participant_1'] == room.participant_1.username
+
+
+@pytest.mark.django_db
+def test_history_pages_fall_through_to_the_archive():
+    user, other = make_user('owner'), make_user('peer')
+    room = PrivateChatRoom.objects.create(participant_1=user, participant_2=other)
+    start = timezone.now() - timedelta(days=400)
+    for i in range(10):
+        Message.objects.create(conversation=room, sender=other, content=f'm{i}', timestamp=start + timedelta(days=i * 40))
+
+    batches, archived = archive_old_messages(horizon_days=200, batch_size=3)
+    assert (batches, archived) == (2, 6)
+    assert Message.objects.count() == 4
+
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse('get-chat-messages', args=[room.id])
+    contents, params = [], {'limit': 4}
+    while True:
+        response = client.get(url, params)
+        contents = [message['content'] for message in response.data['results']] + contents
+        if not response.data['prev_cursor']:
+            break
+        params = {'limit': 4, 'before': response.data['prev_cursor']}
+    assert contents == [f'm{i}' for i in range(10)]
+    assert response.data['results'][0]['is_archived'] is True
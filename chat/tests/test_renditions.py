@@ -0,0 +1,40 @@
+import io
+
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from gistconnect import renditions
+
+
+def photo(size=(1200, 600)):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees when displayed
+    exif[0x010F] = 'ExampleCam'
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, 'JPEG', exif=exif.tobytes())
+    buffer.seek(0)
+    return buffer
+
+
+def test_renditions_are_oriented_stripped_and_content_addressed(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.IMAGE_RENDITION_WIDTHS = [160, 320, 4000]
+
+    assert renditions.placeholder(photo()).startswith('data:image/webp;base64,')
+
+    generated = renditions.generate(photo())
+    assert (generated['width'], generated['height']) == (600, 1200)
+    assert list(generated['sizes']) == ['160', '320', '600']
+    for width, path in generated['sizes'].items():
+        assert path.startswith(f"renditions/{renditions.content_hash(photo())[:2]}/")
+        with default_storage.open(path) as stored:
+            image = Image.open(stored)
+            assert image.width == int(width)
+            assert not image.getexif()
+
+    # Identical content maps onto the same files
+    assert renditions.generate(photo())['sizes'] == generated['sizes']
+
+    # Avatar renditions live apart from the private group ones
+    avatar = renditions.generate(photo(), prefix=renditions.AVATAR_RENDITION_PREFIX)
+    assert all(path.startswith('images/profile_images/renditions/') for path in avatar['sizes'].values())
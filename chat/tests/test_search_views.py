@@ -0,0 +1,89 @@
+from importlib import import_module
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+from chat.models import PrivateChatRoom, Message, GroupChatRoom, GroupMember, GroupMessage
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', first_name=name, last_name='test', username=name, password='pass'
+    )
+
+
+def result_ids(response):
+    return [str(result['message']['id']) for result in response.data['results']]
+
+
+@pytest.mark.django_db
+def test_search_is_ranked_scoped_and_follows_edits():
+    user, friend, stranger = make_user('user'), make_user('friend'), make_user('stranger')
+    own_room = PrivateChatRoom.objects.create(participant_1=user, participant_2=friend)
+    other_room = PrivateChatRoom.objects.create(participant_1=friend, participant_2=stranger)
+    mentioned_once = Message.objects.create(conversation=own_room, sender=friend, content='can you deploy later')
+    Message.objects.create(conversation=other_room, sender=friend, content='deploy without telling them')
+
+    group = GroupChatRoom.objects.create(name='ops', created_by=user)
+    GroupMember.objects.create(group=group, user=user)
+    other_group = GroupChatRoom.objects.create(name='secret', created_by=stranger)
+    mentioned_twice = GroupMessage.objects.create(group=group, sender=friend, content='deploy, then deploy again')
+    GroupMessage.objects.create(group=other_group, sender=stranger, content='deploy quietly')
+
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse('search-messages')
+
+    response = client.get(url, {'q': 'deploy'})
+    assert result_ids(response) == [str(mentioned_twice.id), str(mentioned_once.id)]
+    assert [result['kind'] for result in response.data['results']] == ['group', 'private']
+
+    mentioned_twice.content = 'shipped'
+    mentioned_twice.save()
+    mentioned_once.delete()
+    assert result_ids(client.get(url, {'q': 'deploy'})) == []
+    assert result_ids(client.get(url, {'q': 'ship', 'kind': 'group'})) == [str(mentioned_twice.id)]
+
+    # FTS5 syntax in user input is treated as plain words
+    assert client.get(url, {'q': 'NEAR("deploy" OR'}).status_code == 200
+    assert client.get(url, {'q': '  '}).status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+def test_group_search_stays_scoped_after_vacuum_and_table_remake():
+    user, stranger = make_user('member'), make_user('outsider')
+    own, other = GroupChatRoom.objects.create(name='own', created_by=user), GroupChatRoom.objects.create(name='other', created_by=stranger)
+    GroupMember.objects.create(group=own, user=user)
+    # Interleave the groups and punch holes so renumbered rowids land on other rows
+    messages = [
+        GroupMessage.objects.create(group=group, sender=stranger, content=f'release {group.name} {i}')
+        for i in range(6) for group in (other, own)
+    ]
+    GroupMessage.objects.filter(pk__in=[message.pk for message in messages[:5]]).delete()
+    visible = {str(message.id) for message in messages[5:] if message.group_id == own.id}
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse('search-messages')
+    assert set(result_ids(client.get(url, {'q': 'release', 'kind': 'group'}))) == visible
+
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM')
+        # A stale entry claiming another group's message belongs to this one
+        cursor.execute(
+            "INSERT INTO chat_groupmessage_fts(rowid, content, group_id) "
+            "SELECT rowid, 'release', %s FROM chat_groupmessage_fts_keys WHERE message_id = %s",
+            [own.id.hex, messages[-2].id.hex]
+        )
+    assert set(result_ids(client.get(url, {'q': 'release', 'kind': 'group'}))) == visible
+
+    # What a migration that makes SQLite remake the table does
+    with connection.schema_editor() as schema_editor:
+        schema_editor._remake_table(GroupMessage)
+        import_module('chat.migrations.0017_group_search_index_keys').install_triggers(schema_editor)
+    assert set(result_ids(client.get(url, {'q': 'release', 'kind': 'group'}))) == visible
+    fresh = GroupMessage.objects.create(group=own, sender=user, content='release notes')
+    assert str(fresh.id) in result_ids(client.get(url, {'q': 'release', 'kind': 'group'}))
@@ -0,0 +1,107 @@
+import os
+import zlib
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from chat.models import GroupChatRoom, GroupMember, GroupMessage, UploadSession
+
+User = get_user_model()
+
+
+@pytest.fixture
+def upload_settings(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.CHUNKED_UPLOAD_DIR = str(tmp_path / 'partial')
+    settings.CHUNKED_UPLOAD_MAX_CHUNK = 1024
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    return settings
+
+
+def put_chunk(client, url, data, offset, crc32):
+    return client.generic(
+        'PUT', url, data, content_type='application/octet-stream',
+        HTTP_UPLOAD_OFFSET=str(offset), HTTP_UPLOAD_CRC32=f'{crc32:08x}'
+    )
+
+
+@pytest.mark.django_db
+def test_chunked_upload_resumes_and_posts_the_message_on_finalize(upload_settings):
+    user = User.objects.create_user(
+        email='uploader@example.com', first_name='up', last_name='loader', username='uploader', password='pass'
+    )
+    group = GroupChatRoom.objects.create(name='files', created_by=user)
+    GroupMember.objects.create(group=group, user=user)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    payload = os.urandom(2500)
+    response = client.post(
+        reverse('group-upload-start', args=[group.id]), {'filename': 'report.pdf', 'size': len(payload)}, format='json'
+    )
+    assert response.status_code == 201
+    upload_id = response.data['upload_id']
+    url = reverse('group-upload-chunk', args=[group.id, upload_id])
+
+    first = payload[:1000]
+    assert put_chunk(client, url, first, 0, zlib.crc32(first)).data['offset'] == 1000
+
+    # A corrupted chunk is rejected and leaves the offset where it was
+    second = payload[1000:2000]
+    assert put_chunk(client, url, second, 1000, zlib.crc32(b'x' + second)).status_code == 400
+    # So is one sent from the wrong offset, or one over the chunk limit
+    assert put_chunk(client, url, second, 0, zlib.crc32(second)).status_code == 409
+    assert put_chunk(client, url, payload[1000:], 1000, 0).status_code == 413
+
+    # Nothing is posted until the upload is finalized
+    finalize = reverse('group-upload-finalize', args=[group.id, upload_id])
+    assert client.post(finalize).status_code == 409
+    assert not GroupMessage.objects.exists()
+
+    # Resume from the offset the server reports
+    status = client.get(url).data
+    assert (status['offset'], status['crc32']) == (1000, f'{zlib.crc32(first):08x}')
+    assert put_chunk(client, url, second, 1000, zlib.crc32(second, zlib.crc32(first))).data['offset'] == 2000
+    assert put_chunk(client, url, payload[2000:], 2000, zlib.crc32(payload)).data['offset'] == 2500
+
+    response = client.post(finalize, {'caption': 'Q3', 'crc32': f'{zlib.crc32(payload):08x}'}, format='json')
+    assert response.status_code == 200
+    message = GroupMessage.objects.get()
+    assert (message.message_type, message.content) == ('doc', 'Q3')
+    with message.doc.open('rb') as stored:
+        assert stored.read() == payload
+    assert UploadSession.objects.get().status == 'complete'
+    assert os.listdir(upload_settings.CHUNKED_UPLOAD_DIR) == []
+
+    # Finalizing twice does not post the message twice
+    assert client.post(finalize).status_code == 404
+    assert GroupMessage.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_rejected_finalize_keeps_the_upload_for_a_retry(upload_settings):
+    user = User.objects.create_user(
+        email='retry@example.com', first_name='re', last_name='try', username='retry', password='pass'
+    )
+    group = GroupChatRoom.objects.create(name='images', created_by=user)
+    GroupMember.objects.create(group=group, user=user)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    payload = b'not really a png'
+    upload_id = client.post(
+        reverse('group-upload-start', args=[group.id]), {'filename': 'photo.png', 'size': len(payload)}, format='json'
+    ).data['upload_id']
+    put_chunk(client, reverse('group-upload-chunk', args=[group.id, upload_id]), payload, 0, zlib.crc32(payload))
+
+    finalize = reverse('group-upload-finalize', args=[group.id, upload_id])
+    response = client.post(finalize)
+    assert response.status_code == 400
+    assert not GroupMessage.objects.exists()
+    assert UploadSession.objects.get().status == 'active'
+    assert len(os.listdir(upload_settings.CHUNKED_UPLOAD_DIR)) == 1
+
+    # Still finalizable, so a retry does not start from zero
+    assert client.post(finalize).status_code == 400
@@ -0,0 +1,54 @@
+"""
+Ephemeral "who is typing" updates; nothing here is ever persisted.
+
+Each connection forwards at most one typing signal per room every
+TYPING_THROTTLE seconds. Signals are then collected per room in the process and
+fanned out as a single 'typing' frame listing every typist, at most once per
+room every TYPING_COALESCE_INTERVAL seconds, so keystrokes never reach the
+channel layer one by one.
+"""
+import asyncio
+import logging
+
+from django.conf import settings
+
+from .codecs import encode_event
+
+logger = logging.getLogger(__name__)
+
+
+class TypingCoalescer:
+    """Per-process collector that batches typing signals into one group_send per room."""
+
+    def __init__(self):
+        # channel layer group name -> (channel layer, room tag, {user id: username})
+        self.pending = {}
+        self._timer = None
+        self._flush_task = None
+
+    def add(self, channel_layer, group_name, room, user):
+        _, _, typists = self.pending.setdefault(group_name, (channel_layer, room, {}))
+        typists[str(user.id)] = user.username
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(settings.TYPING_COALESCE_INTERVAL, self._flush_later)
+
+    def _flush_later(self):
+        # The event loop only keeps weak references to tasks, so hold on to it
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        self._timer = None
+        pending, self.pending = self.pending, {}
+        for group_name, (channel_layer, room, typists) in pending.items():
+            try:
+                await channel_layer.group_send(group_name, encode_event({
+                    'type': 'typing',
+                    'room': room,
+                    'users': [{'id': user_id, 'username': username} for user_id, username in typists.items()],
+                }, handler='typing_update', coalesce_key=f'typing:{room}'))
+            except Exception as e:
+                logger.error(f"Error sending typing update to {group_name}: {e}")
+
+
+coalescer = TypingCoalescer()
@@ -0,0 +1,254 @@
+"""
+Unread counters kept in the default (Redis) cache.
+
+Private chats use denormalized counters.
+
+Two counters are maintained per recipient:
+
+* ``unread:user:<user_id>`` - total unread across the user's visible rooms
+* ``unread:room:<room_id>:<user_id>`` - unread in a single room
+
+Counters are bumped when a message is persisted and lowered when messages are
+marked read. Missing keys are rebuilt lazily from the database on read, and the
+``reconcile_unread_counters`` Celery task periodically overwrites them with the
+database truth, so drift from races or a Redis outage is bounded by its schedule.
+
+Group chats use read watermarks (see ``GroupMember.unread_messages``), so their
+counts are computed for all of a user's groups in one aggregated query and cached
+per user under ``unread:groups:<user_id>``. Each group has a version counter,
+``unread:group_version:<group_id>``, which is bumped whenever messages become
+visible in the group. A cached entry records the versions it was computed at and
+is discarded as soon as any of them changes. Read acks and membership changes
+delete the user's entry directly.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import IsNull
+
+from .models import PrivateChatRoom, Message, GroupMember, GroupMessage
+
+logger = logging.getLogger(__name__)
+
+UNREAD_COUNTER_TIMEOUT = 60 * 60 * 24
+RECONCILE_BATCH_SIZE = 500
+
+
+def user_key(user_id):
+    return f"unread:user:{user_id}"
+
+
+def room_key(room_id, user_id):
+    return f"unread:room:{room_id}:{user_id}"
+
+
+def _adjust(key, delta):
+    # incr/decr only touch keys that already exist; a missing key is rebuilt
+    # from the database the next time it is read.
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        elif delta < 0:
+            cache.decr(key, -delta)
+    except ValueError:
+        pass
+    except Exception as e:
+        logger.error(f"Error adjusting unread counter {key}: {e}")
+
+
+def _is_hidden_for(room, user_id):
+    if room.participant_1_id == user_id:
+        return room.is_deleted_for_participant_1
+    return room.is_deleted_for_participant_2
+
+
+def recipient_id(room, sender_id):
+    """Return the id of the participant who did not send the message."""
+    return room.participant_2_id if room.participant_1_id == sender_id else room.participant_1_id
+
+
+def message_created(room, sender_id, count=1):
+    """Record `count` new messages from `sender_id` in `room`."""
+    user_id = recipient_id(room, sender_id)
+    _adjust(room_key(room.id, user_id), count)
+    if not _is_hidden_for(room, user_id):
+        _adjust(user_key(user_id), count)
+
+
+def messages_read(room, user_id, count):
+    """Record that `user_id` has read `count` previously unread messages in `room`."""
+    if count <= 0:
+        return
+    _adjust(room_key(room.id, user_id), -count)
+    if not _is_hidden_for(room, user_id):
+        _adjust(user_key(user_id), -count)
+
+
+def room_hidden(room, user_id):
+    """Drop a room's unread messages from the user's total once it is hidden for them."""
+    _adjust(user_key(user_id), -get_room_unread(room, user_id))
+
+
+def count_room_unread(room, user_id):
+    return room.messages.filter(is_read=False).exclude(sender_id=user_id).count()
+
+
+def count_total_unread(user_id):
+    return Message.objects.filter(
+        conversation__in=PrivateChatRoom.objects.filter(
+            Q(participant_1_id=user_id, is_deleted_for_participant_1=False) |
+            Q(participant_2_id=user_id, is_deleted_for_participant_2=False)
+        ),
+        is_read=False
+    ).exclude(sender_id=user_id).count()
+
+
+def _get_or_rebuild(key, rebuild):
+    try:
+        value = cache.get(key)
+    except Exception as e:
+        logger.error(f"Error reading unread counter {key}: {e}")
+        return rebuild()
+    if value is None:
+        value = rebuild()
+        try:
+            cache.add(key, value, UNREAD_COUNTER_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error storing unread counter {key}: {e}")
+    return max(value, 0)
+
+
+def get_room_unread(room, user_id):
+    return _get_or_rebuild(room_key(room.id, user_id), lambda: count_room_unread(room, user_id))
+
+
+def get_total_unread(user_id):
+    return _get_or_rebuild(user_key(user_id), lambda: count_total_unread(user_id))
+
+
+def reconcile_unread_counters(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Overwrite every counter with the value computed from the database.
+
+    Rooms are walked in primary-key batches with one grouped COUNT per batch.
+    Returns the number of rooms processed.
+    """
+    totals = {}
+    processed = 0
+    last_id = 0
+
+    while True:
+        rooms = list(
+            PrivateChatRoom.objects.filter(id__gt=last_id).order_by('id').values(
+                'id', 'participant_1_id', 'participant_2_id',
+                'is_deleted_for_participant_1', 'is_deleted_for_participant_2'
+            )[:batch_size]
+        )
+        if not rooms:
+            break
+        last_id = rooms[-1]['id']
+        processed += len(rooms)
+
+        unread_by_sender = {
+            (row['conversation_id'], row['sender_id']): row['unread']
+            for row in Message.objects.filter(
+                conversation_id__in=[room['id'] for room in rooms], is_read=False
+            ).values('conversation_id', 'sender_id').annotate(unread=Count('id'))
+        }
+
+        room_values = {}
+        for room in rooms:
+            for user_id, other_id, hidden in (
+                (room['participant_1_id'], room['participant_2_id'], room['is_deleted_for_participant_1']),
+                (room['participant_2_id'], room['participant_1_id'], room['is_deleted_for_participant_2']),
+            ):
+                unread = unread_by_sender.get((room['id'], other_id), 0)
+                room_values[room_key(room['id'], user_id)] = unread
+                totals[user_id] = totals.get(user_id, 0) + (0 if hidden else unread)
+
+        cache.set_many(room_values, UNREAD_COUNTER_TIMEOUT)
+
+    cache.set_many({user_key(user_id): total for user_id, total in totals.items()}, UNREAD_COUNTER_TIMEOUT)
+    return processed
+
+
+def group_version_key(group_id):
+    return f"unread:group_version:{group_id}"
+
+
+def user_groups_key(user_id):
+    return f"unread:groups:{user_id}"
+
+
+def group_messages_changed(group_id):
+    """Invalidate every cached group unread entry that includes `group_id`."""
+    key = group_version_key(group_id)
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+    except Exception as e:
+        logger.error(f"Error bumping unread version for group {group_id}: {e}")
+
+
+def group_unread_changed(user_id):
+    """Drop the user's cached group unread counts after a read ack or membership change."""
+    try:
+        cache.delete(user_groups_key(user_id))
+    except Exception as e:
+        logger.error(f"Error invalidating group unread counts for user {user_id}: {e}")
+
+
+def count_group_unread(user_id):
+    """Return {group_id: unread} for every active group the user belongs to, in one query."""
+    # Correlated per membership, with the watermark as a plain lower bound so each
+    # count is a range scan of the (group, timestamp) index. Messages sharing the
+    # watermark's timestamp are read up to its id (all of them when it has none).
+    watermark = Coalesce(OuterRef('last_read_at'), OuterRef('joined_at'))
+    after_watermark = GroupMessage.objects.filter(
+        group_id=OuterRef('group_id'), timestamp__gte=watermark
+    ).exclude(
+        Q(timestamp=watermark),
+        Q(id__lte=OuterRef('last_read_message_id')) | Q(IsNull(OuterRef('last_read_message_id'), True)),
+    ).exclude(sender_id=user_id)
+    unread = after_watermark.order_by().values('group_id').annotate(count=Count('pk')).values('count')
+    memberships = GroupMember.objects.filter(user_id=user_id, group__is_active=True).order_by().annotate(
+        unread=Coalesce(Subquery(unread, output_field=IntegerField()), 0)
+    ).values_list('group_id', 'unread')
+    return {str(group_id): unread for group_id, unread in memberships}
+
+
+def _group_versions(group_ids):
+    keys = {group_id: group_version_key(group_id) for group_id in group_ids}
+    current = cache.get_many(list(keys.values()))
+    return {group_id: current.get(key) for group_id, key in keys.items()}
+
+
+def get_group_unread(user_id):
+    """Cached {group_id: unread} for the user's groups; recomputed when any group's version moves."""
+    key = user_groups_key(user_id)
+    try:
+        entry = cache.get(key)
+        if entry is not None and _group_versions(entry['versions']) == entry['versions']:
+            return entry['counts']
+
+        # Snapshot the versions before counting so a message arriving mid-count
+        # leaves the stored entry already stale instead of silently wrong.
+        group_ids = [
+            str(group_id) for group_id in
+            GroupMember.objects.filter(user_id=user_id).values_list('group_id', flat=True)
+        ]
+        versions = _group_versions(group_ids)
+    except Exception as e:
+        logger.error(f"Error reading group unread counts for user {user_id}: {e}")
+        return count_group_unread(user_id)
+
+    counts = count_group_unread(user_id)
+    try:
+        cache.set(key, {'counts': counts, 'versions': versions}, UNREAD_COUNTER_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Error storing group unread counts for user {user_id}: {e}")
+    return counts
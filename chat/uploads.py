@@ -0,0 +1,141 @@
+"""
+Resumable chunked uploads of group attachments.
+
+Protocol (chat/views/upload_views.py):
+
+1. ``POST groups/<id>/uploads/`` with ``filename`` and ``size`` opens an UploadSession.
+2. ``PUT groups/<id>/uploads/<upload_id>/`` sends the next chunk as the raw request
+   body. ``Upload-Offset`` must equal the session's current offset. The optional
+   ``Upload-CRC32`` header carries the hex CRC32 of the file from byte 0 to the
+   end of this chunk. ``GET`` on the same URL returns the offset to resume from
+   after a dropped connection; ``DELETE`` abandons the upload.
+3. ``POST groups/<id>/uploads/<upload_id>/finalize/`` checks the size (and the final
+   CRC32 when given), and only then creates the GroupMessage and broadcasts it.
+
+Chunks are streamed from the request into a partial file under CHUNKED_UPLOAD_DIR
+in CHUNK_READ_SIZE blocks, so memory use does not depend on chunk or file size.
+The CRC32 is rolled forward over the same blocks and stored with the offset.
+A chunk that is cut short or fails its checksum is truncated away, and the
+offset stays where it was.
+"""
+import fcntl
+import os
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import GroupMessage, UploadSession
+
+CHUNK_READ_SIZE = 64 * 1024
+
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'webp']
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+
+class UploadBusy(UploadError):
+    status = 409
+
+
+class ChunkTooLarge(UploadError):
+    status = 413
+
+
+def message_type_for(filename):
+    """'image' or 'doc' for an allowed attachment filename, otherwise None."""
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    if extension in IMAGE_EXTENSIONS:
+        return 'image'
+    doc_extensions = GroupMessage._meta.get_field('doc').validators[0].allowed_extensions
+    if extension in doc_extensions:
+        return 'doc'
+    return None
+
+
+def partial_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{session.id}.part")
+
+
+def start(session):
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(partial_path(session), 'wb').close()
+
+
+def append_chunk(session, stream, offset, length, expected_crc32=None):
+    """Stream `length` bytes from `stream` into the session at `offset`; updates `session`."""
+    if offset != session.received:
+        raise OffsetMismatch(f"Expected offset {session.received}.")
+    if length is None:
+        raise UploadError("Content-Length is required.")
+    if length > settings.CHUNKED_UPLOAD_MAX_CHUNK:
+        raise ChunkTooLarge(f"Chunks are limited to {settings.CHUNKED_UPLOAD_MAX_CHUNK} bytes.")
+    if offset + length > session.size:
+        raise UploadError("Chunk runs past the declared upload size.")
+
+    with open(partial_path(session), 'r+b') as partial:
+        try:
+            fcntl.flock(partial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadBusy("Another chunk for this upload is in progress.")
+        # Another request may have committed a chunk before we got the lock
+        session.refresh_from_db(fields=['received', 'crc32'])
+        if offset != session.received:
+            raise OffsetMismatch(f"Expected offset {session.received}.")
+
+        # Drops whatever an interrupted earlier attempt wrote past the offset
+        partial.truncate(offset)
+        partial.seek(offset)
+        crc32 = session.crc32
+        remaining = length
+        while remaining:
+            block = stream.read(min(CHUNK_READ_SIZE, remaining))
+            if not block:
+                break
+            partial.write(block)
+            crc32 = zlib.crc32(block, crc32)
+            remaining -= len(block)
+
+        if remaining:
+            partial.truncate(offset)
+            raise UploadError("Chunk ended before Content-Length bytes were received.")
+        if expected_crc32 is not None and crc32 != expected_crc32:
+            partial.truncate(offset)
+            raise UploadError("CRC32 mismatch; resend the chunk.")
+        partial.flush()
+
+        UploadSession.objects.filter(pk=session.pk, received=offset).update(
+            received=offset + length, crc32=crc32, updated_at=timezone.now()
+        )
+        session.received, session.crc32 = offset + length, crc32
+    return session
+
+
+def open_partial(session):
+    return open(partial_path(session), 'rb')
+
+
+def discard(session):
+    try:
+        os.remove(partial_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def expire_stale_sessions(max_age=None):
+    """Delete sessions untouched for CHUNKED_UPLOAD_EXPIRY seconds, with their partial files."""
+    max_age = settings.CHUNKED_UPLOAD_EXPIRY if max_age is None else max_age
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=max_age))
+    expired = 0
+    for session in stale.iterator():
+        discard(session)
+        session.delete()
+        expired += 1
+    return expired
@@ -1,5 +1,5 @@
 from django.urls import path
-from chat.views import private_views, group_views
+from chat.views import private_views, group_views, presence_views, media_views, search_views, stats_views, upload_views
 
 urlpatterns = [
     path('start-chat/', private_views.start_private_chat, name='start-private-chat'),
@@ -9,12 +9,22 @@ urlpatterns = [
     path('chat-messages/<str:room_id>/', private_views.get_user_message, name='get-chat-messages'),
 
     path('groups/', group_views.group_chat_list_create_view, name='group-list-create'),
+    path('groups/unread/', group_views.group_unread_counts, name='group-unread-counts'),
     path('groups/<uuid:group_id>/', group_views.group_chat_detail_view, name='group-detail'),
+    path('groups/<uuid:group_id>/members/', group_views.get_group_members, name='group-members'),
     path('groups/<uuid:group_id>/add-member/', group_views.add_group_member, name='add-group-member'),
     path('groups/<uuid:group_id>/remove-member/', group_views.remove_member_by_admin, name='remove-group-member'),
     path('groups/<uuid:group_id>/leave-member/', group_views.leave_group, name='leave-group'),
     path('groups/<uuid:group_id>/messages/', group_views.get_group_messages, name='group-messages'),
     path('groups/<uuid:group_id>/upload/', group_views.GroupFileUpload, name='group-upload'),
+    path('groups/<uuid:group_id>/uploads/', upload_views.start_upload, name='group-upload-start'),
+    path('groups/<uuid:group_id>/uploads/<uuid:upload_id>/', upload_views.upload_chunk, name='group-upload-chunk'),
+    path('groups/<uuid:group_id>/uploads/<uuid:upload_id>/finalize/', upload_views.finalize_upload, name='group-upload-finalize'),
+    path('groups/<uuid:group_id>/messages/<uuid:message_id>/file/', media_views.group_message_file, name='group-message-file'),
     path('groups/<uuid:group_id>/delete-message/', group_views.delete_messages, name='group-delete-message'),
 
+    path('search/', search_views.search_messages, name='search-messages'),
+    path('presence/', presence_views.user_presence, name='user-presence'),
+    path('ws-stats/', stats_views.websocket_stats, name='websocket-stats'),
+
 ]
@@ -1,14 +1,24 @@
+import os
 import uuid
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework import status
-from django.db.models import Q
+from django.db.models import Count, F, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from ..models import *
-from chat.serializers import GroupMemberSerializer,GroupChatRoomSerializer,GroupMessageSerializer
+from chat.serializers import GroupMemberSerializer,GroupChatRoomSerializer,GroupSummarySerializer,GroupMessageSerializer
+from chat.pagination import InvalidCursor, paginate_keyset
+from chat.archive import paginate_history
+from chat.codecs import encode_event
+from chat import blobs, unread as unread_counters
+from gistconnect import renditions
+from chat.tasks import generate_group_image_renditions
+from PIL import UnidentifiedImageError
 
 User = get_user_model()
 
@@ -19,15 +29,58 @@ from channels.layers import get_channel_layer
 
 
 
+def _revoke_group_access(group_id, user_id=None):
+    """Tell open connections to drop a cached group, for one user or (user_id=None) for everyone"""
+    async_to_sync(get_channel_layer().group_send)(
+        f'group_{group_id}',
+        {
+            'type': 'group_access_revoked',
+            'group_id': str(group_id),
+            'user_id': str(user_id) if user_id is not None else None,
+        }
+    )
+
+
+def _count_subquery(queryset):
+    """Correlated COUNT(*) over `queryset`, which must be filtered on group=OuterRef('pk')"""
+    counts = queryset.order_by().values('group').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def _group_summaries(groups):
+    """Annotate what GroupSummarySerializer needs using correlated subqueries (unread comes from context)"""
+    group_messages = GroupMessage.objects.filter(group=OuterRef('pk'))
+    return groups.annotate(
+        num_members=_count_subquery(GroupMember.objects.filter(group=OuterRef('pk'))),
+        last_activity=Coalesce(
+            Subquery(group_messages.order_by('-timestamp').values('timestamp')[:1]),
+            F('created_at')
+        ),
+    )
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def group_chat_list_create_view(request):
-    """List groups user belongs to, or create a new group"""
+    """List groups user belongs to (?view=summary for the compact form), or create a new group"""
     if request.method == 'GET':
+        # Filter through a subquery so the member join below counts every member
         groups = GroupChatRoom.objects.filter(
-            members__user=request.user,
+            id__in=GroupMember.objects.filter(user=request.user).values('group_id'),
             is_active=True
-        ).distinct()
+        )
+        if request.query_params.get('view') == 'summary':
+            serializer = GroupSummarySerializer(
+                _group_summaries(groups), many=True,
+                context={'unread_counts': unread_counters.get_group_unread(request.user.id)}
+            )
+            return Response(serializer.data)
+
+        groups = groups.select_related('created_by').annotate(
+            num_members=Count('members')
+        ).prefetch_related(
+            Prefetch('members', queryset=GroupMember.objects.select_related('user'))
+        )
         serializer = GroupChatRoomSerializer(groups, many=True)
         return Response(serializer.data)
 
@@ -45,6 +98,14 @@ def group_chat_list_create_view(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def group_unread_counts(request):
+    """Unread counts for every group the user belongs to, from one aggregated query (cached)"""
+    counts = unread_counters.get_group_unread(request.user.id)
+    return Response({'unread_counts': counts, 'total_unread': sum(counts.values())})
+
+
 
 
 @api_view(['GET', 'DELETE'])
@@ -64,11 +125,38 @@ def group_chat_detail_view(request, group_id):
             return Response({'detail': 'Only the group creator can delete this group.'}, status=status.HTTP_403_FORBIDDEN)
         group.is_active = False
         group.save()
+        unread_counters.group_messages_changed(group.id)
+        _revoke_group_access(group.id)
         return Response({'message': 'Group deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
 
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_group_members(request, group_id):
+    """Cursor-paginated member list, ordered by join time"""
+    group = get_object_or_404(GroupChatRoom, id=group_id, is_active=True)
+
+    if not GroupMember.objects.filter(group=group, user=request.user).exists():
+        return Response({'detail': 'Access denied.'}, status=status.HTTP_403_FORBIDDEN)
+
+    members = GroupMember.objects.filter(group=group).select_related('user')
+    try:
+        page = paginate_keyset(members, request.query_params, time_field='joined_at')
+    except InvalidCursor as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = GroupMemberSerializer(page.items, many=True)
+    return Response({
+        "results": serializer.data,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    })
+
+
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def add_group_member(request, group_id):
@@ -148,6 +236,7 @@ def remove_member_by_admin(request, group_id):
         return Response({"detail": "You cannot remove yourself from the group."}, status=status.HTTP_400_BAD_REQUEST)
 
     member.delete()
+    _revoke_group_access(group.id, member.user_id)
     return Response({'message': 'User successfully removed from the group'}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -171,6 +260,7 @@ def leave_group(request, group_id):
                         status=status.HTTP_403_FORBIDDEN)
 
     member.delete()
+    _revoke_group_access(group.id, request.user.id)
     return Response({'message': 'You have successfully left the group.'}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -188,9 +278,18 @@ def get_group_messages(request, group_id):
     if not is_member:
         return Response({"detail": "You are not a member of this group."}, status=403)
 
-    messages = GroupMessage.objects.filter(group=group).select_related('sender', 'reply_to').order_by('timestamp')
-    serializer = GroupMessageSerializer(messages, many=True)
-    return Response(serializer.data)
+    messages = GroupMessage.objects.filter(group=group).select_related('sender', 'reply_to')
+    try:
+        page = paginate_history(messages, request.query_params, GroupMessage, group.id)
+    except InvalidCursor as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = GroupMessageSerializer(page.items, many=True, context={'request': request})
+    return Response({
+        "results": serializer.data,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    })
 
 
 
@@ -200,7 +299,6 @@ def get_group_messages(request, group_id):
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser])
 def GroupFileUpload(request, group_id):
-    user = request.user
     group = get_object_or_404(GroupChatRoom, id=group_id)
 
     doc = request.FILES.get('doc')
@@ -211,40 +309,71 @@ def GroupFileUpload(request, group_id):
         return Response({'error': 'No file or image provided.'}, status=400)
 
     message_type = 'doc' if doc else 'image'
+    return post_attachment(request, group, message_type, doc or image, caption)
 
-    # Save message
-    message = GroupMessage.objects.create(
-        group=group,
-        sender=user,
-        message_type=message_type,
-        doc=doc if doc else None,
-        image=image if image else None,
-        content=caption
-    )
+
+def post_attachment(request, group, message_type, file, caption):
+    """Create a doc/image GroupMessage for `file`, broadcast it and return the upload response"""
+    user = request.user
+
+    # The placeholder goes out with the message; sized renditions follow from Celery
+    image_renditions = {}
+    if message_type == 'image':
+        try:
+            image_renditions['placeholder'] = renditions.placeholder(file)
+        except (UnidentifiedImageError, OSError):
+            return Response({'error': 'Uploaded file is not a valid image.'}, status=400)
+
+    # Identical content already stored is referenced instead of written again
+    filename = os.path.basename(file.name)
+    stored_name = blobs.store(file, filename)
+    try:
+        message = GroupMessage.objects.create(
+            group=group,
+            sender=user,
+            message_type=message_type,
+            doc=stored_name if message_type == 'doc' else None,
+            image=stored_name if message_type == 'image' else None,
+            filename=filename,
+            content=caption,
+            renditions=image_renditions
+        )
+    except Exception:
+        blobs.release([stored_name])
+        raise
+    unread_counters.group_messages_changed(group.id)
 
     # Broadcast to WebSocket group
     channel_layer = get_channel_layer()
-    file_url = request.build_absolute_uri(message.doc.url if message_type == 'doc' else message.image.url)
+    file_url = request.build_absolute_uri(reverse('group-message-file', args=[group.id, message.id]))
 
     async_to_sync(channel_layer.group_send)(
-        f"group_{group_id}",
-        {
+        f"group_{group.id}",
+        encode_event({
             'type': 'group_message',
+            'room': f'group:{group.id}',
             'message_id': str(message.id),
             'message': caption,
             'file_url': file_url,
+            'filename': filename,
+            'placeholder': image_renditions.get('placeholder'),
             'sender_id': str(user.id),
             'sender_username': user.username,
             'message_type': message_type,
             'timestamp': message.timestamp.isoformat(),
             'reply_to': None
-        }
+        })
     )
+    if message_type == 'image':
+        # Announced with a group_message_renditions event once written
+        generate_group_image_renditions.delay(str(message.id), request.build_absolute_uri('/'))
 
     return Response({
         "id": str(message.id),
         "type": message.message_type,
         "url": file_url,
+        "filename": filename,
+        "placeholder": image_renditions.get('placeholder'),
         "caption": caption,
         "timestamp": message.timestamp
     })
@@ -264,6 +393,7 @@ def delete_messages(request, group_id):
     try:
         message = GroupMessage.objects.get(id=message_id,  group=group, sender=request.user)
         message.delete()
+        unread_counters.group_messages_changed(group.id)
         return Response({'detail': 'Message deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
     except GroupMessage.DoesNotExist:
         return Response({'detail': 'Message not found or not owned by user'}, status=status.HTTP_404_NOT_FOUND)
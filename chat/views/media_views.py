@@ -0,0 +1,40 @@
+from pathlib import PurePath
+
+from django.core.files.storage import default_storage
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from chat import media
+from chat.models import GroupMember, GroupMessage
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def group_message_file(request, group_id, message_id):
+    """
+    The doc or image of a group message, for members of the group only.
+
+    ``?width=<width>`` gets that rendition of an image (see gistconnect/renditions.py).
+    Supports Range, If-Range and If-None-Match; see chat/media.py.
+    """
+    message = get_object_or_404(
+        GroupMessage.objects.only('group_id', 'doc', 'image', 'filename', 'renditions'), id=message_id, group_id=group_id
+    )
+    if not GroupMember.objects.filter(group_id=group_id, user=request.user).exists():
+        return Response({'detail': 'You are not a member of this group.'}, status=status.HTTP_403_FORBIDDEN)
+
+    width = request.query_params.get('width')
+    if width is not None:
+        name = (message.renditions or {}).get('sizes', {}).get(width)
+        if not name or not default_storage.exists(name):
+            raise Http404("This message has no rendition of that width.")
+        filename = f"{PurePath(message.filename).stem}.webp" if message.filename else None
+        return media.serve(request, name, filename)
+
+    attachment = message.doc or message.image
+    if not attachment or not default_storage.exists(attachment.name):
+        raise Http404("This message has no file.")
+    return media.serve(request, attachment.name, message.filename)
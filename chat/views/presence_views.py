@@ -0,0 +1,67 @@
+import logging
+import uuid
+
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from chat import presence
+from chat.models import GroupMember, PrivateChatRoom
+
+logger = logging.getLogger(__name__)
+
+MAX_PRESENCE_LOOKUP = 500
+
+
+def _visible_user_ids(user, user_ids):
+    """The ids among `user_ids` of `user` and of users sharing a private room or group with them."""
+    ids = set()
+    for user_id in user_ids:
+        try:
+            ids.add(uuid.UUID(str(user_id)))
+        except ValueError:
+            continue
+    if not ids:
+        return []
+    visible = {user.id} & ids
+    visible.update(PrivateChatRoom.objects.filter(
+        participant_1=user, participant_2__in=ids
+    ).values_list('participant_2', flat=True))
+    visible.update(PrivateChatRoom.objects.filter(
+        participant_2=user, participant_1__in=ids
+    ).values_list('participant_1', flat=True))
+    visible.update(GroupMember.objects.filter(
+        user__in=ids, group__members__user=user
+    ).values_list('user', flat=True))
+    return [str(user_id) for user_id in visible]
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def user_presence(request):
+    """
+    Bulk "who is online" lookup, answered from Redis only.
+
+    GET ?user_ids=<id>,<id>,... or POST {"user_ids": [...]} for long member lists.
+    Only users who share a private room or group with the requester are
+    answered for; other ids are left out of the response.
+    """
+    if request.method == 'POST':
+        user_ids = request.data.get('user_ids') or []
+    else:
+        user_ids = [user_id for user_id in request.query_params.get('user_ids', '').split(',') if user_id]
+
+    if not isinstance(user_ids, list):
+        return Response({'detail': 'user_ids must be a list.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(user_ids) > MAX_PRESENCE_LOOKUP:
+        return Response(
+            {'detail': f'At most {MAX_PRESENCE_LOOKUP} user_ids can be looked up at once.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    user_ids = _visible_user_ids(request.user, user_ids)
+    try:
+        return Response(presence.lookup(user_ids))
+    except Exception as e:
+        logger.error(f"Presence lookup failed: {e}")
+        return Response({'detail': 'Presence is temporarily unavailable.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
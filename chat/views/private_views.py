@@ -1,12 +1,17 @@
 import uuid
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.contrib.auth import get_user_model
 from ..models import *
 from chat.serializers import PrivateChatRoomSerializer,MessageSerializer
+from chat.pagination import InvalidCursor
+from chat.archive import paginate_history
+from chat import unread as unread_counters
 
 User = get_user_model()
 
@@ -61,19 +66,38 @@ def delete_chat_room(request, room_id):
     user = request.user
 
     if user == room.participant_1:
+        was_hidden = room.is_deleted_for_participant_1
         room.is_deleted_for_participant_1 = True
     elif user == room.participant_2:
+        was_hidden = room.is_deleted_for_participant_2
         room.is_deleted_for_participant_2 = True
     else:
         return Response({'error': 'You are not a participant of this chat'}, status=status.HTTP_403_FORBIDDEN)
 
+    if not was_hidden:
+        unread_counters.room_hidden(room, user.id)
+
     # If both participants have deleted, delete permanently
-    if room.is_deleted_for_participant_1 and room.is_deleted_for_participant_2:
+    deleted = room.is_deleted_for_participant_1 and room.is_deleted_for_participant_2
+    if deleted:
         room.delete()
-        return Response({'message': 'Chat deleted permanently for both users'}, status=status.HTTP_204_NO_CONTENT)
     else:
         room.save()
-        return Response({'message': 'Chat hidden for you'}, status=status.HTTP_200_OK)
+
+    # Let open ChatConsumer connections drop their cached copy of the room
+    async_to_sync(get_channel_layer().group_send)(
+        f'chat_{room_id}',
+        {
+            'type': 'chat_room_revoked',
+            'room_id': str(room_id),
+            'user_id': str(user.id),
+            'deleted': deleted,
+        }
+    )
+
+    if deleted:
+        return Response({'message': 'Chat deleted permanently for both users'}, status=status.HTTP_204_NO_CONTENT)
+    return Response({'message': 'Chat hidden for you'}, status=status.HTTP_200_OK)
 
 
 
@@ -84,6 +108,12 @@ def get_user_chats(request):
     rooms = PrivateChatRoom.objects.filter(
         Q(participant_1=request.user, is_deleted_for_participant_1=False) |
         Q(participant_2=request.user, is_deleted_for_participant_2=False)
+    ).select_related('participant_1', 'participant_2').annotate(
+        # Counted in the same query so the serializer does not issue one COUNT per room
+        unread_messages=Count(
+            'messages',
+            filter=Q(messages__is_read=False) & ~Q(messages__sender=request.user)
+        )
     )
     serializer = PrivateChatRoomSerializer(rooms, many=True, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
@@ -103,27 +133,34 @@ def get_user_message(request, room_id):
     if room.participant_1 != request.user and room.participant_2 != request.user:
         return Response({'error': 'You are not authorized to view this chat'}, status=status.HTTP_403_FORBIDDEN)
 
-    # Mark all unread messages sent to this user as read
-    room.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+    messages = room.messages.select_related('sender')
+    try:
+        page = paginate_history(messages, request.query_params, Message, room.id)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Get all messages in order
-    messages = room.messages.all().order_by('-timestamp')
+    # Mark only the delivered messages sent to this user as read
+    unread = [m for m in page.items if not m.is_read and m.sender_id != request.user.id]
+    if unread:
+        marked = Message.objects.filter(id__in=[m.id for m in unread], is_read=False).update(is_read=True)
+        unread_counters.messages_read(room, request.user.id, marked)
+        for message in unread:
+            message.is_read = True
 
-    serializer = MessageSerializer(messages, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    serializer = MessageSerializer(page.items, many=True)
+    return Response({
+        'results': serializer.data,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }, status=status.HTTP_200_OK)
 
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def total_unread_count(request):
-    count = Message.objects.filter(
-        conversation__in = PrivateChatRoom.objects.filter(
-            Q(participant_1=request.user, is_deleted_for_participant_1=False) |
-            Q(participant_2=request.user, is_deleted_for_participant_2=False)
-        ),
-        is_read=False
-    ).exclude(sender=request.user).count()
+    # Served from the Redis counter; only falls back to a COUNT when the key is missing
+    count = unread_counters.get_total_unread(request.user.id)
 
     return Response({'total_unread': count})
 
@@ -0,0 +1,59 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from chat import search
+from chat.pagination import InvalidCursor, parse_limit
+from chat.serializers import MessageSerializer, GroupMessageSerializer
+
+SERIALIZERS = {
+    'private': MessageSerializer,
+    'group': GroupMessageSerializer,
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_messages(request):
+    """
+    Ranked full-text search over the caller's private chats and groups.
+
+    GET ?q=<text>&kind=private|group (default both)&limit=<n>&offset=<n>
+    """
+    query = request.query_params.get('q', '').strip()
+    if not search.query_terms(query):
+        return Response({'detail': 'q must contain at least one word.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    kind = request.query_params.get('kind')
+    if kind and kind not in search.KINDS:
+        return Response({'detail': f'kind must be one of {", ".join(search.KINDS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = parse_limit(request.query_params.get('limit'))
+        offset = int(request.query_params.get('offset', 0))
+        if offset < 0:
+            raise ValueError
+    except InvalidCursor as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError:
+        return Response({'detail': 'offset must be a non-negative integer.'}, status=status.HTTP_400_BAD_REQUEST)
+    if offset > search.MAX_SEARCH_OFFSET:
+        return Response(
+            {'detail': f'offset cannot exceed {search.MAX_SEARCH_OFFSET}; refine the query instead.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    hits = search.search_messages(request.user, query, (kind,) if kind else tuple(search.KINDS), limit, offset)
+    results = [
+        {
+            'kind': hit.kind,
+            'room_id': str(search.room_id(hit.message)),
+            'score': hit.score,
+            'message': SERIALIZERS[hit.kind](hit.message).data,
+        }
+        for hit in hits
+    ]
+    next_offset = offset + limit
+    return Response({
+        'results': results,
+        'next_offset': next_offset if len(hits) == limit and next_offset <= search.MAX_SEARCH_OFFSET else None,
+    })
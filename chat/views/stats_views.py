@@ -0,0 +1,15 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from chat import outbound
+from chat.middleware import user_cache
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def websocket_stats(request):
+    """Counters for the WebSocket layer of the process serving this request"""
+    return Response({
+        'user_cache': user_cache.stats(),
+        'outbound': outbound.counters.stats(),
+    })
@@ -0,0 +1,134 @@
+import os
+from django.conf import settings
+from django.core.files import File
+from django.shortcuts import get_object_or_404
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from chat import uploads
+from chat.models import GroupChatRoom, GroupMember, UploadSession
+from chat.views.group_views import post_attachment
+
+
+def _is_member(group, user):
+    return GroupMember.objects.filter(group=group, user=user).exists()
+
+
+def _parse_crc32(value):
+    if value in (None, ''):
+        return None
+    return int(value, 16)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def start_upload(request, group_id):
+    """Open a resumable upload; body: filename, size"""
+    group = get_object_or_404(GroupChatRoom, id=group_id, is_active=True)
+    if not _is_member(group, request.user):
+        return Response({'detail': 'You are not a member of this group.'}, status=status.HTTP_403_FORBIDDEN)
+
+    filename = os.path.basename(str(request.data.get('filename', '')))
+    message_type = uploads.message_type_for(filename)
+    if message_type is None:
+        return Response({'error': 'Unsupported file type.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        return Response({'error': 'size must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+    if size < 1:
+        return Response({'error': 'size must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+    if size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        return Response(
+            {'error': f'Uploads are limited to {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes.'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    session = UploadSession.objects.create(
+        group=group, user=request.user, filename=filename, message_type=message_type, size=size
+    )
+    uploads.start(session)
+    return Response({
+        'upload_id': str(session.id),
+        'offset': 0,
+        'size': size,
+        'chunk_size': settings.CHUNKED_UPLOAD_MAX_CHUNK,
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_chunk(request, group_id, upload_id):
+    """GET the offset to resume from, PUT the next chunk, or DELETE to abandon the upload"""
+    session = get_object_or_404(
+        UploadSession, id=upload_id, group_id=group_id, user=request.user, status='active'
+    )
+
+    if request.method == 'GET':
+        return Response({'offset': session.received, 'size': session.size, 'crc32': f'{session.crc32:08x}'})
+
+    if request.method == 'DELETE':
+        uploads.discard(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        expected_crc32 = _parse_crc32(request.headers.get('Upload-CRC32'))
+        length = int(request.META['CONTENT_LENGTH']) if request.META.get('CONTENT_LENGTH') else None
+    except ValueError:
+        return Response(
+            {'error': 'Upload-Offset must be an integer and Upload-CRC32 hexadecimal.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        # The raw body is read from the request stream, never loaded into memory
+        uploads.append_chunk(session, request.stream, offset, length, expected_crc32)
+    except uploads.UploadError as e:
+        return Response({'error': str(e), 'offset': session.received}, status=e.status)
+    return Response({'offset': session.received, 'size': session.size})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_upload(request, group_id, upload_id):
+    """Turn a fully received upload into a group message; body: caption, crc32 (optional)"""
+    session = get_object_or_404(
+        UploadSession, id=upload_id, group_id=group_id, user=request.user, status='active'
+    )
+    if not _is_member(session.group, request.user):
+        return Response({'detail': 'You are not a member of this group.'}, status=status.HTTP_403_FORBIDDEN)
+    if session.received != session.size:
+        return Response(
+            {'error': 'Upload is incomplete.', 'offset': session.received},
+            status=status.HTTP_409_CONFLICT
+        )
+    try:
+        expected_crc32 = _parse_crc32(request.data.get('crc32'))
+    except (TypeError, ValueError):
+        return Response({'error': 'crc32 must be hexadecimal.'}, status=status.HTTP_400_BAD_REQUEST)
+    if expected_crc32 is not None and expected_crc32 != session.crc32:
+        return Response({'error': 'CRC32 of the uploaded file does not match.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Claim the session so a retried finalize cannot post the message twice
+    claimed = UploadSession.objects.filter(pk=session.pk, status='active', received=session.size).update(status='complete')
+    if not claimed:
+        return Response({'error': 'Upload is already being finalized.'}, status=status.HTTP_409_CONFLICT)
+
+    posted = False
+    try:
+        with uploads.open_partial(session) as partial:
+            response = post_attachment(
+                request, session.group, session.message_type,
+                File(partial, name=session.filename), request.data.get('caption', '')
+            )
+        posted = status.is_success(response.status_code)
+    finally:
+        if posted:
+            uploads.discard(session)
+        else:
+            # No message was created; keep the received bytes so the client can retry
+            UploadSession.objects.filter(pk=session.pk).update(status='active')
+    return response
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gistconnect.settings')
 
@@ -16,4 +17,20 @@ app.conf.beat_schedule = {
     #     "task": "app.tasks.example_task",
     #     "schedule": crontab(minute="0", hour="*/6"),  # Every 6 hours
     # },
+    "reconcile-unread-counters": {
+        "task": "chat.tasks.reconcile_unread_counters",
+        "schedule": crontab(minute="*/15"),  # Every 15 minutes
+    },
+    "archive-old-messages": {
+        "task": "chat.tasks.archive_old_messages",
+        "schedule": crontab(minute="30", hour="3"),  # Daily at 03:30
+    },
+    "collect-unreferenced-blobs": {
+        "task": "chat.tasks.collect_unreferenced_blobs",
+        "schedule": crontab(minute="15"),  # Hourly
+    },
+    "expire-upload-sessions": {
+        "task": "chat.tasks.expire_upload_sessions",
+        "schedule": crontab(minute="0"),  # Hourly
+    },
 }
@@ -0,0 +1,109 @@
+"""
+Resized renditions of uploaded images.
+
+An upload gets a tiny blurred placeholder straight away: a data URI small enough
+to inline in the upload response and broadcast. A Celery task then writes one
+WebP rendition per IMAGE_RENDITION_WIDTHS entry (never wider than the original).
+Renditions are re-encoded from EXIF-transposed pixels, so no EXIF (GPS, camera
+serials) survives. They are stored under the SHA-256 of the original:
+
+    <prefix>/<hash[:2]>/<hash>/<width>.webp
+
+Identical uploads share renditions, and the paths never change content, so they
+can be cached forever. The prefix keeps private and public renditions apart:
+group images use RENDITION_PREFIX and are served, like the original, only by
+chat's group-message-file endpoint. Avatars use AVATAR_RENDITION_PREFIX, under
+the public profile picture directory.
+
+The renditions dict stored on a model looks like
+``{'source', 'placeholder', 'width', 'height', 'sizes': {'<width>': '<storage path>'}}``.
+"""
+import base64
+import hashlib
+import io
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps
+
+RENDITION_PREFIX = 'renditions'
+AVATAR_RENDITION_PREFIX = 'images/profile_images/renditions'
+PLACEHOLDER_SIZE = 16
+RENDITION_FORMAT = 'WEBP'
+RENDITION_QUALITY = 80
+
+
+def _open(file):
+    file.seek(0)
+    return Image.open(file)
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def placeholder(file):
+    """A blurred PLACEHOLDER_SIZE px data URI of `file`; raises PIL.UnidentifiedImageError for non-images."""
+    image = _open(file)
+    # Lets JPEG decode at a fraction of the size instead of the full image
+    image.draft('RGB', (PLACEHOLDER_SIZE * 8, PLACEHOLDER_SIZE * 8))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = io.BytesIO()
+    image.filter(ImageFilter.GaussianBlur(1)).save(buffer, RENDITION_FORMAT, quality=30)
+    return f"data:image/webp;base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+
+def content_hash(file):
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def generate(file, digest=None, prefix=RENDITION_PREFIX):
+    """Write the renditions of `file` under `prefix` (skipping ones already stored) and return their metadata."""
+    digest = digest or content_hash(file)
+    image = ImageOps.exif_transpose(_open(file))
+    image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+
+    sizes = {}
+    for width in sorted(settings.IMAGE_RENDITION_WIDTHS):
+        width = min(width, image.width)
+        if str(width) in sizes:
+            continue
+        path = f"{prefix}/{digest[:2]}/{digest}/{width}.webp"
+        if not default_storage.exists(path):
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            # No exif= argument, so the rendition carries no metadata
+            resized.save(buffer, RENDITION_FORMAT, quality=RENDITION_QUALITY, method=4)
+            path = default_storage.save(path, ContentFile(buffer.getvalue()))
+        sizes[str(width)] = path
+
+    return {'width': image.width, 'height': image.height, 'sizes': sizes}
+
+
+def as_urls(renditions, base_url=None, file_url=None):
+    """
+    Client form of a renditions dict: storage paths become (absolute, given `base_url`) URLs.
+
+    With `file_url`, the endpoint that authorizes access to the original, each
+    size links to ``<file_url>?width=<width>`` there instead of to MEDIA_URL.
+    """
+    if not renditions:
+        return None
+    urls = {}
+    for width, path in renditions.get('sizes', {}).items():
+        url = f"{file_url}?width={width}" if file_url else default_storage.url(path)
+        urls[width] = urljoin(base_url, url) if base_url else url
+    return {
+        'placeholder': renditions.get('placeholder'),
+        'width': renditions.get('width'),
+        'height': renditions.get('height'),
+        'sizes': urls,
+    }
@@ -92,14 +92,107 @@ CACHES = {
 }
 
 # Channels Configuration
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            'hosts': [os.getenv('CHANNEL_LAYER_REDIS_URL', 'redis://localhost:6379/2')],
+# CHANNEL_LAYER_MODE 'lists' queues messages in Redis sorted sets that every
+# worker polls (channels_redis.core); 'pubsub' publishes them to Redis pub/sub
+# subscribers instead, with no per-channel capacity or queueing for slow
+# workers. Compare the two with `manage.py bench_channel_layers`.
+# Comma-separated CHANNEL_LAYER_REDIS_URLS shard groups and channels across
+# several Redis hosts; in 'lists' mode with failover (chat/layers.py)
+CHANNEL_LAYER_MODE = os.getenv('CHANNEL_LAYER_MODE', 'lists')
+CHANNEL_LAYER_REDIS_URLS = [
+    url.strip() for url in
+    os.getenv('CHANNEL_LAYER_REDIS_URLS', os.getenv('CHANNEL_LAYER_REDIS_URL', 'redis://localhost:6379/2')).split(',')
+]
+CHANNEL_LAYER_FAILOVER_COOLDOWN = float(os.getenv('CHANNEL_LAYER_FAILOVER_COOLDOWN', '5'))  # seconds between probes of a down host
+
+if CHANNEL_LAYER_MODE not in ('lists', 'pubsub'):
+    raise ImproperlyConfigured("CHANNEL_LAYER_MODE must be 'lists' or 'pubsub'")
+if CHANNEL_LAYER_MODE == 'pubsub':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': CHANNEL_LAYER_REDIS_URLS,
+            },
         },
-    },
-}
+    }
+elif len(CHANNEL_LAYER_REDIS_URLS) > 1:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'chat.layers.ShardedRedisChannelLayer',
+            'CONFIG': {
+                'hosts': CHANNEL_LAYER_REDIS_URLS,
+                'failover_cooldown': CHANNEL_LAYER_FAILOVER_COOLDOWN,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': CHANNEL_LAYER_REDIS_URLS,
+            },
+        },
+    }
+
+# Chat message persistence
+# With write-behind enabled, WebSocket messages are broadcast immediately and
+# inserted in batches (see chat/persistence.py for the durability trade-offs).
+CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', 'False').lower() == 'true'
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv('CHAT_WRITE_BEHIND_BATCH_SIZE', '100'))
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('CHAT_WRITE_BEHIND_FLUSH_INTERVAL', '0.05'))  # seconds
+
+# WebSocket handshake user cache (chat/middleware.py)
+WS_USER_CACHE_SIZE = int(os.getenv('WS_USER_CACHE_SIZE', '10000'))
+WS_USER_CACHE_TTL = int(os.getenv('WS_USER_CACHE_TTL', '60'))  # seconds
+WS_USER_CACHE_SHARED = os.getenv('WS_USER_CACHE_SHARED', 'False').lower() == 'true'
+
+# Presence (chat/presence.py), stored in Redis only
+PRESENCE_ENABLED = os.getenv('PRESENCE_ENABLED', 'True').lower() == 'true'
+PRESENCE_REDIS_URL = os.getenv('PRESENCE_REDIS_URL', 'redis://localhost:6379/3')
+PRESENCE_TTL = int(os.getenv('PRESENCE_TTL', '60'))  # seconds without a heartbeat before a user is offline
+PRESENCE_FLUSH_INTERVAL = float(os.getenv('PRESENCE_FLUSH_INTERVAL', '15'))  # seconds between batched refreshes
+PRESENCE_LAST_SEEN_TTL = 60 * 60 * 24 * 30
+
+# Typing indicators (chat/typing_indicators.py), never persisted
+TYPING_THROTTLE = float(os.getenv('TYPING_THROTTLE', '2'))  # seconds between signals per connection and room
+TYPING_COALESCE_INTERVAL = float(os.getenv('TYPING_COALESCE_INTERVAL', '1'))  # seconds between updates per room
+
+# Outbound WebSocket frame queues (chat/outbound.py)
+WS_OUTBOUND_QUEUE_SIZE = int(os.getenv('WS_OUTBOUND_QUEUE_SIZE', '256'))  # frames per connection
+WS_OUTBOUND_POLICY = os.getenv('WS_OUTBOUND_POLICY', 'coalesce')  # coalesce, drop_oldest or disconnect
+
+# Message search (chat/search.py); empty picks SQLite FTS5 or the portable fallback
+CHAT_SEARCH_BACKEND = os.getenv('CHAT_SEARCH_BACKEND', '')  # dotted path to a SearchBackend subclass
+
+# Archival of old messages into compressed segments (chat/archive.py)
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv('CHAT_ARCHIVE_AFTER_DAYS', '365'))  # horizon
+CHAT_ARCHIVE_BATCH_SIZE = int(os.getenv('CHAT_ARCHIVE_BATCH_SIZE', '1000'))  # messages per segment
+CHAT_ARCHIVE_MAX_BATCHES = int(os.getenv('CHAT_ARCHIVE_MAX_BATCHES', '500'))  # per task run
+
+# Image renditions generated for uploads and avatars (gistconnect/renditions.py)
+IMAGE_RENDITION_WIDTHS = [int(width) for width in os.getenv('IMAGE_RENDITION_WIDTHS', '160,320,640,1280').split(',')]
+
+# Resumable chunked uploads of group attachments (chat/uploads.py)
+CHUNKED_UPLOAD_DIR = os.getenv('CHUNKED_UPLOAD_DIR', os.path.join(BASE_DIR, 'tmp', 'uploads'))  # partial files, not served
+CHUNKED_UPLOAD_MAX_SIZE = int(os.getenv('CHUNKED_UPLOAD_MAX_SIZE', str(500 * 1024 * 1024)))  # bytes per file
+CHUNKED_UPLOAD_MAX_CHUNK = int(os.getenv('CHUNKED_UPLOAD_MAX_CHUNK', str(8 * 1024 * 1024)))  # bytes per PUT
+CHUNKED_UPLOAD_EXPIRY = int(os.getenv('CHUNKED_UPLOAD_EXPIRY', str(24 * 60 * 60)))  # seconds without progress
+
+# Content-addressed attachment storage (chat/blobs.py)
+FILE_UPLOAD_HANDLERS = [
+    'chat.blobs.HashingMemoryFileUploadHandler',
+    'chat.blobs.HashingTemporaryFileUploadHandler',
+]
+BLOB_GC_GRACE = int(os.getenv('BLOB_GC_GRACE', '3600'))  # seconds a blob stays unreferenced before deletion
+BLOB_GC_BATCH_SIZE = int(os.getenv('BLOB_GC_BATCH_SIZE', '500'))  # blobs per batch
+BLOB_GC_MAX_BATCHES = int(os.getenv('BLOB_GC_MAX_BATCHES', '100'))  # per task run
+
+# Serving group attachments (chat/media.py): 'django' streams the file itself;
+# 'x-accel' (nginx) and 'x-sendfile' (Apache, lighttpd) hand the transfer to the proxy
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')  # internal location aliasing MEDIA_ROOT
 
 # ASGI Application
 ASGI_APPLICATION = 'gistconnect.asgi.application'
@@ -251,6 +344,9 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -3,6 +3,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+import os
 
 
 
@@ -16,5 +17,9 @@ urlpatterns = [
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+    # Only profile pictures (and their renditions) are public; group files and
+    # renditions are served by chat's media views after a membership check
+    public_media = 'images/profile_images/'
+    urlpatterns += static(settings.MEDIA_URL + public_media, document_root=os.path.join(settings.MEDIA_ROOT, public_media))
 
 